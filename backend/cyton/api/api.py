@@ -1,17 +1,24 @@
-import os, tempfile, uuid
-from fastapi import APIRouter, File, UploadFile, BackgroundTasks, HTTPException, Request
-from cyton.core.types import Parameters
+import os, tempfile, asyncio
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from cyton.core.types import Parameters, ExtrapolationField, ParameterRange
 from cyton.api.support.logger import initialize_logger
 from cyton.api.support.upload import parse_file
-from cyton.api.support.background_fit import start_background_fit
+from cyton.api.support.background_fit import run_fit, run_joint_fit, run_bootstrap, run_profile
+from cyton.api.support.jobs import engine
 from cyton.api.support.default_settings import get_default_settings
-from cyton.api.support.check_status import get_fitted_parameters
-from cyton.api.types import TaskId
-from cyton.core.models import ExperimentSettings, ExperimentData, ExtrapolationResults
-from cyton.core.extrapolate import extrapolate_without_data
+from cyton.api.support.check_status import get_fit_status, get_joint_fit_status, get_bootstrap_status, get_profile_status
+from cyton.api.types import TaskId, DatasetId, UploadedDataset, BootstrapStatus, FitStatus, JointFitStatus, ProfileStatus
+from cyton.core.settings import N_BOOTSTRAP, MAX_JOBS
+from cyton.core.models import ExperimentSettings, ExperimentData, ExtrapolationResults, SurfaceResults
+from cyton.api.support.extrapolate_cache import extrapolations
+from cyton.api.support.binary import BINARY_RESPONSE, accepts_binary, binary_response
+from cyton.api.support.datasets import datasets, dataset_id as get_dataset_id
 
 router = APIRouter()
 log = initialize_logger()
+# Chi-square surfaces that run at once, see /chisqr_surface
+surfaces = asyncio.Semaphore(MAX_JOBS)
 
 # =======================
 # Default Settings Endpoint:
@@ -41,30 +48,39 @@ async def default_settings(request: Request) -> ExperimentSettings:
 # =======================
 # Upload Endpoint:
 # =======================
-@router.post('/upload')
-async def upload(request: Request, file: UploadFile = File(...)) -> ExperimentData:
+@router.post('/upload', response_model=UploadedDataset, responses=BINARY_RESPONSE)
+async def upload(request: Request, file: UploadFile = File(...)) -> UploadedDataset | Response:
     """
-    Returns a dictionary with the extracted experimental data from the file to the client
+    Returns a dictionary with the extracted experimental data from the file to the client.
+    The data is kept on the server under its dataset ID, so later requests can send the ID instead.
+    Uploading the same file again returns the kept data without parsing it.
 
     Parameters:
     - request: The FastAPI Request object representing the incoming HTTP request.
     - file: The file to be uploaded. Expected in the request's form data.
 
     Returns:
-    - dict: A dictionary containing the experiment data parsed from the uploaded file.
+    - dict: A dictionary containing the dataset ID and the experiment data parsed from the uploaded file,
+      or the binary encoding of it if the client accepts application/vnd.cyton.arrays.
     """
     log.info(f"/upload was accessed from: {request.client}")
     temp_file_path: str | None = None
 
     try:
         contents = await file.read()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
-            # Write the contents to a temporary file
-            temp_file.write(contents)
-            temp_file_path = temp_file.name
-
-        # Parse the file and extract the data
-        experiment_data = parse_file(temp_file_path)
+        dataset_id = get_dataset_id(contents)
+
+        # Identical files are only parsed once
+        experiment_data = datasets.get(dataset_id)
+        if experiment_data is None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp_file:
+                # Write the contents to a temporary file
+                temp_file.write(contents)
+                temp_file_path = temp_file.name
+
+            # Parse the file and extract the data
+            experiment_data = parse_file(temp_file_path)
+            datasets.put(dataset_id, experiment_data)
         
     except Exception:
         raise HTTPException(status_code=400, detail="Failed to upload file. Please try again.")
@@ -74,13 +90,14 @@ async def upload(request: Request, file: UploadFile = File(...)) -> ExperimentDa
             os.remove(temp_file_path)
         log.info("Upload successful. Returning experiment data.")
 
-    return experiment_data
+    result: UploadedDataset = {"dataset_id": dataset_id, "data": experiment_data}
+    return binary_response(result) if accepts_binary(request) else result
 
 # =======================
 # Model Extrapolation Endpoint:
 # =======================
-@router.post('/extrapolate')
-async def extrapolate(request: Request, parameters: Parameters, data: ExperimentData | None = None, condition: str | None = None) -> ExtrapolationResults:
+@router.post('/extrapolate', response_model=ExtrapolationResults, responses=BINARY_RESPONSE)
+async def extrapolate(request: Request, parameters: Parameters, data: ExperimentData | None = None, dataset_id: DatasetId | None = None, condition: str | None = None, fields: list[ExtrapolationField] | None = Query(None)) -> ExtrapolationResults | Response:
     """
     Returns the extrapolated data as a dictionary. 
     Parameters dictionary must be provided, and experiment data is optional.
@@ -89,20 +106,23 @@ async def extrapolate(request: Request, parameters: Parameters, data: Experiment
     - request: The FastAPI Request object representing the incoming HTTP request.
     - parameters: Dictionary of parameters.
     - data: Optional dictionary containing experiment data.
+    - dataset_id: Optional ID of an uploaded dataset, returned by /upload, instead of data.
+    - fields: Optional list of outputs to compute, e.g. ?fields=total_live_cells&fields=hts. All of them by default.
 
     Returns:
-    - dict: A dictionary containing the extrapolated data.
+    - dict: A dictionary containing the extrapolated data,
+      or the binary encoding of it if the client accepts application/vnd.cyton.arrays.
     """
     log.info(f"/extrapolate was accessed from: {request.client}")
+    experiment_data = datasets.resolve(data, dataset_id, required=False)
 
     try:
-        if data is not None and condition is not None:
-            cond_data  = data.slice_condition(condition)
-            # If experiment data is provided, extract the data
-            model = cond_data.get_model()
-            result = cond_data.extrapolate_model(model, parameters)
-        else:
-            result = extrapolate_without_data(parameters)
+        # If experiment data is provided, extract the data
+        cond_data = experiment_data.slice_condition(condition) if experiment_data is not None and condition is not None else None
+        # Models and results are cached, and identical concurrent requests share one extrapolation.
+        # An uploaded dataset is identified by its ID, which saves hashing it.
+        data_key = f"{dataset_id}/{condition}" if data is None and cond_data is not None else None
+        result = await extrapolations.extrapolate(cond_data, parameters, fields, data_key)
 
     except Exception as e:
         log.error(e)
@@ -110,37 +130,130 @@ async def extrapolate(request: Request, parameters: Parameters, data: Experiment
 
     log.info("Model extrapolation successful. Returning extrapolated data.")
 
+    return binary_response(result) if accepts_binary(request) else result
+
+# =======================
+# Chi-square Surface Endpoint
+# =======================
+@router.post('/chisqr_surface')
+async def chisqr_surface(request: Request, condition: str, parameters: Parameters, ranges: list[ParameterRange], data: ExperimentData | None = None, dataset_id: DatasetId | None = None) -> SurfaceResults:
+    """
+    Returns the residual sum of squares over a grid of one or two parameters, to check their identifiability.
+    The other parameters are fixed at parameters. Use /start_profile to re-optimise them instead.
+
+    Parameters:
+    - request: The FastAPI Request object representing the incoming HTTP request.
+    - data: Dictionary containing experiment data, or None to use dataset_id.
+    - dataset_id: ID of an uploaded dataset, returned by /upload.
+    - parameters: The fitted parameters of the condition.
+    - ranges: One or two parameter names with the range and number of values of each, at most MAX_SURFACE_POINTS grid points in all.
+
+    Returns:
+    - dict: The grids and the chi-square at each grid point.
+    """
+    log.info(f"/chisqr_surface was accessed from: {request.client}")
+    data = datasets.resolve(data, dataset_id)
+
+    try:
+        cond_data = data.slice_condition(condition)
+        model = cond_data.get_model()
+        # The grid is evaluated in batches in worker processes, so keep it off the event loop.
+        # Like jobs, at most MAX_JOBS surfaces run at once, each in a job's share of the cores.
+        async with surfaces:
+            result = await run_in_threadpool(cond_data.surface_model, model, parameters, ranges, n_workers=engine.n_workers)
+
+    except Exception as e:
+        log.error(e)
+        raise HTTPException(status_code=400, detail=f"Failed to compute the chi-square surface. Received error {e} Please try again.")
+
+    log.info("Chi-square surface computed successfully.")
+
     return result
 
+# =======================
+# Start Profile Endpoint
+# =======================
+@router.post('/start_profile')
+async def start_profile(request: Request, settings: ExperimentSettings, condition: str, parameters: Parameters, ranges: list[ParameterRange], data: ExperimentData | None = None, dataset_id: DatasetId | None = None):
+    """
+    Queues a profile likelihood of one or two parameters on the job engine and returns a taskID to the client.
+    The other varying parameters are re-optimised within the bounds of settings at every grid point,
+    which costs a local fit per point, so it can be cancelled with /cancel_fit.
+
+    Parameters:
+    - request: The FastAPI Request object representing the incoming HTTP request.
+    - data: Dictionary containing experiment data, or None to use dataset_id.
+    - dataset_id: ID of an uploaded dataset, returned by /upload.
+    - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
+    - parameters: The fitted parameters of the condition, where every local fit starts.
+    - ranges: One or two parameter names with the range and number of values of each, at most MAX_SURFACE_POINTS grid points in all.
+
+    Returns:
+    - task_id: A dictionary containing the taskID.
+    """
+    log.info(f"/start_profile was accessed from: {request.client}")
+    data = datasets.resolve(data, dataset_id)
+
+    try:
+        cond_data = data.slice_condition(condition)
+        task_id = engine.submit(run_profile, cond_data, settings, parameters, ranges, deduplicate=True)
+
+    except Exception:
+        raise HTTPException(status_code=400, detail="Failed to start profile. Please try again.")
+
+    log.info("Profile job started successfully." + " Task ID: " + task_id)
+
+    return {"task_id": task_id}
+
+# =======================
+# Check Profile Status Endpoint
+# =======================
+@router.post('/check_profile_status')
+async def check_profile_status(request: Request, task_id: TaskId) -> ProfileStatus:
+        """
+        Returns the progress of a profile likelihood job, and the profile if completed.
+        """
+        log.info("/check_profile_status was accessed from: " + str(request.client))
+
+        try:
+            status = get_profile_status(task_id)
+
+        except Exception:
+            raise HTTPException(status_code=400, detail="Failed to check status. Please try again.")
+
+        log.info(f"Status checked successfully for task ID: {task_id}")
+
+        return status
+
 # =======================
 # Start Fit Endpoint
 # =======================
 @router.post('/start_fit')
-async def start_fit(request: Request, data: ExperimentData, settings: ExperimentSettings, condition: str, background_tasks: BackgroundTasks):
+async def start_fit(request: Request, settings: ExperimentSettings, condition: str, data: ExperimentData | None = None, dataset_id: DatasetId | None = None):
     """
-    Initiates a background fitting job and returns a taskID to the client.
+    Queues a fitting job on the job engine and returns a taskID to the client.
 
     Parameters:
     - request: The FastAPI Request object representing the incoming HTTP request.
-    - data: Dictionary containing experiment data.
+    - data: Dictionary containing experiment data, or None to use dataset_id.
+    - dataset_id: ID of an uploaded dataset, returned by /upload.
     - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
-    - background_tasks: FastAPI class for scheduling background tasks.
 
     Returns:
     - task_id: A dictionary containing the taskID.
     """
     log.info(f"/start_fit was accessed from: {request.client}")
+    data = datasets.resolve(data, dataset_id)
 
     try:
         # Extract the experiment data
         cond_data = data.slice_condition(condition)
 
-        # Generate a unique taskID
-        task_id = str(uuid.uuid4())
-
-        # Start the fitting job in the background
-
-        background_tasks.add_task(start_background_fit, cond_data, settings, task_id)
+        # Queue the fitting job, which runs in its own process. An identical fit that is running
+        # or in the cache is returned instead. Job processes don't outlive their fit, so the last fit
+        # of each dataset is remembered here for warm starts.
+        previous = cond_data.previous_fit() if settings.warm_start else None
+        task_id = engine.submit(run_fit, cond_data, settings, previous, deduplicate=True, on_done=cond_data.remember_fit)
 
     except Exception:
         raise HTTPException(status_code=400, detail="Failed to start fit. Please try again.")
@@ -149,31 +262,171 @@ async def start_fit(request: Request, data: ExperimentData, settings: Experiment
 
     return {"task_id": task_id}
 
+# =======================
+# Cancel Fit Endpoint
+# =======================
+@router.post('/cancel_fit')
+async def cancel_fit(request: Request, task_id: TaskId):
+    """
+    Stops a queued or running job. A running fit or joint fit then returns the best parameters found so far,
+    and a fit's telemetry is marked as truncated. A running bootstrap returns the confidence intervals
+    of the refits that finished, or fails if none did, and a running profile leaves nan at the points
+    that didn't finish. A queued job never runs.
+    Identical requests share a job, so this also cancels it for them.
+
+    Parameters:
+    - request: The FastAPI Request object representing the incoming HTTP request.
+    - task_id: The task ID returned by /start_fit, /start_joint_fit, /start_bootstrap or /start_profile.
+
+    Returns:
+    - cancelled: False if the job had already finished or doesn't exist.
+    """
+    log.info(f"/cancel_fit was accessed from: {request.client}")
+
+    try:
+        cancelled = engine.cancel(task_id)
+    except KeyError:
+        cancelled = False
+
+    log.info(f"Cancel requested for task ID: {task_id}. Cancelled: {cancelled}")
+
+    return {"cancelled": cancelled}
+
+# =======================
+# Start Joint Fit Endpoint
+# =======================
+@router.post('/start_joint_fit')
+async def start_joint_fit(request: Request, settings: ExperimentSettings, conditions: list[str] = Query(...), data: ExperimentData | None = None, dataset_id: DatasetId | None = None):
+    """
+    Queues a joint fit of several conditions on the job engine and returns a taskID to the client.
+    Parameters in settings.shared are shared between the conditions, and the rest are fitted per condition.
+
+    Parameters:
+    - request: The FastAPI Request object representing the incoming HTTP request.
+    - data: Dictionary containing experiment data, or None to use dataset_id.
+    - dataset_id: ID of an uploaded dataset, returned by /upload.
+    - settings: Dictionary containing the fitting settings (parameters, bounds, vary, shared).
+    - conditions: Conditions to fit, e.g. ?conditions=CpG&conditions=aCD40
+
+    Returns:
+    - task_id: A dictionary containing the taskID.
+    """
+    log.info(f"/start_joint_fit was accessed from: {request.client}")
+    data = datasets.resolve(data, dataset_id)
+
+    try:
+        # Check the conditions before starting the job
+        for condition in conditions:
+            data.slice_condition(condition)
+
+        task_id = engine.submit(run_joint_fit, data, settings, conditions, deduplicate=True)
+
+    except Exception:
+        raise HTTPException(status_code=400, detail="Failed to start joint fit. Please try again.")
+
+    log.info("Joint fitting job started successfully." + " Task ID: " + task_id)
+
+    return {"task_id": task_id}
+
 # =======================
 # Check Status Endpoint
 # =======================
 @router.post('/check_status')
-async def check_status(request: Request, task_id: TaskId) -> Parameters:
+async def check_status(request: Request, task_id: TaskId) -> FitStatus:
         """
-        Checks the status of a fitting job and returns the fitted parameters if completed.
-        Else, returns None.
+        Checks the status of a fitting job. Returns its state (queued, running, done, failed or cancelled),
+        its live telemetry (starts completed, model calls, time in the model and the optimiser, best chi-square so far),
+        the fitted parameters once done and the error if it failed.
 
         Parameters:
         - request: The FastAPI Request object representing the incoming HTTP request.
         - data: Dictionary containing task_id for checking the status.
 
         Returns:
-        - dict: A dictionary containing the fitted parameters.
+        - dict: A dictionary containing the telemetry and the fitted parameters.
         """
         log.info("/check_status was accessed from: " + str(request.client))
 
         try:
-            # Returns None if the task is not completed
-            fitted_parameters = get_fitted_parameters(task_id)
+            # The parameters are None until the job is done
+            status = get_fit_status(task_id)
     
         except Exception:
             raise HTTPException(status_code=400, detail="Failed to check status. Please try again.")
     
         log.info(f"Status checked successfully for task ID: {task_id}")
     
-        return fitted_parameters
+        return status
+
+# =======================
+# Check Joint Status Endpoint
+# =======================
+@router.post('/check_joint_status')
+async def check_joint_status(request: Request, task_id: TaskId) -> JointFitStatus:
+        """
+        Checks the status of a joint fitting job, with the fitted parameters of each condition once done.
+        """
+        log.info("/check_joint_status was accessed from: " + str(request.client))
+
+        try:
+            status = get_joint_fit_status(task_id)
+
+        except Exception:
+            raise HTTPException(status_code=400, detail="Failed to check status. Please try again.")
+
+        log.info(f"Status checked successfully for task ID: {task_id}")
+
+        return status
+
+# =======================
+# Start Bootstrap Endpoint
+# =======================
+@router.post('/start_bootstrap')
+async def start_bootstrap(request: Request, settings: ExperimentSettings, condition: str, parameters: Parameters, n_boot: int = N_BOOTSTRAP, data: ExperimentData | None = None, dataset_id: DatasetId | None = None):
+    """
+    Queues a bootstrap of a fit on the job engine and returns a taskID to the client.
+    The replicates are resampled n_boot times and each resample is refitted starting from parameters.
+
+    Parameters:
+    - request: The FastAPI Request object representing the incoming HTTP request.
+    - data: Dictionary containing experiment data, or None to use dataset_id.
+    - dataset_id: ID of an uploaded dataset, returned by /upload.
+    - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
+    - parameters: The fitted parameters of the condition.
+
+    Returns:
+    - task_id: A dictionary containing the taskID.
+    """
+    log.info(f"/start_bootstrap was accessed from: {request.client}")
+    data = datasets.resolve(data, dataset_id)
+
+    try:
+        cond_data = data.slice_condition(condition)
+        task_id = engine.submit(run_bootstrap, cond_data, settings, parameters, n_boot, deduplicate=True)
+
+    except Exception:
+        raise HTTPException(status_code=400, detail="Failed to start bootstrap. Please try again.")
+
+    log.info("Bootstrap job started successfully." + " Task ID: " + task_id)
+
+    return {"task_id": task_id}
+
+# =======================
+# Check Bootstrap Status Endpoint
+# =======================
+@router.post('/check_bootstrap_status')
+async def check_bootstrap_status(request: Request, task_id: TaskId) -> BootstrapStatus:
+        """
+        Returns the progress of a bootstrap job, and the confidence intervals of the parameters if completed.
+        """
+        log.info("/check_bootstrap_status was accessed from: " + str(request.client))
+
+        try:
+            status = get_bootstrap_status(task_id)
+
+        except Exception:
+            raise HTTPException(status_code=400, detail="Failed to check status. Please try again.")
+
+        log.info(f"Status checked successfully for task ID: {task_id}")
+
+        return status
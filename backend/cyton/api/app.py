@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import RedirectResponse
 from cyton.api.api import router as api_router
 from fastapi.staticfiles import StaticFiles
+from cyton.core.settings import GZIP_MINIMUM_SIZE
 
 # Initializes a FastAPI instance
 app = FastAPI()
@@ -16,12 +18,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresses large responses for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 @app.get("/")
 async def index_redirect():
     return RedirectResponse(url='/index.html')
 
 # Serve the API at /api
-app.include_router(api_router, prefix="/api")
+app.include_router(api_router, prefix="/api", tags=["root"])
 
 # Serve static files everywhere else
 app.mount("/", StaticFiles(packages=[("cyton.api", "static")], html=True), name="static")
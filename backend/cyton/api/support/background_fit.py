@@ -1,22 +1,54 @@
 """
 Last Edit: 11-Feb-2024
 
-Function for Endpoint: Start Fit
+Jobs for Endpoints: Start Fit, Start Joint Fit, Start Bootstrap and Start Profile.
+These run in the processes of the job engine (see jobs.py).
 """
-import pandas as pd
+from collections.abc import Callable
+from typing import Any
 from cyton.core.types import *
-from cyton.core.models import ExperimentSettings, SingleConditionData
+from cyton.core.models import ExperimentSettings, SingleConditionData, ExperimentData
+from cyton.core.telemetry import FitTelemetry
+from cyton.core.budget import FitBudget
 
-def start_background_fit(data: SingleConditionData, settings: ExperimentSettings, task_id: str) -> None:
+def run_fit(report: Callable[[Any], None], budget: FitBudget, n_workers: int, data: SingleConditionData, settings: ExperimentSettings, previous: Parameters | None = None) -> Parameters:
     """
-    Start a background fitting job and save the fitted parameters to a CSV file when completed.
+    Fits the model and returns the fitted parameters, reporting the fit's telemetry as a dict after every start.
+    A warm start also starts from previous, the previous best fit of this data.
     """
+    telemetry = FitTelemetry()
+    telemetry.listen(lambda telemetry: report(telemetry.model_dump()))
+    # The wall-clock budget starts once the job runs, rather than when it was queued
+    budget.limit(settings.max_seconds, settings.max_evaluations)
 
     # Fit the model and get the fitted parameters
     model = data.get_model()
-    fitted_parameters = data.fit_model(model, settings)
-    
-    # Save the fitted parameters to a CSV file
-    # See discussion here: https://github.com/python/mypy/issues/4976 on why this type error occurs.
-    df = pd.DataFrame.from_dict(fitted_parameters, orient='index').transpose() # type: ignore
-    df.to_csv(f'fitted_parameters_{task_id}.csv', index=False)
+    fitted_parameters = data.fit_model(model, settings, telemetry, budget, previous, n_workers)
+    report(telemetry.model_dump())
+
+    return fitted_parameters
+
+def run_joint_fit(report: Callable[[Any], None], budget: FitBudget, n_workers: int, data: ExperimentData, settings: ExperimentSettings, conditions: list[str]) -> dict[str, Parameters]:
+    """
+    Fits several conditions at once and returns the fitted parameters of each
+    """
+    budget.limit(settings.max_seconds, settings.max_evaluations)
+    return data.fit_conditions(conditions, settings, budget, n_workers)
+
+def run_bootstrap(report: Callable[[Any], None], budget: FitBudget, n_workers: int, data: SingleConditionData, settings: ExperimentSettings, best_fit: Parameters, n_boot: int) -> ConfidenceIntervals:
+    """
+    Bootstraps a fit and returns the confidence intervals, reporting the number of finished and total refits
+    """
+    budget.limit(settings.max_seconds, settings.max_evaluations)
+    model = data.get_model()
+    return data.bootstrap_model(model, settings, best_fit, n_boot, lambda done, total: report((done, total)), budget, n_workers)
+
+def run_profile(report: Callable[[Any], None], budget: FitBudget, n_workers: int, data: SingleConditionData, settings: ExperimentSettings, fitted: Parameters, ranges: list[ParameterRange]) -> dict[str, Any]:
+    """
+    Profile likelihood of one or two parameters around a fit, reporting the number of finished and total grid points.
+    Returns the SurfaceResults as JSON, so that they can be cached.
+    """
+    budget.limit(settings.max_seconds, settings.max_evaluations)
+    model = data.get_model()
+    result = data.surface_model(model, fitted, ranges, settings, profile=True, budget=budget, n_workers=n_workers, progress=lambda done, total: report((done, total)))
+    return result.model_dump(mode='json')
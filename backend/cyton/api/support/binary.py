@@ -0,0 +1,84 @@
+"""
+Binary Responses
+
+A compact alternative to JSON for responses that are mostly float arrays, such as ExtrapolationResults.
+Clients opt in by accepting BINARY_MEDIA_TYPE. The payload is laid out as:
+
+- the length of the header in bytes, as a little-endian uint32
+- the header: the JSON response, in UTF-8, with every float array replaced by {"$array": [offset, shape]}
+- zero padding up to a multiple of 8 bytes
+- the arrays as little-endian float64 in C order, each starting offset bytes after the padding
+
+Float arrays are the data of numpy arrays of floats, which are {"data_type": ..., "data": ...} in JSON,
+and non-empty lists of floats. Decoding the header and its arrays gives back the JSON response.
+"""
+import json
+import struct
+from typing import Any
+import numpy as np
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+BINARY_MEDIA_TYPE = "application/vnd.cyton.arrays"
+
+# Documents the binary alternative in the OpenAPI schema of an endpoint
+BINARY_RESPONSE: dict[int | str, dict[str, Any]] = {200: {"content": {BINARY_MEDIA_TYPE: {}}}}
+
+def accepts_binary(request: Request) -> bool:
+    "Whether the client listed BINARY_MEDIA_TYPE in its Accept header"
+    accept = request.headers.get("accept", "")
+    return any(media_type.split(";")[0].strip() == BINARY_MEDIA_TYPE for media_type in accept.split(","))
+
+def encode_arrays(value: Any) -> bytes:
+    "Encodes a pydantic model or a JSON value holding numpy arrays into the binary layout"
+    arrays: list[bytes] = []
+    offset = 0
+
+    def add_array(item: Any) -> dict[str, Any]:
+        nonlocal offset
+        array = np.ascontiguousarray(item, dtype='<f8')
+        arrays.append(array.tobytes())
+        placeholder = {"$array": [offset, list(array.shape)]}
+        offset += array.nbytes
+        return placeholder
+
+    def replace(item: Any) -> Any:
+        if isinstance(item, BaseModel):
+            item = item.model_dump()
+        if isinstance(item, dict):
+            return {key: replace(value) for key, value in item.items()}
+        if isinstance(item, np.ndarray):
+            # As serialised by pydantic_numpy
+            return {"data_type": str(item.dtype), "data": add_array(item) if item.dtype.kind == 'f' else item.tolist()}
+        if isinstance(item, (list, tuple)):
+            if len(item) > 0 and all(isinstance(x, float) for x in item):
+                return add_array(item)
+            return [replace(x) for x in item]
+        if isinstance(item, np.generic):
+            return item.item()
+        return item
+
+    header = json.dumps(replace(value), separators=(',', ':')).encode()
+    padding = -(4 + len(header)) % 8
+    return b"".join([struct.pack("<I", len(header)), header, b"\0" * padding, *arrays])
+
+def decode_arrays(payload: bytes) -> Any:
+    "Decodes the binary layout, with numpy arrays in place of float lists"
+    (length,) = struct.unpack_from("<I", payload)
+    start = 4 + length + -(4 + length) % 8
+
+    def restore(item: Any) -> Any:
+        if isinstance(item, dict):
+            if item.keys() == {"$array"}:
+                offset, shape = item["$array"]
+                count = int(np.prod(shape))
+                return np.frombuffer(payload, dtype='<f8', count=count, offset=start + offset).reshape(shape)
+            return {key: restore(value) for key, value in item.items()}
+        if isinstance(item, list):
+            return [restore(x) for x in item]
+        return item
+
+    return restore(json.loads(payload[4:4 + length]))
+
+def binary_response(value: Any) -> Response:
+    return Response(content=encode_arrays(value), media_type=BINARY_MEDIA_TYPE)
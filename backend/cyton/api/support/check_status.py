@@ -3,35 +3,50 @@ Last Edit: 21-Feb-2024
 
 Function for Endpoint: Check Status
 """
-import os
+import math
 from typing import cast
-import pandas as pd
-from cyton.api.types import TaskId
+from cyton.api.types import TaskId, BootstrapStatus, FitStatus, JointFitStatus, ProfileStatus
+from cyton.api.support.jobs import engine
+from cyton.core.telemetry import FitTelemetry
+from cyton.core.models import SurfaceResults
 from cyton.core.types import Parameters
 
-def get_fitted_parameters(task_id: TaskId) -> Parameters:
+def get_fit_status(task_id: TaskId) -> FitStatus:
     """
-    Retrieve fitted parameters from a CSV file associated with a given task ID.
-
-    Parameters:
-    - task_id: The unique identifier for the fitting task.
-
-    Returns:
-    - fitted_parameters: A dictionary containing the fitted parameters, or None if the file does 
-      not exist/ has not been completed.
+    State and telemetry of a fitting job, with its fitted parameters once it is done.
+    Raises a KeyError for an unknown task ID.
     """
+    job = engine.status(task_id)
+    return {
+        "state": job.state,
+        "parameters": cast(Parameters | None, job.result),
+        "telemetry": None if job.progress is None else FitTelemetry.model_validate(job.progress),
+        "error": job.error
+    }
+
+def get_joint_fit_status(task_id: TaskId) -> JointFitStatus:
+    """
+    State of a joint fitting job, with the fitted parameters of each condition once it is done.
+    Raises a KeyError for an unknown task ID.
+    """
+    job = engine.status(task_id)
+    return {"state": job.state, "parameters": job.result, "error": job.error}
 
-    # Check if the fitted parameters file exists
-    file_path = f'fitted_parameters_{task_id}.csv'
-
-    if os.path.exists(file_path):
-        # Convert the fitted parameters to a dictionary
-        fitted_parameters = pd.read_csv(file_path).to_dict(orient='records')[0]
-        # Deletes the file
-        os.remove(file_path)
-
-    else:
-        # If the file does not exist, return None
-        fitted_parameters = None
+def get_bootstrap_status(task_id: TaskId) -> BootstrapStatus:
+    """
+    Progress of a bootstrap job, with its confidence intervals once it is done.
+    Raises a KeyError for an unknown task ID.
+    """
+    job = engine.status(task_id)
+    done, total = job.progress or (0, job.args[-1])
+    return {"state": job.state, "done": done, "total": total, "intervals": job.result, "error": job.error}
 
-    return cast(Parameters, fitted_parameters)
+def get_profile_status(task_id: TaskId) -> ProfileStatus:
+    """
+    Progress of a profile likelihood job, with the profile once it is done.
+    Raises a KeyError for an unknown task ID.
+    """
+    job = engine.status(task_id)
+    done, total = job.progress or (0, math.prod(r["n"] for r in job.args[-1]))
+    result = None if job.result is None else SurfaceResults.model_validate(job.result)
+    return {"state": job.state, "done": done, "total": total, "result": result, "error": job.error}
@@ -0,0 +1,52 @@
+"""
+Datasets
+
+Experiment data parsed by /upload, kept in memory under a hash of the uploaded workbook,
+so that later requests send its dataset ID instead of the data, and re-uploads skip parsing.
+"""
+import hashlib
+from typing import Literal, overload
+from fastapi import HTTPException
+from cyton.api.support.extrapolate_cache import LRUCache
+from cyton.api.types import DatasetId
+from cyton.core.models import ExperimentData
+from cyton.core.settings import MAX_DATASETS
+
+def dataset_id(contents: bytes) -> DatasetId:
+    "ID of the dataset parsed from an uploaded workbook"
+    return hashlib.sha256(contents).hexdigest()
+
+class DatasetStore:
+    "The max_datasets most recently used datasets"
+    def __init__(self, max_datasets: int = MAX_DATASETS):
+        self._datasets: LRUCache[ExperimentData] = LRUCache(max_datasets)
+
+    def get(self, dataset_id: DatasetId) -> ExperimentData | None:
+        return self._datasets.get(dataset_id)
+
+    def put(self, dataset_id: DatasetId, data: ExperimentData) -> None:
+        self._datasets.put(dataset_id, data)
+
+    @overload
+    def resolve(self, data: ExperimentData | None, dataset_id: DatasetId | None, required: Literal[True] = True) -> ExperimentData: ...
+    @overload
+    def resolve(self, data: ExperimentData | None, dataset_id: DatasetId | None, required: bool) -> ExperimentData | None: ...
+    def resolve(self, data: ExperimentData | None, dataset_id: DatasetId | None, required: bool = True) -> ExperimentData | None:
+        """
+        The experiment data of a request, which is either sent with it or was uploaded before.
+        Raises a 404 for a dataset that has been evicted, so that the client uploads it again,
+        and a 400 if there is no data but it is required.
+        """
+        if data is not None:
+            return data
+        if dataset_id is not None:
+            data = self.get(dataset_id)
+            if data is None:
+                raise HTTPException(status_code=404, detail=f"Unknown dataset {dataset_id}. Please upload it again.")
+            return data
+        if required:
+            raise HTTPException(status_code=400, detail="Either data or dataset_id is required.")
+        return None
+
+# Uploaded datasets of the API
+datasets = DatasetStore()
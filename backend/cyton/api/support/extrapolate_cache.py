@@ -0,0 +1,84 @@
+"""
+Extrapolation Cache
+
+Keeps the models and results of recent extrapolations, so that a parameter set that was seen before costs a
+hash lookup, and makes concurrent identical extrapolations share a single computation.
+"""
+import asyncio
+from collections import OrderedDict
+from collections.abc import Sequence
+from fastapi.concurrency import run_in_threadpool
+from cyton.api.support.result_cache import content_key
+from cyton.core.extrapolate import get_default_model, extrapolate_without_data
+from cyton.core.model import Cyton2Model
+from cyton.core.models import SingleConditionData, ExtrapolationResults
+from cyton.core.settings import EXTRAPOLATE_MODEL_CACHE, EXTRAPOLATE_RESULT_CACHE
+from cyton.core.types import Parameters, ExtrapolationField
+
+class LRUCache[V]:
+    "Mapping that keeps its max_size most recently used items"
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[str, V] = OrderedDict()
+
+    def get(self, key: str) -> V | None:
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def put(self, key: str, item: V) -> None:
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+class ExtrapolationCache:
+    """
+    Models keyed by a hash of their condition data, and results keyed by that hash, the parameters and the fields.
+    Must only be used from the event loop. The extrapolations themselves run in the threadpool.
+    """
+    def __init__(self, max_models: int = EXTRAPOLATE_MODEL_CACHE, max_results: int = EXTRAPOLATE_RESULT_CACHE):
+        self.models: LRUCache[Cyton2Model] = LRUCache(max_models)
+        self.results: LRUCache[ExtrapolationResults] = LRUCache(max_results)
+        self._pending: dict[str, asyncio.Future[ExtrapolationResults]] = {}
+
+    async def extrapolate(self, cond_data: SingleConditionData | None, parameters: Parameters, fields: Sequence[ExtrapolationField] | None = None, data_key: str | None = None) -> ExtrapolationResults:
+        """
+        Extrapolates the model of cond_data, or the default model if it is None, like
+        SingleConditionData.extrapolate_model and extrapolate_without_data.
+        data_key identifies cond_data, and is a hash of it by default.
+        """
+        if data_key is None:
+            data_key = "default" if cond_data is None else content_key(cond_data)
+        key = content_key(data_key, parameters, None if fields is None else sorted(set(fields)))
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._compute(key, data_key, cond_data, parameters, fields))
+        # Shielded, so that a cancelled request doesn't cancel the extrapolation for the others
+        return await asyncio.shield(pending)
+
+    async def _compute(self, key: str, data_key: str, cond_data: SingleConditionData | None, parameters: Parameters, fields: Sequence[ExtrapolationField] | None) -> ExtrapolationResults:
+        try:
+            model = self.models.get(data_key)
+            if model is None:
+                model = get_default_model() if cond_data is None else cond_data.get_model()
+                self.models.put(data_key, model)
+            if cond_data is None:
+                result = await run_in_threadpool(extrapolate_without_data, parameters, fields, model)
+            else:
+                result = await run_in_threadpool(cond_data.extrapolate_model, model, parameters, fields)
+            self.results.put(key, result)
+            return result
+        finally:
+            del self._pending[key]
+
+# Extrapolation cache of the API
+extrapolations = ExtrapolationCache()
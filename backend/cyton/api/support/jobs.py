@@ -0,0 +1,175 @@
+"""
+Job Engine
+
+Runs CPU-bound jobs such as fits in their own processes, at most MAX_JOBS at a time, with the rest waiting
+in a queue. Results, progress and errors are handed back in memory. Deduplicated jobs share identical jobs
+that are still running, and their results are cached on disk.
+"""
+import os
+import uuid
+import threading
+import traceback
+import multiprocessing
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from multiprocessing.connection import Connection
+from typing import Any
+from cyton.api.types import TaskId, JobState, JobError
+from cyton.api.support.result_cache import ResultCache, content_key
+from cyton.core.budget import FitBudget
+from cyton.core.settings import MAX_JOBS, MAX_FINISHED_JOBS, JOB_WORKERS, MODEL_VERSION
+
+# A job target is called in the job's process with a function that reports its progress, the job's budget,
+# the number of worker processes it may use and the job's arguments, and returns the job's result.
+# Targets, arguments, progress and results must be picklable.
+type JobTarget = Callable[..., Any]
+
+class Job:
+    def __init__(self, target: JobTarget, args: tuple[Any, ...], budget: FitBudget, key: str | None = None, on_done: Callable[[Any], None] | None = None):
+        self.target = target
+        self.args = args
+        self.budget = budget
+        self.key = key
+        self.on_done = on_done
+        self.state: JobState = "queued"
+        self.progress: Any = None
+        self.result: Any = None
+        self.error: JobError | None = None
+
+def _job_main(target: JobTarget, args: tuple[Any, ...], budget: FitBudget, n_workers: int, sender: Connection) -> None:
+    def report(progress: Any) -> None:
+        sender.send(("progress", progress))
+
+    try:
+        result = target(report, budget, n_workers, *args)
+        sender.send(("done", result))
+    except Exception as e:
+        sender.send(("failed", {"type": type(e).__name__, "message": str(e), "traceback": traceback.format_exc()}))
+    finally:
+        sender.close()
+
+class JobEngine:
+    """
+    Queue of jobs that runs at most max_jobs of them at once, each in a spawned process,
+    and keeps the last max_finished finished jobs. Results of deduplicated jobs are kept in cache.
+    Each job may use n_workers worker processes, by default an equal share of the cores.
+    """
+    def __init__(self, max_jobs: int = MAX_JOBS, max_finished: int = MAX_FINISHED_JOBS, cache: ResultCache | None = None, n_workers: int | None = JOB_WORKERS):
+        self.max_jobs = max_jobs
+        self.n_workers = n_workers or max(1, (os.cpu_count() or 1) // max_jobs)
+        self.max_finished = max_finished
+        self.cache = cache
+        self._context = multiprocessing.get_context('spawn')
+        self._jobs: dict[TaskId, Job] = {}
+        self._queue: deque[TaskId] = deque()
+        self._finished: OrderedDict[TaskId, None] = OrderedDict()
+        self._in_flight: dict[str, TaskId] = {}
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(self, target: JobTarget, *args: Any, budget: FitBudget | None = None, deduplicate: bool = False, on_done: Callable[[Any], None] | None = None) -> TaskId:
+        """
+        Queues a job and returns its task ID. The budget cancels the job, and is unlimited by default.
+        A deduplicated job is keyed by its target, its arguments and MODEL_VERSION. If an identical job is queued
+        or running, its task ID is returned instead, and if the cache has its result, the job is done straight away.
+        Only results of jobs that didn't run out of budget are cached, and on_done is called in this process
+        with those results.
+        """
+        key = content_key(target.__module__, target.__qualname__, MODEL_VERSION, *args) if deduplicate else None
+        cached = None if key is None or self.cache is None else self.cache.get(key)
+        task_id = str(uuid.uuid4())
+        with self._lock:
+            if key is not None and key in self._in_flight:
+                return self._in_flight[key]
+            job = self._jobs[task_id] = Job(target, args, budget or FitBudget(), key, on_done)
+            if cached is None:
+                if key is not None:
+                    self._in_flight[key] = task_id
+                self._queue.append(task_id)
+                self._start_queued()
+                return task_id
+            job.result, job.progress = cached["result"], cached["progress"]
+            self._finish(task_id, "done")
+        if on_done is not None:
+            on_done(job.result)
+        return task_id
+
+    def status(self, task_id: TaskId) -> Job:
+        "The job with this task ID. Raises a KeyError for an unknown or forgotten task ID."
+        with self._lock:
+            return self._jobs[task_id]
+
+    def cancel(self, task_id: TaskId) -> bool:
+        """
+        Cancels a job. A queued job never runs, and a running job stops with the best result so far.
+        Returns False if the job has already finished.
+        """
+        with self._lock:
+            job = self._jobs[task_id]
+            if job.state == "queued":
+                self._queue.remove(task_id)
+                self._finish(task_id, "cancelled")
+                return True
+            if job.state == "running":
+                job.budget.cancel()
+                return True
+            return False
+
+    def _start_queued(self) -> None:
+        # Called with the lock held
+        while self._running < self.max_jobs and self._queue:
+            task_id = self._queue.popleft()
+            self._jobs[task_id].state = "running"
+            self._running += 1
+            threading.Thread(target=self._run, args=(task_id,), daemon=True).start()
+
+    def _run(self, task_id: TaskId) -> None:
+        job = self._jobs[task_id]
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_job_main, args=(job.target, job.args, job.budget, self.n_workers, sender))
+        state: JobState = "failed"
+        try:
+            process.start()
+            sender.close()
+            while True:
+                kind, payload = receiver.recv()
+                if kind == "progress":
+                    job.progress = payload
+                    continue
+                if kind == "done":
+                    state, job.result = "done", payload
+                else:
+                    job.error = payload
+                break
+        except EOFError:
+            process.join()
+            job.error = {"type": "JobProcessExit", "message": f"The job process exited with code {process.exitcode}", "traceback": None}
+        except Exception as e:
+            job.error = {"type": type(e).__name__, "message": str(e), "traceback": traceback.format_exc()}
+        finally:
+            process.join()
+            receiver.close()
+            # The job's process sets the limits, but a budget that ran out there has also run out here
+            if state == "done" and job.budget.exceeded() is None:
+                if job.key is not None and self.cache is not None:
+                    self.cache.put(job.key, {"result": job.result, "progress": job.progress})
+                if job.on_done is not None:
+                    job.on_done(job.result)
+            with self._lock:
+                self._running -= 1
+                self._finish(task_id, state)
+                self._start_queued()
+
+    def _finish(self, task_id: TaskId, state: JobState) -> None:
+        # Called with the lock held
+        job = self._jobs[task_id]
+        job.state = state
+        if job.key is not None and self._in_flight.get(job.key) == task_id:
+            del self._in_flight[job.key]
+        self._finished[task_id] = None
+        while len(self._finished) > self.max_finished:
+            forgotten, _ = self._finished.popitem(last=False)
+            del self._jobs[forgotten]
+
+# Job engine of the API
+engine = JobEngine(cache=ResultCache())
@@ -0,0 +1,73 @@
+"""
+Result Cache
+
+Job results on disk, keyed by a hash of everything that determines them, so that repeated jobs return instantly.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+from pydantic import BaseModel
+from cyton.core.settings import FIT_CACHE_DIR, FIT_CACHE_ENTRIES, FIT_CACHE_TTL
+
+def content_key(*parts: Any) -> str:
+    "Stable hash of pydantic models and JSON values"
+    payload = json.dumps([part.model_dump(mode='json') if isinstance(part, BaseModel) else part for part in parts],
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResultCache:
+    """
+    JSON values in a directory, one file per key. At most max_entries are kept, evicting the least recently used,
+    and entries expire ttl seconds after they were written. Several processes may share a directory.
+    """
+    def __init__(self, directory: str | Path | None = FIT_CACHE_DIR, max_entries: int = FIT_CACHE_ENTRIES, ttl: float = FIT_CACHE_TTL):
+        self.directory = Path(directory if directory is not None else Path(tempfile.gettempdir()) / 'cyton-fit-cache')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}.json'
+
+    def get(self, key: str) -> Any | None:
+        "The value of key, or None if it isn't cached or has expired"
+        path = self._path(key)
+        with self._lock:
+            try:
+                entry = json.loads(path.read_text())
+            except (OSError, ValueError):
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            # The modification time orders entries by last use
+            os.utime(path)
+            return entry["value"]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Written to a temporary file first, so that readers never see a partial entry
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as file:
+                json.dump({"created": time.time(), "value": value}, file)
+            os.replace(file.name, self._path(key))
+            self._evict()
+
+    def _evict(self) -> None:
+        # Called with the lock held
+        entries = []
+        for path in self.directory.glob('*.json'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort()
+        # Entries last used more than ttl ago have expired too
+        expired = sum(mtime < time.time() - self.ttl for mtime, _ in entries)
+        for _, path in entries[:max(expired, len(entries) - self.max_entries)]:
+            path.unlink(missing_ok=True)
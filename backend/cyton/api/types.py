@@ -1 +1,62 @@
+from typing import TypedDict, Literal
+from cyton.core.types import ConfidenceIntervals, Parameters
+from cyton.core.telemetry import FitTelemetry
+from cyton.core.models import ExperimentData, SurfaceResults
+
 type TaskId = str
+
+type DatasetId = str
+"Hash of an uploaded workbook, which identifies its experiment data"
+
+type JobState = Literal["queued", "running", "done", "failed", "cancelled"]
+"State of a job. A cancelled job was cancelled while queued. A running job that is cancelled ends as done, with the best result so far."
+
+class UploadedDataset(TypedDict):
+    dataset_id: DatasetId
+    "ID that later requests can send instead of the data"
+    data: ExperimentData
+
+class JobError(TypedDict):
+    "Why a job failed"
+    type: str
+    "Exception class name"
+    message: str
+    traceback: str | None
+
+class FitStatus(TypedDict):
+    state: JobState
+    parameters: Parameters | None
+    "Fitted parameters, or None until the fit is done"
+    telemetry: FitTelemetry | None
+    "Live telemetry of the fit, which is kept with the fitted parameters. None until the fit has started."
+    error: JobError | None
+    "Why the fit failed, or None"
+
+class JointFitStatus(TypedDict):
+    state: JobState
+    parameters: dict[str, Parameters] | None
+    "Fitted parameters of each condition, or None until the fit is done"
+    error: JobError | None
+    "Why the fit failed, or None"
+
+class BootstrapStatus(TypedDict):
+    state: JobState
+    done: int
+    "Number of finished bootstrap refits"
+    total: int
+    "Number of bootstrap refits"
+    intervals: ConfidenceIntervals | None
+    "Confidence interval of each varying parameter, or None until every refit has finished"
+    error: JobError | None
+    "Why the bootstrap failed, or None"
+
+class ProfileStatus(TypedDict):
+    state: JobState
+    done: int
+    "Number of finished grid points"
+    total: int
+    "Number of grid points"
+    result: SurfaceResults | None
+    "Profile likelihood, or None until the job is done. Points that didn't finish before it was cancelled are nan."
+    error: JobError | None
+    "Why the profile failed, or None"
@@ -0,0 +1,98 @@
+"""
+Fit Budgets
+
+Wall-clock and evaluation limits of a fit, and its cancellation. A budget is shared with the processes that
+run the starts, and every model evaluation is charged to it, so a fit also stops in the middle of a start.
+"""
+import time
+import threading
+import multiprocessing
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from cyton.core.types import TruncationReason
+
+class BudgetExceeded(Exception):
+    "Raised by a model evaluation once its fit has run out of budget or has been cancelled"
+
+_REASONS: tuple[TruncationReason, ...] = ("cancelled", "time", "evaluations")
+
+class FitBudget:
+    """
+    Limits of a single fit: at most seconds of wall-clock time from when the budget is created,
+    and at most nfev model evaluations over all of its starts. None is unlimited.
+    A budget can only be passed to worker processes when they are started (see run_starts).
+    """
+    def __init__(self, seconds: float | None = None, nfev: int | None = None):
+        context = multiprocessing.get_context('spawn')
+        self._nfev = context.Value('q', 0)
+        self._cancelled = context.Event()
+        # Index into _REASONS of why the budget ran out, once any process has seen it run out.
+        # Processes only ever write the reason they saw, so it doesn't need a lock.
+        self._reason = context.Value('b', -1, lock=False)
+        self.limit(seconds, nfev)
+
+    def limit(self, seconds: float | None, nfev: int | None) -> None:
+        "Replaces the limits, counting seconds from now. This doesn't change the limits seen by running workers."
+        self.deadline = None if seconds is None else time.time() + seconds
+        self.max_nfev = nfev
+        self._reason.value = -1
+
+    @property
+    def nfev(self) -> int:
+        return self._nfev.value
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def exceeded(self) -> TruncationReason | None:
+        """
+        Why the fit has to stop, or None if it can go on.
+        Once a process has seen the budget run out, it has run out in every process that shares it,
+        including those that didn't set its limits.
+        """
+        if self._cancelled.is_set():
+            return "cancelled"
+        if self._reason.value >= 0:
+            return _REASONS[self._reason.value]
+        reason: TruncationReason | None = None
+        if self.deadline is not None and time.time() > self.deadline:
+            reason = "time"
+        elif self.max_nfev is not None and self._nfev.value >= self.max_nfev:
+            reason = "evaluations"
+        if reason is not None:
+            self._reason.value = _REASONS.index(reason)
+        return reason
+
+    def charge(self, nfev: int = 1) -> None:
+        "Charges model evaluations, raising BudgetExceeded if the budget has already run out"
+        if self.exceeded() is not None:
+            raise BudgetExceeded()
+        with self._nfev.get_lock():
+            self._nfev.value += nfev
+
+# Budget of the fit that the current thread is running starts for. Worker processes set it when they start.
+_current = threading.local()
+
+def set_current_budget(budget: FitBudget | None) -> None:
+    _current.budget = budget
+
+def current_budget() -> FitBudget | None:
+    return getattr(_current, 'budget', None)
+
+@contextmanager
+def budget_scope(budget: FitBudget | None) -> Generator[None, None, None]:
+    "Makes budget the current budget of this thread for the duration of the block"
+    previous = current_budget()
+    set_current_budget(budget)
+    try:
+        yield
+    finally:
+        set_current_budget(previous)
+
+# Results of the starts, stopping after the first one that finishes once the current budget has run out
+def within_budget[T](results: Iterable[T]) -> Iterator[T]:
+    budget = current_budget()
+    for result in results:
+        yield result
+        if budget is not None and budget.exceeded() is not None:
+            return
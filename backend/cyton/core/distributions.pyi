@@ -0,0 +1,27 @@
+"""
+Lognormal and normal distributions for the Cyton2 model.
+These give the same results as scipy.stats.lognorm(sig, scale=mu) and scipy.stats.norm(mu, sig),
+without the overhead of scipy's generic argument checking on every call.
+"""
+
+from numpy.typing import ArrayLike, NDArray
+import numpy as np
+
+def pdf(times: ArrayLike, mu: ArrayLike, sig: ArrayLike, logn: bool = True) -> NDArray[np.float64]:
+    """
+    Probability density at times. The arguments are broadcast against each other,
+    and a 1-D array of times with scalar mu and sig takes a fast path.
+    """
+    ...
+
+def cdf(times: ArrayLike, mu: ArrayLike, sig: ArrayLike, logn: bool = True) -> NDArray[np.float64]:
+    """
+    Cumulative distribution function at times, broadcast like pdf
+    """
+    ...
+
+def sf(times: ArrayLike, mu: ArrayLike, sig: ArrayLike, logn: bool = True) -> NDArray[np.float64]:
+    """
+    Survival function (1 - cdf) at times, broadcast like pdf. Accurate in the upper tail, unlike 1 - cdf.
+    """
+    ...
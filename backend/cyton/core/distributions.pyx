@@ -0,0 +1,91 @@
+"""
+Lognormal and normal distributions for the Cyton2 model.
+These give the same results as scipy.stats.lognorm(sig, scale=mu) and scipy.stats.norm(mu, sig),
+without the overhead of scipy's generic argument checking on every call.
+"""
+import numpy as np
+cimport numpy as np
+np.import_array()
+cimport cython
+from libc.math cimport erf, erfc, exp, log, fabs, NAN, M_SQRT1_2
+
+DTYPE = np.float64
+ctypedef np.float64_t DTYPE_t
+
+cdef enum Kind:
+	PDF, CDF, SF
+
+cdef DTYPE_t SQRT_2PI = 2.5066282746310002
+
+# Standard normal cdf, written like scipy.special.ndtr: erf near 0 and erfc in the tails,
+# so that neither cdf nor sf lose precision to cancellation.
+cdef inline DTYPE_t _ndtr(DTYPE_t a) noexcept nogil:
+	cdef DTYPE_t x = a * M_SQRT1_2
+	cdef DTYPE_t z = fabs(x)
+	cdef DTYPE_t y
+	if z < M_SQRT1_2:
+		return 0.5 + 0.5 * erf(x)
+	y = 0.5 * erfc(z)
+	return 1. - y if x > 0 else y
+
+cdef inline DTYPE_t _value(Kind kind, bint logn, DTYPE_t t, DTYPE_t mu, DTYPE_t sig) noexcept nogil:
+	cdef DTYPE_t x, z
+	# invalid parameters give nan, like scipy
+	if not sig > 0 or (logn and not mu > 0):
+		return NAN
+	if logn:
+		x = t / mu
+		if x <= 0:
+			return 1. if kind == SF else 0.
+		z = log(x) / sig
+		if kind == PDF:
+			return exp(-0.5 * z * z) / (sig * x * SQRT_2PI) / mu
+	else:
+		z = (t - mu) / sig
+		if kind == PDF:
+			return exp(-0.5 * z * z) / SQRT_2PI / sig
+	return _ndtr(z) if kind == CDF else _ndtr(-z)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _fill_scalar(Kind kind, bint logn, const DTYPE_t[:] times, DTYPE_t mu, DTYPE_t sig, DTYPE_t[::1] out) noexcept nogil:
+	cdef Py_ssize_t i
+	for i in range(times.shape[0]):
+		out[i] = _value(kind, logn, times[i], mu, sig)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _fill(Kind kind, bint logn, const DTYPE_t[:] times, const DTYPE_t[:] mu, const DTYPE_t[:] sig, DTYPE_t[::1] out) noexcept nogil:
+	cdef Py_ssize_t i
+	for i in range(times.shape[0]):
+		out[i] = _value(kind, logn, times[i], mu[i], sig[i])
+
+cdef object _evaluate(Kind kind, times, mu, sig, bint logn):
+	cdef DTYPE_t mu_, sig_
+	cdef const DTYPE_t[:] times_v, mu_v, sig_v
+	cdef DTYPE_t[::1] out_v
+	# fast path: a 1-D time grid and scalar parameters
+	if np.ndim(mu) == 0 and np.ndim(sig) == 0 and isinstance(times, np.ndarray) and times.ndim == 1 \
+			and times.dtype == DTYPE:
+		out = np.empty(times.shape[0], dtype=DTYPE)
+		times_v, out_v, mu_, sig_ = times, out, mu, sig
+		with nogil:
+			_fill_scalar(kind, logn, times_v, mu_, sig_, out_v)
+		return out
+
+	# otherwise broadcast the arguments against each other, as scipy does
+	times, mu, sig = np.broadcast_arrays(np.asarray(times, dtype=DTYPE), np.asarray(mu, dtype=DTYPE), np.asarray(sig, dtype=DTYPE))
+	out = np.empty(times.shape, dtype=DTYPE)
+	times_v, mu_v, sig_v, out_v = times.reshape(-1), mu.reshape(-1), sig.reshape(-1), out.reshape(-1)
+	with nogil:
+		_fill(kind, logn, times_v, mu_v, sig_v, out_v)
+	return out if out.ndim else out[()]
+
+def pdf(times, mu, sig, bint logn=True):
+	return _evaluate(PDF, times, mu, sig, logn)
+
+def cdf(times, mu, sig, bint logn=True):
+	return _evaluate(CDF, times, mu, sig, logn)
+
+def sf(times, mu, sig, bint logn=True):
+	return _evaluate(SF, times, mu, sig, logn)
@@ -1,6 +1,7 @@
 from typing import TYPE_CHECKING
 from cyton.core.settings import DEFAULT_EXP_HT, DEFAULT_MAX_DIV, DEFAULT_N0, DT
-from cyton.core.types import HarvestTime, PerTime, ExtrapolationTimes, Parameters
+from typing import Sequence
+from cyton.core.types import HarvestTime, PerTime, ExtrapolationTimes, ExtrapolationField, Parameters
 import numpy as np
 from cyton.core.model import Cyton2Model
 if TYPE_CHECKING:
@@ -14,13 +15,22 @@ def get_times(exp_ht: PerTime[HarvestTime]) -> ExtrapolationTimes:
     tf = max(exp_ht) + 5
     return np.linspace(t0, tf, num=int(tf/DT)+1)
 
-def extrapolate_without_data(params: Parameters) -> "ExtrapolationResults":
+def get_default_model() -> Cyton2Model:
     """
-    Perform an extrapolation using only model parameters, but no data
+    Model of the default experiment, used when there is no data
     """
     return Cyton2Model(
         ht=DEFAULT_EXP_HT,
         n0 = DEFAULT_N0,
         max_div = DEFAULT_MAX_DIV,
         dt = DT
-    ).extrapolate(model_times = get_times(DEFAULT_EXP_HT), params=params)
+    )
+
+def extrapolate_without_data(params: Parameters, fields: Sequence[ExtrapolationField] | None = None, model: Cyton2Model | None = None) -> "ExtrapolationResults":
+    """
+    Perform an extrapolation using only model parameters, but no data.
+    Only the outputs in fields are computed, or all of them if it is None.
+    model is the default model, which is created if it isn't given.
+    """
+    model = model or get_default_model()
+    return model.extrapolate(model_times = get_times(DEFAULT_EXP_HT), params=params, fields=fields)
@@ -0,0 +1,74 @@
+"""
+Identifiability
+
+Chi-square over a grid of one or two parameters, either with every other parameter fixed at a fit
+(a chi-square surface) or re-optimised at each grid point (a profile likelihood).
+"""
+import copy
+import os
+from collections.abc import Callable, Sequence
+from contextlib import closing
+from functools import partial
+import numpy as np
+import lmfit as lmf
+from numpy.typing import NDArray
+from cyton.core.model import Cyton2Model, PARAM_NAMES
+from cyton.core.model_fitting import fit_start, run_starts
+from cyton.core.budget import FitBudget, budget_scope, within_budget
+from cyton.core.settings import N_WORKERS, FIT_BACKEND, SURFACE_CHUNK
+from cyton.core.types import *
+
+# Parameter sets of every grid point, one row per point in PARAM_NAMES order, with the first name varying slowest
+def parameter_grid(fitted: Parameters, names: Sequence[str], grids: Sequence[NDArray]) -> NDArray[np.float64]:
+    rows = np.tile([fitted[name] for name in PARAM_NAMES], (int(np.prod([len(grid) for grid in grids])), 1)).astype(float)
+    for name, values in zip(names, np.meshgrid(*grids, indexing='ij')):
+        rows[:, PARAM_NAMES.index(name)] = values.ravel()
+    return rows
+
+# Chi-square of a block of parameter sets
+def surface_chunk(rows: NDArray[np.float64], y_cells: NDArray[np.float64], model: Cyton2Model) -> NDArray[np.float64]:
+    return np.sum((y_cells - model.evaluate_batch(rows, chunk_size=len(rows)))**2, axis=1)
+
+def chisqr_surface(model: Cyton2Model, y_cells: NDArray[np.float64], fitted: Parameters, names: Sequence[str], grids: Sequence[NDArray], n_workers: int | None = N_WORKERS) -> NDArray[np.float64]:
+    """
+    Chi-square at every point of the grids of names, with the other parameters fixed at fitted.
+    Returns an array with one axis per name. The grid is evaluated in batches of SURFACE_CHUNK parameter sets,
+    shared out to n_workers processes.
+    """
+    rows = parameter_grid(fitted, names, grids)
+    chunks = np.array_split(rows, max(1, int(np.ceil(len(rows) / SURFACE_CHUNK))))
+    n_workers = min(n_workers or os.cpu_count() or 1, len(chunks))
+    with closing(run_starts(partial(surface_chunk, y_cells=y_cells, model=model), chunks, n_workers)) as results:
+        chisqr = np.concatenate(list(results))
+    return chisqr.reshape([len(grid) for grid in grids])
+
+def profile_likelihood(model: Cyton2Model, y_cells: NDArray[np.float64], fitted: Parameters, params: lmf.Parameters, names: Sequence[str], grids: Sequence[NDArray], n_workers: int | None = N_WORKERS, backend: FitBackend = FIT_BACKEND, budget: FitBudget | None = None, progress: Callable[[int, int], None] | None = None) -> tuple[NDArray[np.float64], dict[str, NDArray[np.float64]]]:
+    """
+    Chi-square at every point of the grids of names, re-optimising the other varying parameters of params.
+    Each grid point is a local fit that starts from fitted, and the points run in n_workers processes.
+    Returns the chi-square and the re-optimised value of every parameter, as arrays with one axis per name.
+    progress is called with the number of finished and total points after each one.
+    If budget is given, the points stop once it is cancelled or runs out, and those that didn't finish are nan.
+    """
+    params = copy.deepcopy(params)
+    for par in params:
+        params[par].set(value=float(np.clip(fitted[par], params[par].min, params[par].max)))
+    for name in names:
+        # The grid may go beyond the fitting bounds
+        params[name].set(vary=False, min=-np.inf, max=np.inf)
+
+    initials = [dict(zip(names, point)) for point in parameter_grid(fitted, names, grids)[:, [PARAM_NAMES.index(name) for name in names]].tolist()]
+    start = partial(fit_start, params=params, x_gens=np.zeros(0), y_cells=y_cells, model=model, backend=backend)
+    n_workers = min(n_workers or os.cpu_count() or 1, len(initials))
+    chisqr = np.full(len(initials), np.nan)
+    values = np.full((len(initials), len(PARAM_NAMES)), np.nan)
+    with budget_scope(budget), closing(run_starts(start, initials, n_workers)) as results:
+        for i, (point_chisqr, res, _) in enumerate(within_budget(results)):
+            if not np.isnan(point_chisqr):
+                chisqr[i] = point_chisqr
+                values[i] = [res[par].value for par in PARAM_NAMES]
+            if progress is not None:
+                progress(i + 1, len(initials))
+
+    shape = [len(grid) for grid in grids]
+    return chisqr.reshape(shape), {par: values[:, k].reshape(shape) for k, par in enumerate(PARAM_NAMES)}
@@ -0,0 +1,130 @@
+"""
+Joint Model Fitting
+
+Fits several conditions of one experiment at once, with each parameter either shared by every
+condition or fitted per condition. Each condition's residuals only depend on its own parameters
+and the shared ones, so the Jacobian is block-sparse and is solved with a sparse trust-region method.
+"""
+import os
+from contextlib import closing
+from functools import partial
+from typing import Any, cast
+import numpy as np
+import numpy.typing as npt
+import lmfit as lmf
+import scipy.sparse as sp
+from scipy.optimize import least_squares
+from cyton.core.model import Cyton2Model, PARAM_NAMES
+from cyton.core.model_fitting import start_design, run_starts, best_starts
+from cyton.core.settings import JOINT_ITER_SEARCH, MAX_NFEV, N_WORKERS
+from cyton.core.budget import FitBudget, BudgetExceeded, budget_scope, current_budget, within_budget
+from cyton.core.types import *
+from cyton.core.utils import flatten
+
+class JointProblem:
+    """
+    Maps between the vector of fitted values and the parameters of every condition.
+    A varying parameter takes one entry of the vector if it is shared, or one per condition otherwise.
+    Locked parameters keep their initial value in every condition.
+    """
+    def __init__(self, params: lmf.Parameters, paramExcl: ExcludedParameters, shared: SharedParams, models: PerCond[Cyton2Model], y_cells: PerCond[npt.NDArray[np.float64]]):
+        self.models = models
+        self.y_cells = y_cells
+        n_cond = len(models)
+
+        # position in the vector of every (condition, parameter), or -1 if it is locked
+        self.index = np.full((n_cond, len(PARAM_NAMES)), -1, dtype=np.intp)
+        self.fixed = np.array([[params[name].value for name in PARAM_NAMES]] * n_cond, dtype=float)
+        lower: list[float] = []
+        upper: list[float] = []
+        for k, name in enumerate(PARAM_NAMES):
+            if name in paramExcl:
+                continue
+            n_entries = 1 if shared[name] else n_cond
+            self.index[:, k] = len(lower) + (np.zeros(n_cond, dtype=np.intp) if shared[name] else np.arange(n_cond))
+            lower += [params[name].min] * n_entries
+            upper += [params[name].max] * n_entries
+        self.lower = np.array(lower)
+        self.upper = np.array(upper)
+        self.varying = self.index >= 0
+
+        # first residual of every condition
+        self.offsets = np.cumsum([0] + [y.size for y in y_cells])
+
+    @property
+    def n_vary(self) -> int:
+        return self.lower.size
+
+    def vector(self, values: dict[str, float]) -> npt.NDArray[np.float64]:
+        "Vector that gives every condition the same values, clipped to the bounds"
+        x = np.empty(self.n_vary)
+        for k, name in enumerate(PARAM_NAMES):
+            x[self.index[self.varying[:, k], k]] = values.get(name, self.fixed[0, k])
+        return np.clip(x, self.lower, self.upper)
+
+    def values(self, x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        "Parameter values of every condition, one row per condition in PARAM_NAMES order"
+        values = self.fixed.copy()
+        values[self.varying] = x[self.index[self.varying]]
+        return values
+
+    def residual(self, x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        return np.concatenate([
+            y - model.evaluate(*pars) for model, y, pars in zip(self.models, self.y_cells, self.values(x))
+        ])
+
+    def jacobian(self, x: npt.NDArray[np.float64]) -> sp.csr_array:
+        # Only the columns of a condition's own and shared parameters are non-zero in its rows,
+        # so the number of non-zeros grows linearly with the number of conditions
+        rows, cols, data = [], [], []
+        for c, (model, pars) in enumerate(zip(self.models, self.values(x))):
+            jac = -model.jacobian(*pars)[:, self.varying[c]]
+            block_rows, block_cols = np.indices(jac.shape)
+            rows.append(block_rows.ravel() + self.offsets[c])
+            cols.append(self.index[c, self.varying[c]][block_cols.ravel()])
+            data.append(jac.ravel())
+        # the conditions' rows don't overlap, so every (row, column) pair appears once
+        return sp.csr_array((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(self.offsets[-1], self.n_vary))
+
+# One start of the joint search, from the given initial guesses applied to every condition.
+# Every residual is charged to the current budget as one evaluation per condition. If the budget
+# runs out during the start, it returns a nan chi-square with the initial guesses.
+def joint_fit_start(initial: dict[str, float], problem: JointProblem) -> tuple[float, npt.NDArray[np.float64]]:
+    budget = current_budget()
+
+    def residual(x: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        if budget is not None:
+            budget.charge(len(problem.models))
+        return problem.residual(x)
+
+    def jacobian(x: npt.NDArray[np.float64]) -> sp.csr_array:
+        if budget is not None and budget.exceeded() is not None:
+            raise BudgetExceeded()
+        return problem.jacobian(x)
+
+    x0 = problem.vector(initial)
+    # least_squares isn't annotated, so its jac is inferred to be a str from the default
+    jac: Any = jacobian
+    try:
+        res = least_squares(residual, x0, jac=jac, bounds=(problem.lower, problem.upper),
+                            method='trf', tr_solver='lsmr', x_scale='jac', max_nfev=MAX_NFEV)
+    except BudgetExceeded:
+        return np.nan, x0
+    return 2 * res.cost, res.x
+
+def joint_fit(cell_gens_reps: PerCond[PerTime[PerRep[PerGen[CellCount]]]], params: lmf.Parameters, paramExcl: ExcludedParameters, shared: SharedParams, models: PerCond[Cyton2Model], n_workers: int | None = N_WORKERS, budget: FitBudget | None = None) -> list[Parameters]:
+    """
+    Fits several conditions at once and returns the best parameters of each, in the order of models.
+    The search starts from the initial values in params and then from up to JOINT_ITER_SEARCH - 1 points
+    of start_design, each applied to every condition, and stops early like model_fitting.fit.
+    If budget is given, the fit stops once it is cancelled or runs out, and returns the best parameters so far.
+    """
+    y_cells = [np.fromiter(flatten(reps), dtype=float) for reps in cell_gens_reps]
+    problem = JointProblem(params, paramExcl, shared, models, y_cells)
+
+    initials = [{name: params[name].value for name in params}] + start_design(params, paramExcl, JOINT_ITER_SEARCH - 1)
+    n_workers = min(n_workers or os.cpu_count() or 1, len(initials))
+    with budget_scope(budget), closing(run_starts(partial(joint_fit_start, problem=problem), initials, n_workers)) as results:
+        best = best_starts(within_budget(results), n_keep=1)[0][1]
+
+    return [cast(Parameters, dict(zip(PARAM_NAMES, pars.tolist()))) for pars in problem.values(best)]
@@ -6,6 +6,56 @@ Cyton2 Algorithm Model
 
 from cyton.core.types import *
 from cyton.core.models import ExtrapolationResults
+from pydantic_numpy.typing import Np2DArrayFp64
+from numpy.typing import ArrayLike, NDArray
+import numpy.typing as npt
+from typing import Callable, Hashable, Sequence
+import numpy as np
+
+PARAM_NAMES: tuple[str, ...]
+"Column order of the parameter matrix accepted by Cyton2Model.evaluate_batch"
+
+EXTRAPOLATION_FIELDS: tuple[ExtrapolationField, ...]
+"Outputs that Cyton2Model.extrapolate can be asked for"
+
+DTYPES: tuple[type[np.floating], ...]
+"Precisions the model engine can compute in"
+
+class Cyton2Workspace:
+    """
+    Scratch arrays used by Cyton2Model.evaluate, sized for one model.
+    Reusing a workspace across evaluations avoids allocating them on every call.
+    A workspace must not be shared by threads evaluating at the same time.
+    """
+    nUNS: Np1DArrayFp64
+    nDIV: Np2DArrayFp64
+    nDES: Np2DArrayFp64
+    cells_gen: Np2DArrayFp64
+    dcells_gen: Np2DArrayFp64
+
+    def __init__(self, max_div: MaxGeneration, exp_max_div: MaxGeneration, nt: int, dtype: npt.DTypeLike = np.float64):
+        ...
+
+class StageCache:
+    """
+    Bounded LRU cache for one stage of the model, keyed by the parameters that stage depends on.
+    Cached arrays are read-only, since every later evaluation that hits the cache shares them.
+    """
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int):
+        ...
+
+    def get(self, key: Hashable, compute: Callable[[], tuple[NDArray[np.float64], ...]]) -> tuple[NDArray[np.float64], ...]:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+STAGES: dict[str, tuple[str, ...]]
+"Model stages and the parameters each one depends on"
 
 class Cyton2Model:
     t0: float
@@ -18,7 +68,26 @@ class Cyton2Model:
     nreps: NReps
     exp_max_div: MaxGeneration
     max_div: MaxGeneration
+    "Most generations the model computes (max_div_cap). Cells in generations past exp_max_div are counted in exp_max_div."
     logn: bool
+    gen_tol: float
+    "Generations that can't hold more than gen_tol * n0 cells between them are skipped. Negative computes all max_div."
+    dtype: np.dtype
+    "Precision of evaluate, jacobian and evaluate_batch, float32 or float64. extrapolate always returns float64."
+    ht_idx: NDArray[np.intp]
+    "Index of each harvest time in times"
+    obs_idx: NDArray[np.intp]
+    "Flat index into the (generation, time) cell array for each observation returned by evaluate"
+    n_obs: int
+    "Number of observations returned by evaluate"
+    cache_size: int
+    "Number of entries kept by the cache of each stage"
+    caches: dict[str, StageCache]
+    "Cache of each stage in STAGES"
+    shift_tol: float
+    "Largest distance of b/dt from a whole number, in time steps, for which every generation shares one shifted cdf"
+    interp_tol: float | None
+    "Largest error allowed when interpolating shifted cdfs for b that isn't a multiple of dt. None never interpolates."
 
     def __init__(
         self,
@@ -28,9 +97,35 @@ class Cyton2Model:
         dt: float,
         nreps: NReps = [],
         logn: bool = True,
+        cache_size: int = 4,
+        shift_tol: float = 1e-9,
+        interp_tol: float | None = None,
+        dtype: npt.DTypeLike = np.float64,
+        max_div_cap: MaxGeneration = 30,
+        gen_tol: float = 1e-9,
     ):
         ...
 
+    def _gens_needed(self, times: Np1DArrayFp64, mDiv0: float, sDiv0: float, b: float) -> int:
+        "Highest generation that can hold more than gen_tol * n0 cells over times, at most max_div"
+        ...
+
+    def _shifted_cdf(self, times: Np1DArrayFp64, mDiv0: float, sDiv0: float, b: float) -> Np2DArrayFp64:
+        "cdf of the time to first division, shifted by 0, 1, ..., _gens_needed subsequent division times"
+        ...
+
+    def astype(self, dtype: npt.DTypeLike) -> Cyton2Model:
+        """
+        Copy of this model computing in another precision, e.g. float32 for screening fits
+        """
+        ...
+
+    def new_workspace(self) -> Cyton2Workspace:
+        """
+        Allocates a workspace that can be passed to evaluate, e.g. one per thread
+        """
+        ...
+
     def compute_pdf(self, times: ExtrapolationTimes, mu: float, sig: float) -> Np1DArrayFp64:
         ...
 
@@ -40,6 +135,15 @@ class Cyton2Model:
     def compute_sf(self, times: ExtrapolationTimes, mu: float, sig: float) -> Np1DArrayFp64:
         ...
 
+    def compute_pdf_derivatives(self, times: ExtrapolationTimes, mu: float, sig: float) -> tuple[
+        Np1DArrayFp64, Np1DArrayFp64, Np1DArrayFp64, Np1DArrayFp64, Np1DArrayFp64
+    ]:
+        """
+        Returns the pdf, then the derivatives of the cdf with respect to mu and sig,
+        then the derivatives of the pdf with respect to mu and sig.
+        """
+        ...
+
     # # Return sum of dividing and destiny cells in each generation
     # def evaluate(
     #     self, params: Parameters
@@ -51,11 +155,45 @@ class Cyton2Model:
         mDiv0: float, sDiv0: float,
         mDD: float, sDD: float,
         mDie: float, sDie: float,
-        b: float, DTYPE_t: float
+        b: float, p: float,
+        *, workspace: Cyton2Workspace | None = None,
+        out: Np1DArrayFp64 | None = None
     ) -> Np1DArrayFp64:
+        """
+        Predicts the cell numbers at the harvested time points, ordered by time, replicate then generation.
+        Intermediate arrays are written to workspace (a per-thread default if not given) and the
+        predictions to out (a new array if not given), which is returned.
+        """
+        ...
+
+    def jacobian(self,
+        mUns: float, sUns: float,
+        mDiv0: float, sDiv0: float,
+        mDD: float, sDD: float,
+        mDie: float, sDie: float,
+        b: float, p: float,
+        *, workspace: Cyton2Workspace | None = None,
+        out: Np2DArrayFp64 | None = None
+    ) -> Np2DArrayFp64:
+        """
+        Analytic derivatives of evaluate() with respect to each parameter.
+        Rows are observations, ordered like evaluate(), and columns are parameters, ordered like PARAM_NAMES.
+        """
+        ...
+
+    def evaluate_batch(self, param_matrix: ArrayLike, chunk_size: int = 256) -> Np2DArrayFp64:
+        """
+        Evaluates the model for many parameter sets at once.
+        Each row of param_matrix is one parameter set, in the column order of PARAM_NAMES.
+        Returns one row of predictions per parameter set, ordered like evaluate().
+        """
         ...
 
     def extrapolate(
-        self, model_times: ExtrapolationTimes, params: Parameters
+        self, model_times: ExtrapolationTimes, params: Parameters, fields: Sequence[ExtrapolationField] | None = None
     ) -> ExtrapolationResults:
+        """
+        Predicts cell numbers at model_times and at the harvested time points.
+        Only the outputs in fields are computed and returned, or all of them if fields is None.
+        """
         ...
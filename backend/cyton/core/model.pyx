@@ -2,21 +2,277 @@
 Main Cyton2 algorithm
 Last edit: 28-November-2023
 """
+import threading
+from collections import OrderedDict
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 cimport numpy as np
 np.get_include()
-from scipy.stats import lognorm, norm
+from cyton.core import distributions
+from cyton.core.settings import MAX_DIV_CAP, GEN_TOL, SHIFT_TOL, INTERP_TOL
 
 DTYPE = np.float64
 ctypedef np.float64_t DTYPE_t
 
+# Precisions the model engine can compute in, see Cyton2Model(dtype=...)
+DTYPES = (np.float32, np.float64)
+ctypedef fused real_t:
+	float
+	double
+
+# Column order of the parameter matrix accepted by Cyton2Model.evaluate_batch
+PARAM_NAMES = ('mUns', 'sUns', 'mDiv0', 'sDiv0', 'mDD', 'sDD', 'mDie', 'sDie', 'b', 'p')
+
+# Outputs that Cyton2Model.extrapolate can be asked for. 'hts' is the harvest time projection and the rest are in 'ext'.
+EXTRAPOLATION_FIELDS = ('total_live_cells', 'cells_gen', 'nUNS', 'nDIV', 'nDES', 'densities', 'hts')
+# outputs that need the generation recursion
+CELL_FIELDS = ('total_live_cells', 'cells_gen', 'nUNS', 'nDIV', 'nDES', 'hts')
+
 cimport cython
-@cython.boundscheck(True)
-@cython.wraparound(True)
-@cython.nonecheck(True)
+
+# Highest generation worth computing. Generation j never holds more than
+# 2^j n0 p (1 + dt sum(pdfDD)) cdf(t_last - (j-1)b) cells at any time, so the generations after
+# the one returned hold fewer than gen_tol * n0 cells between them. A negative gen_tol keeps every generation.
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _max_gen(real_t p, real_t dt, const real_t[::1] pdfDD, const real_t[:, :] cdfDiv, double gen_tol) noexcept nogil:
+	cdef Py_ssize_t nt = pdfDD.shape[0]
+	cdef Py_ssize_t igen, it
+	cdef double mass = 0., scale, tail = 0.
+	for it in range(nt):
+		mass += pdfDD[it]
+	scale = p * (1. + dt * mass)
+	for igen in range(cdfDiv.shape[0] - 1, 0, -1):
+		tail += (2.**igen) * scale * cdfDiv[igen-1, nt-1]
+		if tail > gen_tol:
+			return igen
+	return 0
+
+# Bound of _max_gen that doesn't need the other distributions, so that the shifted cdfs of the
+# generations it skips are never computed. Its scale p (1 + dt sum(pdfDD)) is replaced by 4, twice its
+# largest value since p <= 1 and dt sum(pdfDD) approximates the integral of a density.
+# cdf_last[i, j-1] is cdf(t_last - (j-1)b) for parameter set i, and the highest generation over all of them is returned.
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _last_gen(const double[:, ::1] cdf_last, double gen_tol) noexcept nogil:
+	cdef Py_ssize_t i, igen, last = 0
+	cdef double tail
+	for i in range(cdf_last.shape[0]):
+		tail = 0.
+		for igen in range(cdf_last.shape[1], last, -1):
+			tail += 4. * (2.**igen) * cdf_last[i, igen-1]
+			if tail > gen_tol:
+				last = igen
+				break
+	return last
+
+# Generation recursion shared by evaluate, evaluate_batch and extrapolate.
+# Every input is a precomputed distribution array indexed by time, and cdfDiv[k] holds the
+# time to first division CDF shifted by k subsequent division times, i.e. cdf(times - k*b).
+# cdfDiv may be a strided view, and only has rows up to the last generation that can hold cells,
+# see Cyton2Model._shifted_cdf. Generations past _max_gen are skipped, and their rows of nDIV and nDES are zeroed.
+# The loops only touch typed memoryviews, so the kernel runs without holding the GIL.
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _cyton2_kernel(
+		real_t n0, real_t p, real_t dt,
+		const real_t[::1] pdfDD, const real_t[::1] sfUns, const real_t[::1] sfDiv,
+		const real_t[::1] sfDie, const real_t[::1] sfDD, const real_t[:, :] cdfDiv,
+		double gen_tol, Py_ssize_t exp_max_div,
+		real_t[::1] nUNS, real_t[:, ::1] nDIV, real_t[:, ::1] nDES, real_t[:, ::1] cells_gen) noexcept nogil:
+	cdef Py_ssize_t nt = pdfDD.shape[0]
+	cdef Py_ssize_t max_div = nDIV.shape[0] - 1
+	cdef Py_ssize_t max_gen = _max_gen(p, dt, pdfDD, cdfDiv, gen_tol)
+	cdef Py_ssize_t igen, it, out_gen
+	cdef real_t core, acc, difference
+
+	# calculate gen = 0 cells
+	core = n0 * p
+	acc = 0.
+	for it in range(nt):
+		acc += pdfDD[it] * sfDiv[it]  # cumulative destiny integral
+		nUNS[it] = n0 * (1. - p) * sfUns[it]
+		nDIV[0, it] = core * sfDie[it] * sfDiv[it] * sfDD[it]
+		nDES[0, it] = core * sfDie[it] * acc * dt
+		cells_gen[0, it] = nUNS[it] + nDIV[0, it] + nDES[0, it]
+
+	# calculate gen > 0 cells, folding everything past the last observed generation into it
+	for out_gen in range(1, exp_max_div+1):
+		cells_gen[out_gen, :] = 0.
+	for igen in range(1, max_gen+1):
+		core = (2.**igen) * n0 * p
+		out_gen = igen if igen < exp_max_div else exp_max_div
+		acc = 0.
+		for it in range(nt):
+			difference = cdfDiv[igen-1, it] - cdfDiv[igen, it]
+			acc += pdfDD[it] * difference
+			nDIV[igen, it] = core * sfDie[it] * sfDD[it] * difference
+			nDES[igen, it] = core * sfDie[it] * acc * dt
+			cells_gen[out_gen, it] += nDIV[igen, it] + nDES[igen, it]
+	for igen in range(max_gen+1, max_div+1):
+		nDIV[igen, :] = 0.
+		nDES[igen, :] = 0.
+
+# Directional derivative of the generation recursion. Each input of _cyton2_kernel comes with its
+# derivative (prefixed with 'd') along one parameter, and the product rule gives the derivative of
+# the live cells in every generation.
+@cython.boundscheck(False)
+@cython.wraparound(False)
 @cython.cdivision(True)
+cdef void _cyton2_tangent_kernel(
+		real_t n0, real_t p, real_t dp, real_t dt,
+		const real_t[::1] pdfDD, const real_t[::1] sfUns, const real_t[::1] sfDiv,
+		const real_t[::1] sfDie, const real_t[::1] sfDD, const real_t[:, :] cdfDiv,
+		const real_t[::1] dpdfDD, const real_t[::1] dsfUns, const real_t[::1] dsfDiv,
+		const real_t[::1] dsfDie, const real_t[::1] dsfDD, const real_t[:, ::1] dcdfDiv,
+		double gen_tol, Py_ssize_t exp_max_div, real_t[:, ::1] dcells_gen) noexcept nogil:
+	cdef Py_ssize_t nt = pdfDD.shape[0]
+	cdef Py_ssize_t max_gen = _max_gen(p, dt, pdfDD, cdfDiv, gen_tol)
+	cdef Py_ssize_t igen, it, out_gen
+	cdef real_t core, dcore, acc, dacc, difference, ddifference
+
+	# gen = 0 cells
+	core = n0 * p
+	dcore = n0 * dp
+	acc = 0.
+	dacc = 0.
+	for it in range(nt):
+		acc += pdfDD[it] * sfDiv[it]
+		dacc += dpdfDD[it] * sfDiv[it] + pdfDD[it] * dsfDiv[it]
+		dcells_gen[0, it] = (
+			n0 * ((1. - p) * dsfUns[it] - dp * sfUns[it])
+			+ dcore * sfDie[it] * (sfDiv[it] * sfDD[it] + acc * dt)
+			+ core * dsfDie[it] * (sfDiv[it] * sfDD[it] + acc * dt)
+			+ core * sfDie[it] * (dsfDiv[it] * sfDD[it] + sfDiv[it] * dsfDD[it] + dacc * dt)
+		)
+
+	# gen > 0 cells
+	for out_gen in range(1, exp_max_div+1):
+		dcells_gen[out_gen, :] = 0.
+	for igen in range(1, max_gen+1):
+		core = (2.**igen) * n0 * p
+		dcore = (2.**igen) * n0 * dp
+		out_gen = igen if igen < exp_max_div else exp_max_div
+		acc = 0.
+		dacc = 0.
+		for it in range(nt):
+			difference = cdfDiv[igen-1, it] - cdfDiv[igen, it]
+			ddifference = dcdfDiv[igen-1, it] - dcdfDiv[igen, it]
+			acc += pdfDD[it] * difference
+			dacc += dpdfDD[it] * difference + pdfDD[it] * ddifference
+			dcells_gen[out_gen, it] += (
+				dcore * sfDie[it] * (sfDD[it] * difference + acc * dt)
+				+ core * dsfDie[it] * (sfDD[it] * difference + acc * dt)
+				+ core * sfDie[it] * (dsfDD[it] * difference + sfDD[it] * ddifference + dacc * dt)
+			)
+
+# Python entry points to the kernels, releasing the GIL while they run.
+# The array arguments select the float or double version of the kernel.
+def _run_kernel(
+		double n0, double p, double dt,
+		const real_t[::1] pdfDD, const real_t[::1] sfUns, const real_t[::1] sfDiv,
+		const real_t[::1] sfDie, const real_t[::1] sfDD, const real_t[:, :] cdfDiv,
+		double gen_tol, Py_ssize_t exp_max_div,
+		real_t[::1] nUNS, real_t[:, ::1] nDIV, real_t[:, ::1] nDES, real_t[:, ::1] cells_gen):
+	with nogil:
+		_cyton2_kernel(<real_t>n0, <real_t>p, <real_t>dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv,
+			gen_tol, exp_max_div, nUNS, nDIV, nDES, cells_gen)
+
+def _run_kernel_batch(
+		double n0, const double[::1] p, double dt,
+		const real_t[:, ::1] pdfDD, const real_t[:, ::1] sfUns, const real_t[:, ::1] sfDiv,
+		const real_t[:, ::1] sfDie, const real_t[:, ::1] sfDD, const real_t[:, :, ::1] cdfDiv,
+		double gen_tol, Py_ssize_t exp_max_div,
+		real_t[::1] nUNS, real_t[:, ::1] nDIV, real_t[:, ::1] nDES, real_t[:, :, ::1] cells_gen):
+	# one row of every array per parameter set, reusing the same scratch arrays
+	cdef Py_ssize_t i
+	with nogil:
+		for i in range(p.shape[0]):
+			_cyton2_kernel[real_t](<real_t>n0, <real_t>p[i], <real_t>dt, pdfDD[i], sfUns[i], sfDiv[i], sfDie[i], sfDD[i], cdfDiv[i],
+				gen_tol, exp_max_div, nUNS, nDIV, nDES, cells_gen[i])
+
+def _run_tangent_kernel(
+		double n0, double p, double dp, double dt,
+		const real_t[::1] pdfDD, const real_t[::1] sfUns, const real_t[::1] sfDiv,
+		const real_t[::1] sfDie, const real_t[::1] sfDD, const real_t[:, :] cdfDiv,
+		const real_t[::1] dpdfDD, const real_t[::1] dsfUns, const real_t[::1] dsfDiv,
+		const real_t[::1] dsfDie, const real_t[::1] dsfDD, const real_t[:, ::1] dcdfDiv,
+		double gen_tol, Py_ssize_t exp_max_div, real_t[:, ::1] dcells_gen):
+	with nogil:
+		_cyton2_tangent_kernel(<real_t>n0, <real_t>p, <real_t>dp, <real_t>dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv,
+			dpdfDD, dsfUns, dsfDiv, dsfDie, dsfDD, dcdfDiv, gen_tol, exp_max_div, dcells_gen)
+
+def _check_dtype(dtype):
+	dtype = np.dtype(dtype)
+	if dtype not in DTYPES:
+		raise ValueError(f"Unsupported model dtype {dtype}, expected float32 or float64")
+	return dtype
+
+cdef class Cyton2Workspace:
+	"""
+	Scratch arrays used by Cyton2Model.evaluate, sized for one model.
+	Reusing a workspace across evaluations avoids allocating them on every call.
+	A workspace must not be shared by threads evaluating at the same time.
+	"""
+	cdef readonly np.ndarray nUNS, nDIV, nDES, cells_gen, dcells_gen
+
+	def __init__(self, unsigned int max_div, unsigned int exp_max_div, unsigned int nt, dtype=DTYPE):
+		dtype = _check_dtype(dtype)
+		# unstimulated cells, divided cells, destiny cells & live cells per generation
+		self.nUNS = np.zeros(shape=nt, dtype=dtype)
+		self.nDIV = np.zeros(shape=(max_div+1, nt), dtype=dtype)
+		self.nDES = np.zeros(shape=(max_div+1, nt), dtype=dtype)
+		self.cells_gen = np.zeros(shape=(exp_max_div+1, nt), dtype=dtype)
+
+		# derivative of the live cells per generation along one parameter, used by Cyton2Model.jacobian
+		self.dcells_gen = np.zeros(shape=(exp_max_div+1, nt), dtype=dtype)
+
+class StageCache:
+	"""
+	Bounded LRU cache for one stage of the model, keyed by the parameters that stage depends on.
+	Cached arrays are read-only, since every later evaluation that hits the cache shares them.
+	"""
+	def __init__(self, maxsize):
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, compute):
+		with self._lock:
+			value = self._entries.get(key)
+			if value is not None:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return value
+			self.misses += 1
+
+		value = compute()
+		for array in value:
+			array.flags.writeable = False
+		if self.maxsize > 0:
+			with self._lock:
+				self._entries[key] = value
+				while len(self._entries) > self.maxsize:
+					self._entries.popitem(last=False)
+		return value
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+# Model stages and the parameters each one depends on. p and n0 only scale the result, so they have no stage.
+STAGES = {
+	'uns': ('mUns', 'sUns'),           # sfUns
+	'die': ('mDie', 'sDie'),           # sfDie
+	'dd': ('mDD', 'sDD'),              # pdfDD, sfDD
+	'div': ('mDiv0', 'sDiv0', 'b'),    # sfDiv, cdfDiv
+}
+
 class Cyton2Model:
-	def __init__(self, ht, n0, max_div, dt, nreps = [], logn=True):
+	def __init__(self, ht, n0, max_div, dt, nreps = [], logn=True, cache_size=4, shift_tol=SHIFT_TOL, interp_tol=INTERP_TOL, dtype=DTYPE, max_div_cap=MAX_DIV_CAP, gen_tol=GEN_TOL):
 		self.t0 = <DTYPE_t>(0.0)
 		self.tf = <DTYPE_t>(max(ht) + dt)
 		self.dt = <DTYPE_t>(dt)  									# time increment
@@ -30,108 +286,311 @@ class Cyton2Model:
 		self.nreps = nreps  										# experiment number of replicates
 
 		self.exp_max_div = <unsigned int>max_div  					# observed maximum division number
-		self.max_div = <unsigned int>10  							# theoretical maximum division number
+		self.max_div = <unsigned int>max_div_cap  					# theoretical maximum division number
+		self.gen_tol = <double>gen_tol  							# cells (relative to n0) that skipped generations may hold, see _max_gen
 		self.logn = logn
 
+		# precision of the generation recursion and of the arrays it returns; distributions are always
+		# computed in float64 and then rounded, so float32 only trades accuracy for speed in the recursion
+		self.dtype = _check_dtype(dtype)
+
+		# b within shift_tol time steps of a multiple of dt reuses one cdf for every generation,
+		# otherwise the shifted cdfs are interpolated when that is accurate to interp_tol (None never interpolates)
+		self.shift_tol = shift_tol
+		self.interp_tol = interp_tol
+
+		# position of every harvested time in the time array
+		self.ht_idx = np.zeros(shape=len(ht), dtype=np.intp)
+		cdef unsigned int itpt
+		for itpt, t in enumerate(ht):
+			matches = np.flatnonzero(self.times == t)
+			if matches.size == 0:
+				raise ValueError(f"Harvest time {t} is not on the model time grid (dt={dt})")
+			self.ht_idx[itpt] = matches[0]
+
+		# flat index into the (generation, time) 'cells_gen' array for every observation, in (time, replicate, generation) order
+		gens = np.arange(self.exp_max_div+1, dtype=np.intp)
+		self.obs_idx = np.concatenate(
+			[np.tile(gens * self.nt + self.ht_idx[itpt], nrep) for itpt, nrep in enumerate(nreps)] or [np.zeros(0, dtype=np.intp)]
+		).astype(np.intp)
+		self.n_obs = <unsigned int>(self.obs_idx.size)
+
+		# per-thread default workspace for evaluate, and the per-stage caches
+		self.cache_size = cache_size
+		self._init_runtime()
+
+	def _init_runtime(self):
+		self._local = threading.local()
+		self.caches = {stage: StageCache(self.cache_size) for stage in STAGES}
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state['_local'], state['caches']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._init_runtime()
+
+	def astype(self, dtype):
+		# the same model computing in another precision, with its own caches and workspaces
+		model = Cyton2Model.__new__(Cyton2Model)
+		model.__setstate__(dict(self.__getstate__(), dtype=_check_dtype(dtype)))
+		return model
+
+	def new_workspace(self):
+		return Cyton2Workspace(self.max_div, self.exp_max_div, self.nt, self.dtype)
+
+	def _default_workspace(self):
+		workspace = getattr(self._local, 'workspace', None)
+		if workspace is None:
+			workspace = self._local.workspace = self.new_workspace()
+		return workspace
+
 	def compute_pdf(self, times, mu, sig):
-		if self.logn:
-			return lognorm.pdf(times, sig, scale=mu)
-		else:
-			return norm.pdf(times, mu, sig)
+		return distributions.pdf(times, mu, sig, self.logn)
 
 	def compute_cdf(self, times, mu, sig):
-		if self.logn:
-			return lognorm.cdf(times, sig, scale=mu)
-		else:
-			return norm.cdf(times, mu, sig)
+		return distributions.cdf(times, mu, sig, self.logn)
 
 	def compute_sf(self, times, mu, sig):
+		return distributions.sf(times, mu, sig, self.logn)
+
+	def compute_pdf_derivatives(self, times, mu, sig):
+		# pdf, and the partial derivatives of the cdf and pdf with respect to mu and sig.
+		# Both distributions are written in terms of the standard normal variable z,
+		# so that d cdf = phi(z) dz and d pdf = -z pdf dz (- pdf/sig for sig).
+		pdf = self.compute_pdf(times, mu, sig)
 		if self.logn:
-			return lognorm.sf(times, sig, scale=mu)
+			positive = times > 0
+			z = np.where(positive, (np.log(np.where(positive, times, 1.)) - np.log(mu)) / sig, 0.)
+			phi = pdf * times * sig
+			dz_dmu = -1. / (mu * sig)
 		else:
-			return norm.sf(times, mu, sig)
-
-	def _storage(self):
-		cdef np.ndarray[DTYPE_t, ndim=1] pdfDD = np.zeros(shape=self.nt, dtype=DTYPE)
-
-		cdef np.ndarray[DTYPE_t, ndim=1] sfUns = np.zeros(shape=self.nt, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDiv = np.zeros(shape=self.nt, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDie = np.zeros(shape=self.nt, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDD = np.zeros(shape=self.nt, dtype=DTYPE)
-
+			z = (times - mu) / sig
+			phi = pdf * sig
+			dz_dmu = -1. / sig
+		dz_dsig = -z / sig
+
+		dcdf_dmu = phi * dz_dmu
+		dcdf_dsig = phi * dz_dsig
+		dpdf_dmu = -z * pdf * dz_dmu
+		dpdf_dsig = -z * pdf * dz_dsig - pdf / sig
+		return pdf, dcdf_dmu, dcdf_dsig, dpdf_dmu, dpdf_dsig
+
+	def _storage(self, unsigned int n):
 		# declare 3 arrays for unstimulated cells, divided cells & destiny cells
-		cdef np.ndarray[DTYPE_t, ndim=1] nUNS = np.zeros(shape=self.nt, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=2] nDIV = np.zeros(shape=(self.max_div+1, self.nt), dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=2] nDES = np.zeros(shape=(self.max_div+1, self.nt), dtype=DTYPE)
+		nUNS = np.zeros(shape=n, dtype=self.dtype)
+		nDIV = np.zeros(shape=(self.max_div+1, n), dtype=self.dtype)
+		nDES = np.zeros(shape=(self.max_div+1, n), dtype=self.dtype)
 
 		# store number of live cells at all time per generations
-		cdef np.ndarray[DTYPE_t, ndim=2] cells_gen = np.zeros(shape=(self.exp_max_div+1, self.nt), dtype=DTYPE)
+		cells_gen = np.zeros(shape=(self.exp_max_div+1, n), dtype=self.dtype)
+
+		return nUNS, nDIV, nDES, cells_gen
+
+	def _grid_step(self, times):
+		# spacing of a uniform time grid, or None if the grid isn't uniform
+		if times is self.times:
+			return self.dt
+		if times.size < 2:
+			return None
+		step = (times[-1] - times[0]) / (times.size - 1)
+		if np.allclose(np.diff(times), step, rtol=1e-9, atol=0):
+			return step
+		return None
+
+	def _gens_needed(self, times, mDiv0, sDiv0, b):
+		# Highest generation that _max_gen can keep over times, from the cdfs at the last time point alone.
+		# Array parameters give the highest generation over all of them.
+		if self.gen_tol < 0:
+			return self.max_div
+		shifts = np.arange(self.max_div, dtype=DTYPE)
+		cdf_last = self.compute_cdf(times[-1] - shifts * b, mDiv0, sDiv0)
+		return _last_gen(np.ascontiguousarray(np.atleast_2d(cdf_last), dtype=DTYPE), self.gen_tol)
+
+	def _shifted_cdf(self, times, mDiv0, sDiv0, b):
+		# cdf of time to first division, shifted by 0, 1, ..., max_gen subsequent division times,
+		# where max_gen is the last generation that can hold cells, see _gens_needed.
+		# Generation igen takes the difference between rows igen-1 and igen.
+		cdef unsigned int nt = times.size
+		cdef unsigned int igen
+		cdef unsigned int max_gen = self._gens_needed(times, mDiv0, sDiv0, b)
+		step = self._grid_step(times)
+		if step is not None and b >= 0:
+			shift = b / step
+			nshift = int(round(shift))
+			if abs(shift - nshift) <= self.shift_tol:
+				# b is a whole number of time steps: compute the cdf once on a grid that extends max_gen*b
+				# before the first time point, then every row is a view into it, nshift steps behind the last
+				offset = max_gen * nshift
+				ext = self.compute_cdf(times[0] + step * np.arange(-offset, nt), mDiv0, sDiv0)
+				return as_strided(ext[offset:], shape=(max_gen+1, nt), strides=(-nshift * ext.itemsize, ext.itemsize), writeable=False)
+
+			if self.interp_tol is not None:
+				# Linear interpolation between the points of the extended grid. The interpolation error
+				# is at most step**2/8 * max|cdf''|, estimated here from the second differences.
+				offset = int(np.ceil(max_gen * shift)) + 1
+				ext = self.compute_cdf(times[0] + step * np.arange(-offset, nt + 1), mDiv0, sDiv0)
+				if np.abs(np.diff(ext, 2)).max(initial=0.) / 8. <= self.interp_tol:
+					cdfDiv = np.empty(shape=(max_gen+1, nt), dtype=DTYPE)
+					for igen in range(max_gen+1):
+						position = offset - igen * shift
+						lower = int(np.floor(position))
+						weight = position - lower
+						cdfDiv[igen,:] = (1. - weight) * ext[lower:lower+nt] + weight * ext[lower+1:lower+1+nt]
+					return cdfDiv
+
+		# otherwise evaluate every shift exactly
+		cdfDiv = np.empty(shape=(max_gen+1, nt), dtype=DTYPE)
+		for igen in range(max_gen+1):
+			cdfDiv[igen,:] = self.compute_cdf(times - <DTYPE_t>(igen*b), mDiv0, sDiv0)
+		return cdfDiv
+
+	def _distributions(self, times, mUns, sUns, mDiv0, sDiv0, mDD, sDD, mDie, sDie, b):
+		# Each stage is looked up in its own cache, so a change to one parameter only recomputes
+		# the stage that depends on it. Extrapolation grids are told apart from the model grid by content.
+		# Cached arrays are already in the model's dtype.
+		grid = (self.logn, None if times is self.times else times.tobytes())
+		dtype = self.dtype
+		sfUns, = self.caches['uns'].get((grid, mUns, sUns), lambda: (
+			np.asarray(self.compute_sf(times, mUns, sUns), dtype=dtype),
+		))
+		sfDie, = self.caches['die'].get((grid, mDie, sDie), lambda: (
+			np.asarray(self.compute_sf(times, mDie, sDie), dtype=dtype),
+		))
+		pdfDD, sfDD = self.caches['dd'].get((grid, mDD, sDD), lambda: (
+			np.asarray(self.compute_pdf(times, mDD, sDD), dtype=dtype),
+			np.asarray(self.compute_sf(times, mDD, sDD), dtype=dtype),
+		))
+		sfDiv, cdfDiv = self.caches['div'].get((grid, mDiv0, sDiv0, b), lambda: (
+			np.asarray(self.compute_sf(times, mDiv0, sDiv0), dtype=dtype),
+			np.asarray(self._shifted_cdf(times, mDiv0, sDiv0, b), dtype=dtype),
+		))
+		return pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv
 
-		return pdfDD, sfUns, sfDiv, sfDie, sfDD, nUNS, nDIV, nDES, cells_gen
-	
 	# return sum of dividing and destiny cells in each generation
 	def evaluate(self,
 			DTYPE_t mUns, DTYPE_t sUns,    # unstimulated death
 			DTYPE_t mDiv0, DTYPE_t sDiv0,  # time to first division
 			DTYPE_t mDD, DTYPE_t sDD,      # division destiny
 			DTYPE_t mDie, DTYPE_t sDie,    # stimulated death
-			DTYPE_t b, DTYPE_t p):         # subsequent division time, activation probability
+			DTYPE_t b, DTYPE_t p,          # subsequent division time, activation probability
+			*, Cyton2Workspace workspace=None, out=None):
 		cdef np.ndarray[DTYPE_t, ndim=1] times
 		times = self.times
 
-		# create empty arrays
-		pdfDD, sfUns, sfDiv, sfDie, sfDD, nUNS, nDIV, nDES, cells_gen = self._storage()
-
-		# compute probability distribution
-		pdfDD = self.compute_pdf(times, mDD, sDD)
+		if workspace is None:
+			workspace = self._default_workspace()
 
-		# compute survival functions (i.e. 1 - cdf)
-		sfUns = self.compute_sf(times, mUns, sUns)
-		sfDiv = self.compute_sf(times, mDiv0, sDiv0)
-		sfDie = self.compute_sf(times, mDie, sDie)
-		sfDD = self.compute_sf(times, mDD, sDD)
+		# compute probability distributions and survival functions (i.e. 1 - cdf)
+		pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv = self._distributions(times, mUns, sUns, mDiv0, sDiv0, mDD, sDD, mDie, sDie, b)
 
-		# calculate gen = 0 cells
-		cdef DTYPE_t x, y
-		nUNS = self.n0 * (1. - p) * sfUns
-		nDIV[0,:] = self.n0 * p * sfDie * sfDiv * sfDD
-		nDES[0,:] = self.n0 * p * sfDie * np.cumsum([x * y for x, y in zip(pdfDD, sfDiv)]) * self.dt
-		cells_gen[0,:] = nUNS + nDIV[0,:] + nDES[0,:]  # cells in generation 0
+		# calculate cells in every generation
+		_run_kernel(self.n0, p, self.dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv, self.gen_tol, self.exp_max_div,
+			workspace.nUNS, workspace.nDIV, workspace.nDES, workspace.cells_gen)
 
-		# calculate gen > 0 cells
-		cdef DTYPE_t core
-		cdef unsigned int igen
-		cdef np.ndarray[DTYPE_t, ndim=1] upp_cdfDiv
-		cdef np.ndarray[DTYPE_t, ndim=1] low_cdfDiv
-		cdef np.ndarray[DTYPE_t, ndim=1] difference
-		for igen in range(1, self.max_div+1):
-			core = <DTYPE_t>(2.**igen * self.n0 * p)
-
-			upp_cdfDiv = self.compute_cdf(times - <DTYPE_t>((igen - 1.)*b), mDiv0, sDiv0)
-			low_cdfDiv = self.compute_cdf(times - <DTYPE_t>(igen*b), mDiv0, sDiv0)
-			difference = upp_cdfDiv - low_cdfDiv
-
-			nDIV[igen,:] = core * sfDie * sfDD * difference
-			nDES[igen,:] = core * sfDie * np.cumsum([x * y for x, y in zip(pdfDD, difference)]) * self.dt
-
-			if igen < self.exp_max_div:
-				cells_gen[igen,:] = nDIV[igen,:] + nDES[igen,:]
-			else:
-				cells_gen[self.exp_max_div,:] += nDIV[igen,:] + nDES[igen,:]
-		
 		# extract number of live cells at harvested time points from 'cells_gen' array
-		cdef DTYPE_t cell, ht
-		cdef unsigned int itpt, irep, t_idx
-		cdef list model = []
-		for itpt, ht in enumerate(self.ht):
-			t_idx = np.where(times == ht)[0][0]
-			for irep in range(self.nreps[itpt]):
-				for igen in range(self.exp_max_div+1):
-					cell = <DTYPE_t>cells_gen[igen, t_idx]
-					model.append(cell)
-		return np.asfarray(model)
-
-	def extrapolate(self, model_times, params):
+		if out is None:
+			out = np.empty(shape=self.n_obs, dtype=self.dtype)
+		return np.take(workspace.cells_gen, self.obs_idx, out=out)
+
+	# return derivatives of evaluate() with respect to every parameter, one column per parameter in PARAM_NAMES order
+	def jacobian(self,
+			DTYPE_t mUns, DTYPE_t sUns,
+			DTYPE_t mDiv0, DTYPE_t sDiv0,
+			DTYPE_t mDD, DTYPE_t sDD,
+			DTYPE_t mDie, DTYPE_t sDie,
+			DTYPE_t b, DTYPE_t p,
+			*, Cyton2Workspace workspace=None, out=None):
+		times = self.times
+		if workspace is None:
+			workspace = self._default_workspace()
+		pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv = self._distributions(times, mUns, sUns, mDiv0, sDiv0, mDD, sDD, mDie, sDie, b)
+
+		# derivatives of each distribution; survival functions move opposite to their cdf
+		_, dcdfUns_dm, dcdfUns_ds, _, _ = self.compute_pdf_derivatives(times, mUns, sUns)
+		_, dcdfDie_dm, dcdfDie_ds, _, _ = self.compute_pdf_derivatives(times, mDie, sDie)
+		_, dcdfDD_dm, dcdfDD_ds, dpdfDD_dm, dpdfDD_ds = self.compute_pdf_derivatives(times, mDD, sDD)
+		# only for the generations that have shifted cdfs
+		shifts = np.arange(cdfDiv.shape[0], dtype=DTYPE)[:,None]
+		pdfDiv, dcdfDiv_dm, dcdfDiv_ds, _, _ = self.compute_pdf_derivatives(times[None,:] - shifts*b, mDiv0, sDiv0)
+		dcdfDiv_db = -shifts * pdfDiv
+
+		zeros = np.zeros(shape=self.nt, dtype=DTYPE)
+		zeros_div = np.zeros(shape=(cdfDiv.shape[0], self.nt), dtype=DTYPE)
+		# (dpdfDD, dsfUns, dsfDiv, dsfDie, dsfDD, dcdfDiv, dp) for every parameter
+		tangents = {
+			'mUns': (zeros, -dcdfUns_dm, zeros, zeros, zeros, zeros_div, 0.),
+			'sUns': (zeros, -dcdfUns_ds, zeros, zeros, zeros, zeros_div, 0.),
+			'mDiv0': (zeros, zeros, -dcdfDiv_dm[0], zeros, zeros, dcdfDiv_dm, 0.),
+			'sDiv0': (zeros, zeros, -dcdfDiv_ds[0], zeros, zeros, dcdfDiv_ds, 0.),
+			'mDD': (dpdfDD_dm, zeros, zeros, zeros, -dcdfDD_dm, zeros_div, 0.),
+			'sDD': (dpdfDD_ds, zeros, zeros, zeros, -dcdfDD_ds, zeros_div, 0.),
+			'mDie': (zeros, zeros, zeros, -dcdfDie_dm, zeros, zeros_div, 0.),
+			'sDie': (zeros, zeros, zeros, -dcdfDie_ds, zeros, zeros_div, 0.),
+			'b': (zeros, zeros, zeros, zeros, zeros, dcdfDiv_db, 0.),
+			'p': (zeros, zeros, zeros, zeros, zeros, zeros_div, 1.),
+		}
+
+		if out is None:
+			out = np.empty(shape=(self.n_obs, len(PARAM_NAMES)), dtype=self.dtype)
+		cdef unsigned int ipar
+		for ipar, name in enumerate(PARAM_NAMES):
+			dpdfDD, dsfUns, dsfDiv, dsfDie, dsfDD, dcdfDiv, dp = [
+				np.ascontiguousarray(tangent, dtype=self.dtype) if isinstance(tangent, np.ndarray) else tangent for tangent in tangents[name]
+			]
+			_run_tangent_kernel(self.n0, p, dp, self.dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv,
+				dpdfDD, dsfUns, dsfDiv, dsfDie, dsfDD, dcdfDiv, self.gen_tol, self.exp_max_div, workspace.dcells_gen)
+			out[:, ipar] = workspace.dcells_gen.ravel()[self.obs_idx]
+		return out
+
+	# return sum of dividing and destiny cells in each generation, for many parameter sets at once
+	def evaluate_batch(self, param_matrix, unsigned int chunk_size=256):
+		pars = np.atleast_2d(np.asarray(param_matrix, dtype=DTYPE))
+		if pars.ndim != 2 or pars.shape[1] != len(PARAM_NAMES):
+			raise ValueError(f"Expected a parameter matrix of shape (N, {len(PARAM_NAMES)}), got {pars.shape}")
+
+		cdef unsigned int n = pars.shape[0]
+		model = np.zeros(shape=(n, self.n_obs), dtype=self.dtype)
+		cdef unsigned int start
+		for start in range(0, n, chunk_size):
+			cells_gen = self._cells_gen_batch(pars[start:start+chunk_size])
+			model[start:start+chunk_size] = cells_gen.reshape(cells_gen.shape[0], -1)[:, self.obs_idx]
+		return model
+
+	def _cells_gen_batch(self, pars):
+		# every parameter becomes an (N, 1) column so that it broadcasts against the (nt,) time array
+		mUns, sUns, mDiv0, sDiv0, mDD, sDD, mDie, sDie, b, p = [pars[:, [i]] for i in range(len(PARAM_NAMES))]
+		times = self.times
+		shifts = np.arange(self._gens_needed(times, mDiv0, sDiv0, b) + 1, dtype=DTYPE)
+
+		dtype = self.dtype
+		pdfDD = np.ascontiguousarray(self.compute_pdf(times, mDD, sDD), dtype=dtype)
+		sfUns = np.ascontiguousarray(self.compute_sf(times, mUns, sUns), dtype=dtype)
+		sfDiv = np.ascontiguousarray(self.compute_sf(times, mDiv0, sDiv0), dtype=dtype)
+		sfDie = np.ascontiguousarray(self.compute_sf(times, mDie, sDie), dtype=dtype)
+		sfDD = np.ascontiguousarray(self.compute_sf(times, mDD, sDD), dtype=dtype)
+		# (N, max_gen+1, nt): cdf(times - k*b) for each parameter set and shift k
+		cdfDiv = np.ascontiguousarray(self.compute_cdf(
+			times[None,None,:] - shifts[None,:,None] * b[:,:,None], mDiv0[:,:,None], sDiv0[:,:,None]), dtype=dtype)
+
+		# run the generation recursion for each parameter set, reusing one set of scratch arrays
+		workspace = self.new_workspace()
+		cells_gen = np.zeros(shape=(pars.shape[0], self.exp_max_div+1, self.nt), dtype=dtype)
+		_run_kernel_batch(self.n0, np.ascontiguousarray(p[:,0]), self.dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv,
+			self.gen_tol, self.exp_max_div, workspace.nUNS, workspace.nDIV, workspace.nDES, cells_gen)
+		return cells_gen
+
+	def extrapolate(self, model_times, params, fields=None):
+		# fields selects what is returned, see EXTRAPOLATION_FIELDS, and None returns everything.
+		# Arrays that weren't requested are left out of the result, and aren't computed where possible.
+		if fields is None:
+			fields = EXTRAPOLATION_FIELDS
+		unknown = set(fields).difference(EXTRAPOLATION_FIELDS)
+		if unknown:
+			raise ValueError(f"Unknown extrapolation fields {sorted(unknown)}, expected some of {EXTRAPOLATION_FIELDS}")
+
 		# Unstimulated death parameters
 		cdef DTYPE_t mUns = params['mUns']
 		cdef DTYPE_t sUns = params['sUns']
@@ -149,87 +608,47 @@ class Cyton2Model:
 		cdef DTYPE_t p = params['p']
 
 		cdef unsigned int n = model_times.size
-
-		# Compute pdf
-		cdef np.ndarray[DTYPE_t, ndim=1] pdfDD = np.zeros(shape=n, dtype=DTYPE)
-		pdfDD = self.compute_pdf(model_times, mDD, sDD)
-
-		# Compute 1 - cdf
-		cdef np.ndarray[DTYPE_t, ndim=1] sfUns = np.zeros(shape=n, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDiv = np.zeros(shape=n, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDie = np.zeros(shape=n, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=1] sfDD = np.zeros(shape=n, dtype=DTYPE)
-		sfUns = self.compute_sf(model_times, mUns, sUns)
-		sfDiv = self.compute_sf(model_times, mDiv0, sDiv0)
-		sfDie = self.compute_sf(model_times, mDie, sDie)
-		sfDD = self.compute_sf(model_times, mDD, sDD)
-
-		# declare 3 arrays for unstimulated cells, divided cells & destiny cells
-		cdef np.ndarray[DTYPE_t, ndim=1] nUNS = np.zeros(shape=n, dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=2] nDIV = np.zeros(shape=(self.max_div+1, n), dtype=DTYPE)
-		cdef np.ndarray[DTYPE_t, ndim=2] nDES = np.zeros(shape=(self.max_div+1, n), dtype=DTYPE)
-
-		# store number of cells at all time per generation
-		cdef np.ndarray[DTYPE_t, ndim=2] cells_gen = np.zeros(shape=(self.exp_max_div+1, n), dtype=DTYPE)
-
-		# store total live cells
-		cdef np.ndarray[DTYPE_t, ndim=1] total_live_cells = np.zeros(shape=n, dtype=DTYPE)
-
-		# calculate gen = 0 cells
-		cdef DTYPE_t x, y
-		nUNS = self.n0 * (1. - p) * sfUns
-		nDIV[0,:] = self.n0 * p * sfDie * sfDiv * sfDD
-		nDES[0,:] = self.n0 * p * sfDie * np.cumsum([x * y for x, y in zip(pdfDD, sfDiv)]) * self.dt
-		cells_gen[0,:] = nUNS + nDIV[0,:] + nDES[0,:]  # cells in generation 0
-
-		# calculate gen > 0 cells
-		cdef DTYPE_t core
-		cdef unsigned int igen
-		for igen in range(1, self.max_div+1):
-			core = <DTYPE_t>(2.**igen * self.n0 * p)
-
-			upp_cdfDiv = self.compute_cdf(model_times - <DTYPE_t>((igen - 1.)*b), mDiv0, sDiv0)
-			low_cdfDiv = self.compute_cdf(model_times - <DTYPE_t>(igen*b), mDiv0, sDiv0)
-			difference = upp_cdfDiv - low_cdfDiv
-
-			nDIV[igen,:] = core * sfDie * sfDD * difference
-			nDES[igen,:] = core * sfDie * np.cumsum([x * y for x, y in zip(pdfDD, difference)]) * self.dt
-
-			if igen < self.exp_max_div:
-				cells_gen[igen,:] = nDIV[igen,:] + nDES[igen,:]
-			else:
-				cells_gen[self.exp_max_div,:] += nDIV[igen,:] + nDES[igen,:]
-		total_live_cells = np.sum(cells_gen, axis=0)  # sum over all generations per time point
-
-		cdef unsigned int itpt
-		cdef list cells_gen_at_ht = [[] for _ in range(len(self.ht))]
-		cdef np.ndarray[DTYPE_t, ndim=1] total_live_cells_at_ht = np.zeros(shape=(len(self.ht)), dtype=DTYPE)
-		for itpt, ht in enumerate(self.ht):
-			t_idx = np.where(model_times == ht)[0][0]
-			for igen in range(self.exp_max_div+1):
-				cells_gen_at_ht[itpt].append(cells_gen[igen, t_idx])
-			total_live_cells_at_ht[itpt] = total_live_cells[t_idx]
-
-		return {
-			# Extrapolated cell numbers
-			'ext': {
-				'time_points': model_times,
-				'total_live_cells': total_live_cells,
-				'cells_gen': cells_gen,
-				'nUNS': nUNS,
-				'nDIV': nDIV,
-				'nDES': nDES,
-				'densities': {
-					'uns': self.compute_pdf(model_times, mUns, sUns),
-					'div0': self.compute_pdf(model_times, mDiv0, sDiv0),
-					'die': self.compute_pdf(model_times, mDie, sDie),
-					'dd': self.compute_pdf(model_times, mDD, sDD)
+		ext = {'time_points': model_times}
+		results = {'ext': ext}
+
+		if not set(fields).isdisjoint(CELL_FIELDS):
+			# Compute pdf and 1 - cdf
+			pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv = self._distributions(model_times, mUns, sUns, mDiv0, sDiv0, mDD, sDD, mDie, sDie, b)
+
+			# declare 3 arrays for unstimulated cells, divided cells & destiny cells, and the number of cells at all time per generation
+			nUNS, nDIV, nDES, cells_gen = self._storage(n)
+
+			# calculate cells in every generation, then report them in float64 whatever the model's dtype
+			_run_kernel(self.n0, p, self.dt, pdfDD, sfUns, sfDiv, sfDie, sfDD, cdfDiv, self.gen_tol, self.exp_max_div,
+				nUNS, nDIV, nDES, cells_gen)
+			cells_gen = cells_gen.astype(DTYPE, copy=False)
+			total_live_cells = np.sum(cells_gen, axis=0)  # sum over all generations per time point
+
+			for field, array in (('total_live_cells', total_live_cells), ('cells_gen', cells_gen), ('nUNS', nUNS), ('nDIV', nDIV), ('nDES', nDES)):
+				if field in fields:
+					ext[field] = array.astype(DTYPE, copy=False)
+
+			if 'hts' in fields:
+				# Collect cell numbers at harvested time points
+				cells_gen_at_ht = [[] for _ in range(len(self.ht))]
+				total_live_cells_at_ht = np.zeros(shape=(len(self.ht)), dtype=DTYPE)
+				for itpt, ht in enumerate(self.ht):
+					t_idx = np.where(model_times == ht)[0][0]
+					for igen in range(self.exp_max_div+1):
+						cells_gen_at_ht[itpt].append(cells_gen[igen, t_idx])
+					total_live_cells_at_ht[itpt] = total_live_cells[t_idx]
+				results['hts'] = {
+					'harvest_times': self.ht,
+					'total_live_cells': total_live_cells_at_ht,
+					'cells_gen': cells_gen_at_ht
 				}
-			},
-			# Collect cell numbers at harvested time points
-			'hts': { 
-				'harvest_times': self.ht,
-				'total_live_cells': total_live_cells_at_ht,
-				'cells_gen': cells_gen_at_ht
+
+		if 'densities' in fields:
+			ext['densities'] = {
+				'uns': self.compute_pdf(model_times, mUns, sUns),
+				'div0': self.compute_pdf(model_times, mDiv0, sDiv0),
+				'die': self.compute_pdf(model_times, mDie, sDie),
+				'dd': self.compute_pdf(model_times, mDD, sDD)
 			}
-		}
+
+		return results
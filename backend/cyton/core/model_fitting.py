@@ -3,13 +3,28 @@ Last Edit: 11-Feb-2024
 
 Model Fitting
 """
-from typing import cast
+import os
+import copy
+import time
+import heapq
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from collections.abc import Callable, Generator, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import partial
+from typing import Any, cast
 import tqdm
-import pandas as pd
 import numpy as np
 import lmfit as lmf
-from cyton.core.model import Cyton2Model
-from cyton.core.settings import MAX_NFEV, LM_FIT_KWS, ITER_SEARCH
+from scipy.optimize import least_squares
+from scipy.stats import qmc
+from cyton.core.model import Cyton2Model, PARAM_NAMES
+from cyton.core.settings import MAX_NFEV, LM_FIT_KWS, ITER_SEARCH, ANALYTIC_JACOBIAN, N_REFINE, N_WORKERS, FIT_BACKEND, START_DESIGN, N_REPRODUCE, REPRODUCE_RTOL, N_WARM_STARTS, WARM_START_SCALE, WARM_REPRODUCE, WARM_CACHE_SIZE, N_BOOTSTRAP, BOOTSTRAP_CI
+from cyton.core.budget import FitBudget, BudgetExceeded, budget_scope, current_budget, set_current_budget, within_budget
+from cyton.core.telemetry import TimedModel, FitTelemetry, record_starts
 from cyton.core.types import *
 from numpy.typing import NDArray
 from cyton.core.utils import flatten
@@ -26,31 +41,304 @@ def residual(pars: lmf.Parameters, x: NDArray, data: NDArray, model: Cyton2Model
     )
 	return data - pred
 
-# Fitting Process
-def fit(exp_ht: PerTime[HarvestTime], cell_gens_reps: PerTime[PerRep[PerGen[CellCount]]], params: lmf.Parameters, paramExcl: ExcludedParameters, model: Cyton2Model) -> Parameters:
+# Model: Jacobian of the residual, one column per varying parameter
+def residual_jacobian(pars: lmf.Parameters, x: NDArray, data: NDArray, model: Cyton2Model) -> NDArray[np.float_]:
+	vals: Parameters = cast(Parameters, pars.valuesdict())
+	jac = model.jacobian(*[vals[name] for name in PARAM_NAMES])
+	return -jac[:, [PARAM_NAMES.index(name) for name in pars if pars[name].vary]]
 
-    x_gens = np.array(exp_ht[0])
-    y_cells = np.fromiter(flatten(cell_gens_reps), dtype=float)
+# Single Levenberg-Marquardt run from the current values in params
+def minimize_lmfit(params: lmf.Parameters, x_gens: NDArray, y_cells: NDArray, model: Cyton2Model) -> tuple[float, lmf.Parameters]:
+    mini = lmf.Minimizer(residual, params, fcn_args=(x_gens, y_cells, model), **LM_FIT_KWS)
+    if ANALYTIC_JACOBIAN and hasattr(model, 'jacobian'):
+        res = mini.minimize(method='leastsq', max_nfev=MAX_NFEV, Dfun=residual_jacobian)
+    else:
+        res = mini.minimize(method='leastsq', max_nfev=MAX_NFEV)
+    # MinimizerResult sets its attributes at run time
+    return res.chisqr, cast(lmf.Parameters, getattr(res, 'params'))
+
+# Single trust-region reflective run from the current values in params. This works on arrays of the
+# varying parameters with native bounds, so params is only read at the start and written at the end.
+def minimize_trf(params: lmf.Parameters, y_cells: NDArray, model: Cyton2Model) -> tuple[float, lmf.Parameters]:
+    values = np.array([params[name].value for name in PARAM_NAMES], dtype=float)
+    vary = np.array([params[name].vary for name in PARAM_NAMES])
+    lower = np.array([params[name].min for name in PARAM_NAMES])[vary]
+    upper = np.array([params[name].max for name in PARAM_NAMES])[vary]
+
+    def residual_vector(x: NDArray) -> NDArray:
+        values[vary] = x
+        return y_cells - model.evaluate(*values)
+
+    def residual_jacobian_vector(x: NDArray) -> NDArray:
+        values[vary] = x
+        return -model.jacobian(*values)[:, vary]
+
+    params = copy.deepcopy(params)
+    if not vary.any():
+        return float(np.sum(residual_vector(values[vary])**2)), params
+
+    # least_squares isn't annotated, so its jac is inferred to be a str from the default
+    jac: Any = residual_jacobian_vector if ANALYTIC_JACOBIAN and hasattr(model, 'jacobian') else '2-point'
+    res = least_squares(residual_vector, np.clip(values[vary], lower, upper), jac=jac, bounds=(lower, upper),
+                        method='trf', x_scale='jac', max_nfev=MAX_NFEV)
+    for name, value in zip(np.array(PARAM_NAMES)[vary], res.x.tolist()):
+        params[name].set(value=value)
+    return 2 * res.cost, params
 
+# Single local fit from the current values in params, with the given backend
+def minimize(params: lmf.Parameters, x_gens: NDArray, y_cells: NDArray, model: Cyton2Model, backend: FitBackend = FIT_BACKEND) -> tuple[float, lmf.Parameters]:
+    if backend == 'lmfit':
+        return minimize_lmfit(params, x_gens, y_cells, model)
+    elif backend == 'trf':
+        return minimize_trf(params, y_cells, model)
+    raise ValueError(f"Unknown fit backend {backend}, expected 'lmfit' or 'trf'")
+
+# Local fit that also returns its telemetry. If the current budget runs out during the fit,
+# it returns a nan chi-square with the initial params.
+def timed_minimize(params: lmf.Parameters, x_gens: NDArray, y_cells: NDArray, model: Cyton2Model, backend: FitBackend = FIT_BACKEND) -> tuple[float, lmf.Parameters, StartTelemetry]:
+    timed = TimedModel(model)
+    start = time.perf_counter()
+    try:
+        chisqr, fitted = minimize(params, x_gens, y_cells, cast(Cyton2Model, timed), backend)
+    except BudgetExceeded:
+        chisqr, fitted = np.nan, copy.deepcopy(params)
+    return chisqr, fitted, timed.telemetry(time.perf_counter() - start)
+
+# Refits params with model, recording it as a refinement in telemetry
+def refine(params: lmf.Parameters, x_gens: NDArray, y_cells: NDArray, model: Cyton2Model, backend: FitBackend, telemetry: FitTelemetry | None) -> tuple[float, lmf.Parameters]:
+    chisqr, fitted, start_telemetry = timed_minimize(params, x_gens, y_cells, model, backend)
+    if telemetry is not None:
+        telemetry.record(chisqr, start_telemetry, start=False)
+    return chisqr, fitted
+
+# One start of the search, from the given initial guesses of the unlocked parameters
+def fit_start(initial: dict[str, float], params: lmf.Parameters, x_gens: NDArray, y_cells: NDArray, model: Cyton2Model, backend: FitBackend = FIT_BACKEND) -> tuple[float, lmf.Parameters, StartTelemetry]:
+    params = copy.deepcopy(params)
+    for par, value in initial.items():
+        params[par].set(value=value)
+
+    return timed_minimize(params, x_gens, y_cells, model, backend)
+
+# Initial guesses of the unlocked parameters for n starts, spread over their bounds
+def start_design(params: lmf.Parameters, paramExcl: ExcludedParameters, n: int, design: StartDesign = START_DESIGN) -> list[dict[str, float]]:
+    names = [par for par in params if par not in paramExcl]
+    if n <= 0:
+        return []
+    if design == 'uniform':
+        # Independent random draws, in the order the original fitting procedure made them
+        rng = np.random.RandomState(seed=894375982)
+        return [{par: rng.uniform(low=params[par].min, high=params[par].max) for par in names} for _ in range(n)]
+    if not names:
+        return [{} for _ in range(n)]
+
+    if design == 'sobol':
+        # Sobol points are best balanced in powers of 2, so take the first n of the next one
+        unit = qmc.Sobol(d=len(names), seed=894375982).random_base2(int(np.ceil(np.log2(n))))[:n]
+    elif design == 'lhs':
+        unit = qmc.LatinHypercube(d=len(names), seed=894375982).random(n)
+    else:
+        raise ValueError(f"Unknown start design {design}, expected 'sobol', 'lhs' or 'uniform'")
+    lower = np.array([params[par].min for par in names])
+    upper = np.array([params[par].max for par in names])
+    return [dict(zip(names, row)) for row in (lower + unit * (upper - lower)).tolist()]
+
+# Initial guesses for a warm start: each previous fit, then N_WARM_STARTS random perturbations of it
+# that move every unlocked parameter by up to WARM_START_SCALE of its range, within its bounds
+def warm_start_design(params: lmf.Parameters, paramExcl: ExcludedParameters, previous: list[dict[str, float]]) -> list[dict[str, float]]:
+    names = [par for par in params if par not in paramExcl]
     rng = np.random.RandomState(seed=894375982)
-    candidates = {'result': [], 'residual': []}
-    for _ in tqdm.trange(ITER_SEARCH, leave=False, position=2*0+1):
-        # Random initial guesses
-        for par in params:
-            if par in paramExcl: pass  # Ignore locked parameters
-            else:
-                par_min, par_max = params[par].min, params[par].max
-                params[par].set(value=rng.uniform(low=par_min, high=par_max))
-
-        mini = lmf.Minimizer(residual, params, fcn_args=(x_gens, y_cells, model), **LM_FIT_KWS)
-        res = mini.minimize(method='leastsq', max_nfev=MAX_NFEV)
+    initials = []
+    for fitted in previous:
+        centre = {par: float(np.clip(fitted.get(par, cast(float, params[par].value)), params[par].min, params[par].max)) for par in names}
+        initials.append(centre)
+        for _ in range(N_WARM_STARTS):
+            perturbed = {}
+            for par, value in centre.items():
+                width = params[par].max - params[par].min
+                step = WARM_START_SCALE * (width if np.isfinite(width) else abs(value))
+                perturbed[par] = float(np.clip(value + rng.uniform(-step, step), params[par].min, params[par].max))
+            initials.append(perturbed)
+    return initials
+
+# Best fit of previous calls to fit() for each dataset, which a warm start also starts from
+_previous_fits: OrderedDict[bytes, Parameters] = OrderedDict()
+_previous_fits_lock = threading.Lock()
 
-        candidates['result'].append(res)
-        candidates['residual'].append(res.chisqr)
+def _data_key(x_gens: NDArray, y_cells: NDArray) -> bytes:
+    return hashlib.sha1(np.ascontiguousarray(x_gens, dtype=float).tobytes() + y_cells.tobytes()).digest()
 
-    fit_results = pd.DataFrame(candidates)
-    fit_results.sort_values('residual', ascending=True, inplace=True)  # Find lowest RSS
+def previous_fit(x_gens: NDArray, y_cells: NDArray) -> Parameters | None:
+    with _previous_fits_lock:
+        return _previous_fits.get(_data_key(x_gens, y_cells))
 
-    best_fit = fit_results.iloc[0]['result'].params.valuesdict()
+def remember_fit(x_gens: NDArray, y_cells: NDArray, best_fit: Parameters) -> None:
+    key = _data_key(x_gens, y_cells)
+    with _previous_fits_lock:
+        _previous_fits[key] = best_fit
+        _previous_fits.move_to_end(key)
+        while len(_previous_fits) > WARM_CACHE_SIZE:
+            _previous_fits.popitem(last=False)
+
+# Results of every start in order. Closing the iterator early cancels the starts that haven't begun.
+# The workers share the current budget of the calling thread.
+def run_starts[T, R](start: Callable[[T], R], initials: list[T], n_workers: int) -> Generator[R, None, None]:
+    if n_workers > 1:
+        # Spawned rather than forked workers, since the API runs fits from a thread
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=set_current_budget, initargs=(current_budget(),)) as pool:
+            try:
+                yield from pool.map(start, initials)
+            finally:
+                pool.shutdown(cancel_futures=True)
+    else:
+        yield from map(start, initials)
+
+# Best n_keep starts, in order of chi-square, stopping once n_reproduce starts have reached the best one
+def best_starts[P](results: Iterable[tuple[float, P]], n_keep: int, n_reproduce: int | None = N_REPRODUCE) -> list[tuple[float, P]]:
+    kept: list[tuple[float, int, P]] = []  # heap of (-chisqr, -index, params), worst on top
+    chisqrs: list[float] = []
+    for index, (chisqr, params) in enumerate(results):
+        chisqr = np.inf if np.isnan(chisqr) else chisqr
+        entry = (-chisqr, -index, params)
+        if len(kept) < n_keep:
+            heapq.heappush(kept, entry)
+        else:
+            heapq.heappushpop(kept, entry)
+
+        chisqrs.append(chisqr)
+        best = min(chisqrs)
+        if n_reproduce is not None and sum(value <= best + REPRODUCE_RTOL * abs(best) for value in chisqrs) >= n_reproduce:
+            break
+    return [(-neg_chisqr, params) for neg_chisqr, _, params in sorted(kept, reverse=True)]
+
+# Global search: fit from up to ITER_SEARCH starting points, returning the best (chi-square, parameters) fitted with model
+def search(x_gens: NDArray, y_cells: NDArray, params: lmf.Parameters, paramExcl: ExcludedParameters, model: Cyton2Model, screening_model: Cyton2Model | None, n_workers: int, backend: FitBackend = FIT_BACKEND, telemetry: FitTelemetry | None = None) -> list[tuple[float, lmf.Parameters]]:
+    initials = start_design(params, paramExcl, ITER_SEARCH)
+    start = partial(fit_start, params=params, x_gens=x_gens, y_cells=y_cells,
+                    model=model if screening_model is None else screening_model, backend=backend)
+
+    n_keep = 1 if screening_model is None else N_REFINE
+    if telemetry is not None:
+        telemetry.starts_total += ITER_SEARCH
+    with closing(run_starts(start, initials, min(n_workers, ITER_SEARCH))) as results:
+        candidates = best_starts(tqdm.tqdm(within_budget(record_starts(results, telemetry)), total=ITER_SEARCH, leave=False, position=2*0+1), n_keep)  # Find lowest RSS
+
+    if screening_model is not None:
+        # Refine the best screened candidates with the production model
+        refined = (refine(res, x_gens, y_cells, model, backend, telemetry) for _, res in candidates)
+        candidates = best_starts(refined, n_keep=1, n_reproduce=None)
+    return candidates
+
+# Fitting Process
+def fit(exp_ht: PerTime[HarvestTime], cell_gens_reps: PerTime[PerRep[PerGen[CellCount]]], params: lmf.Parameters, paramExcl: ExcludedParameters, model: Cyton2Model, screening_model: Cyton2Model | None = None, n_workers: int | None = N_WORKERS, warm_start: bool = False, backend: FitBackend = FIT_BACKEND, telemetry: FitTelemetry | None = None, budget: FitBudget | None = None, previous: Parameters | None = None) -> Parameters:
+    """
+    Fits the model from up to ITER_SEARCH starting points (see start_design) and returns the best parameters.
+    The search stops early once N_REPRODUCE starts have reached the best chi-square.
+    If screening_model is given, the random starts are fitted with it instead, and only the N_REFINE best
+    of them are refitted with model. screening_model must predict the same observations as model, normally
+    on a coarser time grid and/or in float32.
+    The final parameters are always refitted in float64, so a float32 model only speeds up the search.
+    The starts run in n_workers processes (one per core if None). Their initial guesses are all drawn
+    here first, so the result doesn't depend on the number of workers.
+    A warm start first fits from the initial values in params and from the previous best fit of the same data,
+    plus perturbations of both (see warm_start_design). The search only runs if fewer than WARM_REPRODUCE
+    of those reach their best chi-square. The previous best fit is previous if given, or else the last one
+    this process remembered (see remember_fit), so callers that fit in other processes can keep their own.
+    backend chooses the local fit of each start: 'lmfit' (Levenberg-Marquardt through lmfit) or 'trf'
+    (scipy's bounded trust-region reflective method on arrays, see minimize_trf).
+    If telemetry is given, it is updated as the fit runs.
+    If budget is given, the fit stops once it is cancelled or runs out, between or within starts, and returns
+    the best parameters so far. telemetry.truncated then records why.
+    """
+    with budget_scope(budget):
+        x_gens = np.array(exp_ht[0])
+        y_cells = np.fromiter(flatten(cell_gens_reps), dtype=float)
+        n_workers = n_workers or os.cpu_count() or 1
+
+        if warm_start:
+            centres = [cast(dict[str, float], params.valuesdict())]
+            cached = previous if previous is not None else previous_fit(x_gens, y_cells)
+            if cached is not None and cached != centres[0]:
+                centres.append(cast(dict[str, float], cached))
+            warm = warm_start_design(params, paramExcl, centres)
+            start = partial(fit_start, params=params, x_gens=x_gens, y_cells=y_cells, model=model, backend=backend)
+            if telemetry is not None:
+                telemetry.starts_total += len(warm)
+            with closing(run_starts(start, warm, min(n_workers, len(warm)))) as results:
+                candidates = best_starts(within_budget(record_starts(results, telemetry)), n_keep=len(warm), n_reproduce=None)
+
+            best_chisqr = candidates[0][0]
+            reproduced = sum(chisqr <= best_chisqr + REPRODUCE_RTOL * abs(best_chisqr) for chisqr, _ in candidates)
+            if reproduced < WARM_REPRODUCE and (budget is None or budget.exceeded() is None):
+                # Fall back to the global search, keeping the warm start if it is still better
+                candidates = best_starts(candidates[:1] + search(x_gens, y_cells, params, paramExcl, model, screening_model, n_workers, backend, telemetry), n_keep=1, n_reproduce=None)
+        else:
+            candidates = search(x_gens, y_cells, params, paramExcl, model, screening_model, n_workers, backend, telemetry)
+
+        best = candidates[0][1]
+        if model.dtype != np.float64:
+            # Re-check the best fit in full precision
+            best = refine(best, x_gens, y_cells, model.astype(np.float64), backend, telemetry)[1]
+        best_fit = cast(Parameters, best.valuesdict())
+        truncated = None if budget is None else budget.exceeded()
+        if truncated is None:
+            remember_fit(x_gens, y_cells, best_fit)
+        if telemetry is not None:
+            telemetry.truncated = truncated
 
     return best_fit
+
+# One bootstrap refit: a local fit of resampled data, from the values in params.
+# None if the current budget ran out during the refit.
+def bootstrap_start(y_cells: NDArray, params: lmf.Parameters, x_gens: NDArray, model: Cyton2Model, backend: FitBackend) -> Parameters | None:
+    chisqr, fitted, _ = fit_start({}, params, x_gens, y_cells, model, backend)
+    budget = current_budget()
+    if np.isnan(chisqr) and budget is not None and budget.exceeded() is not None:
+        return None
+    return cast(Parameters, fitted.valuesdict())
+
+# Indices into the flattened cell counts of every replicate, indexed by time point then replicate
+def replicate_blocks(cell_gens_reps: PerTime[PerRep[PerGen[CellCount]]]) -> list[list[NDArray[np.intp]]]:
+    blocks, offset = [], 0
+    for reps in cell_gens_reps:
+        blocks.append([])
+        for rep in reps:
+            size = sum(1 for _ in flatten(rep))
+            blocks[-1].append(np.arange(offset, offset + size))
+            offset += size
+    return blocks
+
+def bootstrap(exp_ht: PerTime[HarvestTime], cell_gens_reps: PerTime[PerRep[PerGen[CellCount]]], best_fit: Parameters, params: lmf.Parameters, model: Cyton2Model, n_boot: int = N_BOOTSTRAP, n_workers: int | None = N_WORKERS, backend: FitBackend = FIT_BACKEND, budget: FitBudget | None = None) -> Iterator[Parameters]:
+    """
+    Refits n_boot bootstrap resamples of the data and yields each refit in order, as they finish.
+    Each resample draws the replicates of every harvest time with replacement, keeping their number.
+    Resamples are refitted with a single local fit that is warm-started from best_fit, in n_workers processes.
+    They are all drawn here first, so the refits don't depend on the number of workers.
+    If budget is given, no more refits are yielded once it is cancelled or runs out.
+    """
+    x_gens = np.array(exp_ht[0])
+    y_cells = np.fromiter(flatten(cell_gens_reps), dtype=float)
+    blocks = replicate_blocks(cell_gens_reps)
+    rng = np.random.RandomState(seed=894375982)
+    resamples = [
+        y_cells[np.concatenate([reps[i] for reps in blocks for i in rng.randint(len(reps), size=len(reps))])]
+        for _ in range(n_boot)
+    ]
+
+    params = copy.deepcopy(params)
+    for par in params:
+        params[par].set(value=float(np.clip(best_fit[par], params[par].min, params[par].max)))
+    start = partial(bootstrap_start, params=params, x_gens=x_gens, model=model, backend=backend)
+    n_workers = min(n_workers or os.cpu_count() or 1, n_boot)
+    with budget_scope(budget), closing(run_starts(start, resamples, n_workers)) as results:
+        for fitted in within_budget(results):
+            if fitted is not None:
+                yield fitted
+
+# Percentile interval of each parameter over bootstrap refits, covering level percent of them
+def confidence_intervals(fits: Iterable[Parameters], paramExcl: ExcludedParameters, level: float = BOOTSTRAP_CI) -> ConfidenceIntervals:
+    fits = list(fits)
+    names = [par for par in PARAM_NAMES if par not in paramExcl]
+    values = np.array([[fitted[par] for par in names] for fitted in fits])
+    lower, upper = np.percentile(values, [(100 - level) / 2, (100 + level) / 2], axis=0).tolist()
+    return {par: (low, high) for par, low, high in zip(names, lower, upper)}
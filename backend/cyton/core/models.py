@@ -1,13 +1,20 @@
 from __future__ import annotations
-from cyton.core.settings import DT
+from collections.abc import Callable
+from typing import Literal, Sequence, cast
+from cyton.core.settings import DT, N_BOOTSTRAP, N_WORKERS, MAX_SURFACE_POINTS
 from cyton.core.utils import flatten
 from cyton.core.extrapolate import get_times
-from cyton.core.model_fitting import fit
-from cyton.core.types import ExcludedParameters, Parameters, Bounds, FittableParams, PerTime, Reps, MaxGeneration, HarvestTime, CellTotal, CellAverage, PerGen, CellTotalSem, PerRep, ExtrapolationTimes, PerCond, CellCount, HarvestTimeResults, ExtrapolatedTimeResults, NReps, Conditions
+from cyton.core.model_fitting import fit, bootstrap, confidence_intervals, previous_fit, remember_fit
+from cyton.core.joint_fitting import joint_fit
+from cyton.core.identifiability import chisqr_surface, profile_likelihood
+from cyton.core.types import ExcludedParameters, Parameters, Bounds, FittableParams, PerTime, Reps, MaxGeneration, HarvestTime, CellTotal, CellAverage, PerGen, CellTotalSem, PerRep, ExtrapolationTimes, ExtrapolationField, PerCond, CellCount, HarvestTimeResults, ExtrapolatedTimeResults, NReps, Conditions, SharedParams, FitBackend, ConfidenceIntervals, ParameterRange
 from cyton.core.model import Cyton2Model
+from cyton.core.telemetry import FitTelemetry
+from cyton.core.budget import FitBudget, BudgetExceeded
 from pydantic import BaseModel
 import lmfit as lmf
 import numpy as np
+from pydantic_numpy.typing import Np1DArrayFp64, NpNDArrayFp64
 
 class ExperimentSettings(BaseModel):
     """
@@ -17,6 +24,40 @@ class ExperimentSettings(BaseModel):
     "Initial parameter estimates"
     bounds: Bounds
     vary: FittableParams
+    coarse_dt: float | None = None
+    """
+    Time step for the random starts of a multi-resolution fit, e.g. COARSE_DT.
+    Only the N_REFINE best starts are then refitted at DT, which is several times faster and generally
+    agrees with a fit at DT only to 2 significant figures. None fits every start at DT.
+    """
+    screening_precision: Literal["float64", "float32"] = "float64"
+    """
+    Precision of the model used for the random starts. With "float32" the N_REFINE best starts
+    are refitted in float64, as they are for coarse_dt, so the fitted parameters stay float64 accurate.
+    """
+    warm_start: bool = False
+    """
+    Start from parameters, and from the last fit of the same data, instead of a global search.
+    Useful for refitting after changing vary or the bounds. The global search still runs if the warm start
+    doesn't reproduce its best fit.
+    """
+    backend: FitBackend = "lmfit"
+    """
+    Least-squares method of single condition fits. "trf" works on arrays with native bounds and skips
+    lmfit's Parameters handling on every evaluation. Joint fits always use "trf".
+    """
+    max_seconds: float | None = None
+    """
+    Wall-clock budget of a fit, joint fit, bootstrap or profile likelihood in seconds. None is unlimited.
+    When it runs out, a fit returns its best parameters so far and the others return the parts that finished.
+    """
+    max_evaluations: int | None = None
+    "Budget of model evaluations over all the starts or refits, like max_seconds. None is unlimited."
+    shared: SharedParams | None = None
+    """
+    Parameters that a joint fit over several conditions (ExperimentData.fit_conditions) shares between them.
+    Every other varying parameter is fitted per condition. None shares nothing.
+    """
 
     def get_lmf_parameters(self) -> tuple[lmf.Parameters, ExcludedParameters]:
         """
@@ -29,6 +70,12 @@ class ExperimentSettings(BaseModel):
 
         return params, paramExcl
 
+    def get_budget(self) -> FitBudget | None:
+        "Budget of max_seconds and max_evaluations from now, or None if both are unlimited"
+        if self.max_seconds is None and self.max_evaluations is None:
+            return None
+        return FitBudget(self.max_seconds, self.max_evaluations)
+
 class SingleConditionData(BaseModel):
     """
     Experiment data for a single condition
@@ -74,19 +121,95 @@ class SingleConditionData(BaseModel):
             nreps=self.calc_nreps()
         )
 
-    def fit_model(self, model: Cyton2Model, settings: ExperimentSettings) -> Parameters:
+    def get_coarse_model(self, dt: float) -> Cyton2Model:
+        """
+        Gets a cheaper model on a coarser time grid.
+        Harvest times are moved to their nearest point on that grid.
+        """
+        return Cyton2Model(
+            ht=[round(ht / dt) * dt for ht in self.exp_ht],
+            n0 = self.calc_n0(),
+            max_div = self.max_div,
+            dt = dt,
+            nreps=self.calc_nreps()
+        )
+
+    def fit_model(self, model: Cyton2Model, settings: ExperimentSettings, telemetry: FitTelemetry | None = None, budget: FitBudget | None = None, previous: Parameters | None = None, n_workers: int | None = N_WORKERS) -> Parameters:
+        """
+        Fits the model given some settings, and returns the fitted results.
+        If telemetry is given, it is updated as the fit runs.
+        budget can be used to cancel the fit, and defaults to the budget in settings.
+        previous is the previous best fit that a warm start starts from, by default the one this process remembered.
+        The starts run in n_workers processes.
+        """
+        budget = budget or settings.get_budget()
+        params, paramExcl = settings.get_lmf_parameters()
+        screening_model = None if settings.coarse_dt is None else self.get_coarse_model(settings.coarse_dt)
+        if settings.screening_precision == "float32":
+            screening_model = (model if screening_model is None else screening_model).astype(np.float32)
+        return fit(self.exp_ht, self.cell_gens_reps, params, paramExcl, model, screening_model, n_workers, warm_start=settings.warm_start, backend=settings.backend, telemetry=telemetry, budget=budget, previous=previous)
+
+    def previous_fit(self) -> Parameters | None:
+        "Best fit of this data that this process remembered, which a warm start also starts from"
+        return previous_fit(np.array(self.exp_ht[0]), np.fromiter(flatten(self.cell_gens_reps), dtype=float))
+
+    def remember_fit(self, fitted: Parameters) -> None:
+        "Remembers fitted as the best fit of this data in this process, as fit_model does in the process that fits"
+        remember_fit(np.array(self.exp_ht[0]), np.fromiter(flatten(self.cell_gens_reps), dtype=float), fitted)
+
+    def bootstrap_model(self, model: Cyton2Model, settings: ExperimentSettings, best_fit: Parameters, n_boot: int = N_BOOTSTRAP, progress: Callable[[int, int], None] | None = None, budget: FitBudget | None = None, n_workers: int | None = N_WORKERS) -> ConfidenceIntervals:
         """
-        Fits the model given some settings, and returns the fitted results
+        Confidence intervals of the varying parameters, from refits of n_boot resamples of the replicates
+        that start from best_fit. progress is called with the number of finished and total refits after each one.
+        If budget is cancelled or runs out, the intervals only cover the refits that finished.
+        budget defaults to the budget in settings. The refits run in n_workers processes.
         """
+        budget = budget or settings.get_budget()
         params, paramExcl = settings.get_lmf_parameters()
-        return fit(self.exp_ht, self.cell_gens_reps, params, paramExcl, model)
+        fits = []
+        for fitted in bootstrap(self.exp_ht, self.cell_gens_reps, best_fit, params, model, n_boot, n_workers, backend=settings.backend, budget=budget):
+            fits.append(fitted)
+            if progress is not None:
+                progress(len(fits), n_boot)
+        if not fits:
+            raise BudgetExceeded("The bootstrap stopped before any refit finished")
+        return confidence_intervals(fits, paramExcl)
 
-    def extrapolate_model(self, model: Cyton2Model, params: Parameters) -> ExtrapolationResults:
+    def surface_model(self, model: Cyton2Model, fitted: Parameters, ranges: Sequence[ParameterRange], settings: ExperimentSettings | None = None, profile: bool = False, budget: FitBudget | None = None, n_workers: int | None = N_WORKERS, progress: Callable[[int, int], None] | None = None) -> SurfaceResults:
         """
-        Predicts cell counts for harvest times saved in exp_ht
+        Chi-square over a grid of one or two parameters given by ranges, computed in n_workers processes.
+        By default the other parameters are fixed at fitted (a chi-square surface).
+        With profile, the other varying parameters of settings are re-optimised within its bounds at every
+        grid point (a profile likelihood), which costs a local fit per point. progress is then called with
+        the number of finished and total points after each one, and budget can be used to cancel it,
+        leaving nan at the points that didn't finish. budget defaults to the budget in settings.
+        The grid has at most MAX_SURFACE_POINTS points.
+        """
+        names = [r["name"] for r in ranges]
+        if not 1 <= len(names) <= 2 or len(set(names)) != len(names) or not set(names) <= set(fitted):
+            raise ValueError(f"Expected one or two different parameters out of {list(fitted)}, got {names}")
+        sizes = [r["n"] for r in ranges]
+        if min(sizes) < 1 or np.prod(sizes) > MAX_SURFACE_POINTS:
+            raise ValueError(f"Expected a grid of 1 to {MAX_SURFACE_POINTS} points, got {' x '.join(map(str, sizes))}")
+        grids = [np.linspace(r["lower"], r["upper"], r["n"]) for r in ranges]
+        y_cells = np.fromiter(flatten(self.cell_gens_reps), dtype=float)
+
+        if not profile:
+            return SurfaceResults(names=names, grids=grids, chisqr=chisqr_surface(model, y_cells, fitted, names, grids, n_workers))
+        if settings is None:
+            raise ValueError("A profile likelihood needs the fitting settings")
+        budget = budget or settings.get_budget()
+        params, _ = settings.get_lmf_parameters()
+        chisqr, values = profile_likelihood(model, y_cells, fitted, params, names, grids, n_workers, settings.backend, budget, progress)
+        return SurfaceResults(names=names, grids=grids, chisqr=chisqr, parameters=values)
+
+    def extrapolate_model(self, model: Cyton2Model, params: Parameters, fields: Sequence[ExtrapolationField] | None = None) -> ExtrapolationResults:
+        """
+        Predicts cell counts for harvest times saved in exp_ht.
+        Only the outputs in fields are computed, or all of them if it is None.
         """
         times = self.get_times()
-        return model.extrapolate(times, params)
+        return model.extrapolate(times, params, fields)
 
 
 class ExperimentData(BaseModel):
@@ -145,8 +268,33 @@ class ExperimentData(BaseModel):
 
         return self.slice_condition_idx(condition_index)
 
+    def fit_conditions(self, conditions: Sequence[str], settings: ExperimentSettings, budget: FitBudget | None = None, n_workers: int | None = N_WORKERS) -> dict[str, Parameters]:
+        """
+        Fits several conditions at once, sharing the parameters in settings.shared between them,
+        and returns the fitted parameters of each condition.
+        coarse_dt, screening_precision and warm_start only apply to single condition fits.
+        budget can be used to cancel the fit, which then returns the best parameters so far,
+        and defaults to the budget in settings. The starts run in n_workers processes.
+        """
+        budget = budget or settings.get_budget()
+        params, paramExcl = settings.get_lmf_parameters()
+        shared = settings.shared or cast(SharedParams, {par: False for par in settings.vary})
+        cond_data = [self.slice_condition(condition) for condition in conditions]
+        fitted = joint_fit([data.cell_gens_reps for data in cond_data], params, paramExcl, shared, [data.get_model() for data in cond_data], n_workers, budget=budget)
+        return dict(zip(conditions, fitted))
+
 class ExtrapolationResults(BaseModel, arbitrary_types_allowed=True):
     ext: ExtrapolatedTimeResults
     "Predicted data for extrapolated timepoints"
-    hts: HarvestTimeResults
-    "Predicted data for experimental harvested timepoints"
+    hts: HarvestTimeResults | None = None
+    "Predicted data for experimental harvested timepoints. None if it wasn't requested."
+
+class SurfaceResults(BaseModel, arbitrary_types_allowed=True):
+    names: list[str]
+    "Parameters of the grid, one per axis of chisqr"
+    grids: list[Np1DArrayFp64]
+    "Values of each parameter in names"
+    chisqr: NpNDArrayFp64
+    "Residual sum of squares at each grid point"
+    parameters: dict[str, NpNDArrayFp64] | None = None
+    "For a profile likelihood, the re-optimised value of each parameter at each grid point. None for a surface."
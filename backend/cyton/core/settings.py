@@ -52,16 +52,87 @@ DEFAULT_VARY: FittableParams = {  # True = Subject to change; False = Lock param
 	}
 
 
+# =====================
+# Job Settings
+# =====================
+
+MAX_JOBS = 2          # [API] Number of fit jobs that run at once, each in its own process. Others wait in a queue.
+
+JOB_WORKERS = None    # [API] Number of processes that each job runs its starts in (None shares the cores between MAX_JOBS jobs)
+
+MAX_FINISHED_JOBS = 100  # [API] Number of finished jobs whose results are kept in memory
+
+MAX_DATASETS = 32     # [API] Number of uploaded datasets kept in memory, evicting the least recently used
+
+EXTRAPOLATE_MODEL_CACHE = 16  # [API] Number of models kept by /extrapolate, one per condition dataset
+
+EXTRAPOLATE_RESULT_CACHE = 256  # [API] Number of extrapolations kept by /extrapolate, keyed by dataset, parameters and fields
+
+GZIP_MINIMUM_SIZE = 1000  # [API] Responses of at least this many bytes are compressed for clients that accept gzip
+
+MODEL_VERSION = 1     # [API] Part of the key of every cached job result. Increase it when a change alters fitted results.
+
+FIT_CACHE_DIR = None  # [API] Directory of the on-disk cache of job results (None uses a directory in the system's temporary directory)
+
+FIT_CACHE_ENTRIES = 1000  # [API] Number of job results kept in the cache, evicting the least recently used
+
+FIT_CACHE_TTL = 7 * 24 * 3600  # [API] Seconds after which a cached job result expires
+
 # =====================
 # Model Fitting Settings
 # =====================
 
 DT = 0.5              # [Cyton Model] Time step
 
+MAX_DIV_CAP = 30      # [Cyton Model] Most generations the model computes, i.e. the theoretical maximum division number. Only those that can hold cells cost time, see GEN_TOL
+
+GEN_TOL = 1E-9        # [Cyton Model] Generations are skipped while they can't hold more than GEN_TOL * N0 cells between them (negative computes all MAX_DIV_CAP)
+
+SHIFT_TOL = 1E-9      # [Cyton Model] b within SHIFT_TOL time steps of a multiple of DT shares one shifted cdf between every generation
+
+# [Cyton Model] Other values of b interpolate the shifted cdfs when that is accurate to INTERP_TOL (None always computes them exactly).
+# Errors grow with the number of cells in each generation: on SH1.119 at DT = 0.5, 1E-3 made evaluate 23% faster
+# but up to 1.2% of N0 wrong, while 1E-5 and below never interpolated and only added the cost of trying.
+INTERP_TOL = None
+
 ITER_SEARCH = 30      # [Cyton Model] Number of initial search (100 is usually a good guess)
 
+COARSE_DT = 2         # [Cyton Model] Time step for the initial search of a multi-resolution fit (ExperimentSettings.coarse_dt)
+
+N_REFINE = 3          # [Cyton Model] Number of best initial searches of a multi-resolution fit that are refitted at DT
+
+JOINT_ITER_SEARCH = 30  # [Cyton Model] Number of initial search of a joint fit over several conditions
+
+N_WORKERS = None      # [Cyton Model] Number of processes that run the initial search (None uses one per core)
+
+FIT_BACKEND = 'lmfit'  # [Cyton Model] Local fit of each search: 'lmfit' (Levenberg-Marquardt) or 'trf' (bounded trust-region reflective on arrays)
+
+START_DESIGN = 'sobol'  # [Cyton Model] Initial guesses of the initial search: 'sobol', 'lhs' (Latin hypercube) or 'uniform' (independent random draws)
+
+N_REPRODUCE = 5       # [Cyton Model] Stop the initial search once this many searches reach the best chi-square (None runs all ITER_SEARCH)
+
+REPRODUCE_RTOL = 1E-6  # [Cyton Model] Relative difference within which a search's chi-square counts as reaching the best one
+
+N_WARM_STARTS = 4     # [Cyton Model] Perturbed copies of each previous fit that a warm start fits from (ExperimentSettings.warm_start)
+
+WARM_START_SCALE = 0.05  # [Cyton Model] Largest perturbation of a warm start, as a fraction of each parameter's range
+
+WARM_REPRODUCE = 2    # [Cyton Model] A warm start skips the initial search if this many of its fits reach the best chi-square
+
+WARM_CACHE_SIZE = 32  # [Cyton Model] Number of datasets whose best fit is kept for warm starts
+
+N_BOOTSTRAP = 200     # [Cyton Model] Number of bootstrap resamples of the replicates for confidence intervals
+
+BOOTSTRAP_CI = 95     # [Cyton Model] Percentage of the bootstrap refits covered by each parameter's confidence interval
+
+SURFACE_CHUNK = 500   # [Cyton Model] Number of parameter sets evaluated together by each task of a chi-square surface
+
+MAX_SURFACE_POINTS = 10000  # [Cyton Model] Most grid points of a chi-square surface or profile likelihood
+
 MAX_NFEV = None 	  # [LMFIT] Maximum number of function evaluation
 
+ANALYTIC_JACOBIAN = True  # [LMFIT] Use Cyton2Model.jacobian instead of a forward-difference Jacobian (LM_FIT_KWS epsfcn is then unused)
+
 LM_FIT_KWS: LmFitKwargs = {        # [LMFIT/SciPy] Key-word arguements pass to LMFIT minimizer for Levenberg-Marquardt algorithm
     # 'ftol': 1E-10,  # Relative error desired in the sum of squares. DEFAULT: 1.49012E-8
     # 'xtol': 1E-10,  # Relative error desired in the approximate solution. DEFAULT: 1.49012E-8
@@ -0,0 +1,108 @@
+"""
+Fit Telemetry
+
+Counters that a fit updates as its starts finish, so that a running fit can report its progress and cost.
+"""
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+import numpy as np
+from pydantic import BaseModel, PrivateAttr
+from pydantic_numpy.typing import Np1DArrayFp64, Np2DArrayFp64
+from cyton.core.model import Cyton2Model
+from cyton.core.budget import BudgetExceeded, current_budget
+from cyton.core.types import StartTelemetry, TruncationReason
+
+class TimedModel:
+    """
+    Wraps a Cyton2Model, counting the calls to evaluate and jacobian and the time spent in them.
+    Evaluations are charged to the current budget, so they raise BudgetExceeded once it has run out.
+    Every other attribute is the wrapped model's.
+    """
+    def __init__(self, model: Cyton2Model):
+        self.model = model
+        self.budget = current_budget()
+        self.evaluate_calls = 0
+        self.jacobian_calls = 0
+        self.model_seconds = 0.
+
+    def evaluate(self, *args: float, **kwargs: Any) -> Np1DArrayFp64:
+        if self.budget is not None:
+            self.budget.charge()
+        start = time.perf_counter()
+        try:
+            return self.model.evaluate(*args, **kwargs)
+        finally:
+            self.evaluate_calls += 1
+            self.model_seconds += time.perf_counter() - start
+
+    def jacobian(self, *args: float, **kwargs: Any) -> Np2DArrayFp64:
+        if self.budget is not None and self.budget.exceeded() is not None:
+            raise BudgetExceeded()
+        start = time.perf_counter()
+        try:
+            return self.model.jacobian(*args, **kwargs)
+        finally:
+            self.jacobian_calls += 1
+            self.model_seconds += time.perf_counter() - start
+
+    def __getattr__(self, name: str):
+        return getattr(self.model, name)
+
+    def telemetry(self, seconds: float) -> StartTelemetry:
+        "Telemetry of a local fit that used this model and took seconds in total"
+        return {"nfev": self.evaluate_calls, "jacobian_calls": self.jacobian_calls, "model_seconds": self.model_seconds, "seconds": seconds}
+
+class FitTelemetry(BaseModel):
+    """
+    Live telemetry of a fit. Times are summed over the local fits, which may run in parallel,
+    so they can add up to more than wall_seconds.
+    """
+    starts_total: int = 0
+    "Number of starts the fit may run. It can stop before running all of them."
+    starts_completed: int = 0
+    "Number of finished starts"
+    evaluate_calls: int = 0
+    "Calls to Cyton2Model.evaluate, over every local fit including refinements"
+    jacobian_calls: int = 0
+    "Calls to Cyton2Model.jacobian, over every local fit including refinements"
+    nfev: list[int] = []
+    "Evaluations of each finished start, in order"
+    model_seconds: float = 0.
+    "Time spent in Cyton2Model.evaluate and jacobian"
+    optimiser_seconds: float = 0.
+    "Time spent in the least-squares solvers, outside of the model"
+    wall_seconds: float = 0.
+    "Time since the fit started"
+    best_chisqr: float | None = None
+    "Best chi-square so far"
+    truncated: TruncationReason | None = None
+    "Why the fit stopped early and returned the best result so far, or None if it ran to completion"
+    _started: float = PrivateAttr(default_factory=time.perf_counter)
+    _listener: Callable[["FitTelemetry"], None] | None = PrivateAttr(None)
+
+    def listen(self, listener: Callable[["FitTelemetry"], None] | None) -> None:
+        "Calls listener after every update"
+        self._listener = listener
+
+    def record(self, chisqr: float, telemetry: StartTelemetry, start: bool = True) -> None:
+        "Adds a finished local fit, which is a start unless it refines one"
+        if start:
+            self.starts_completed += 1
+            self.nfev.append(telemetry["nfev"])
+        self.evaluate_calls += telemetry["nfev"]
+        self.jacobian_calls += telemetry["jacobian_calls"]
+        self.model_seconds += telemetry["model_seconds"]
+        self.optimiser_seconds += telemetry["seconds"] - telemetry["model_seconds"]
+        if not np.isnan(chisqr) and (self.best_chisqr is None or chisqr < self.best_chisqr):
+            self.best_chisqr = chisqr
+        self.wall_seconds = time.perf_counter() - self._started
+        if self._listener is not None:
+            self._listener(self)
+
+# Results of the starts without their telemetry, which is recorded as each one is consumed
+def record_starts[P](results: Iterable[tuple[float, P, StartTelemetry]], telemetry: FitTelemetry | None) -> Iterator[tuple[float, P]]:
+    for chisqr, params, start_telemetry in results:
+        if telemetry is not None:
+            telemetry.record(chisqr, start_telemetry)
+        yield chisqr, params
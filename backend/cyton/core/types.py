@@ -1,4 +1,4 @@
-from typing import TypedDict, Sequence, Literal
+from typing import TypedDict, Sequence, Literal, NotRequired
 from pydantic_numpy.typing import Np1DArrayFp64, Np2DArrayFp64
 
 class Parameters(TypedDict):
@@ -115,21 +115,26 @@ class ExtrapolatedData(TypedDict):
 # Extrapolation
 type ExtrapolationParams = tuple[PerCond[HarvestTime], PerCond[PerTime[PerRep[PerGen[CellCount]]]], PerCond[MaxGeneration]]
 type ExtrapolationTimes = Np1DArrayFp64
+type ExtrapolationField = Literal["total_live_cells", "cells_gen", "nUNS", "nDIV", "nDES", "densities", "hts"]
+"An output that can be requested from an extrapolation. hts is the whole HarvestTimeResults, and the rest are keys of ExtrapolatedTimeResults."
 
 class ExtrapolatedTimeResults(TypedDict):
+    """
+    Predictions for the extrapolation times. Every key but time_points is only present if it was requested.
+    """
     time_points: ExtrapolationTimes
     "Time points that the model was extrapolated to, in hours"
-    total_live_cells: Np1DArrayFp64
+    total_live_cells: NotRequired[Np1DArrayFp64]
     "Cell numbers per timepoint, summed over all generations."
-    cells_gen: Np2DArrayFp64
+    cells_gen: NotRequired[Np2DArrayFp64]
     "Cell numbers indexed by generation (first axis) and timepoint (second axis)."
-    nUNS: Np1DArrayFp64
+    nUNS: NotRequired[Np1DArrayFp64]
     "Unused. Predicted number of unstimulated cells that don't divide, indexed by timepoint."
-    nDIV: Np2DArrayFp64
+    nDIV: NotRequired[Np2DArrayFp64]
     "Predicted number of dividing cells, indexed by generation (first axis) then timepoint (second axis)."
-    nDES: Np2DArrayFp64
+    nDES: NotRequired[Np2DArrayFp64]
     "Predicted number of destiny cells, indexed by generation (first axis) then timepoint (second axis)."
-    densities: dict[Literal["uns", "div0", "die", "dd"], Np1DArrayFp64]
+    densities: NotRequired[dict[Literal["uns", "div0", "die", "dd"], Np1DArrayFp64]]
     "Densities for the extrapolation times. Each key is a random variable and each value is an array indexed by timepoint."
 
 class HarvestTimeResults(TypedDict):
@@ -141,6 +146,34 @@ class HarvestTimeResults(TypedDict):
 
 # Fitting
 type ExcludedParameters = list[str]
+type StartDesign = Literal["sobol", "lhs", "uniform"]
+"How the starting points of the initial search are spread over the parameter bounds"
+type FitBackend = Literal["lmfit", "trf"]
+"Local least-squares method of a fit: lmfit's Levenberg-Marquardt, or scipy's trust-region reflective method working on arrays"
+type ConfidenceIntervals = dict[str, tuple[float, float]]
+"Confidence interval (lower, upper) of each varying parameter"
+class StartTelemetry(TypedDict):
+    "Cost of a single local fit"
+    nfev: int
+    "Calls to Cyton2Model.evaluate"
+    jacobian_calls: int
+    "Calls to Cyton2Model.jacobian"
+    model_seconds: float
+    "Time spent in the model"
+    seconds: float
+    "Total time of the fit"
+type TruncationReason = Literal["cancelled", "time", "evaluations"]
+"Why a fit stopped before running all of its starts: it was cancelled, or ran out of time or evaluations"
+class ParameterRange(TypedDict):
+    "Evenly spaced values of one parameter, for a chi-square surface or profile"
+    name: str
+    "Parameter name, one of the keys of Parameters"
+    lower: float
+    upper: float
+    n: int
+    "Number of values from lower to upper inclusive"
+type SharedParams = FittableParams
+"Parameters that a joint fit shares between conditions (True) or fits separately for each condition (False)"
 class LmFitKwargs(TypedDict):
     epsfcn: float
     "Epsilon function condition. If the change in a parameter causes the change in the residual result by less than this number, that parameter is excluded. "
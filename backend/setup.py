@@ -3,6 +3,6 @@ from Cython.Build import cythonize
 import numpy
 
 setup(
-    ext_modules=cythonize("cyton/core/model.pyx"),
+    ext_modules=cythonize(["cyton/core/model.pyx", "cyton/core/distributions.pyx"]),
     include_dirs=[numpy.get_include()],
 )
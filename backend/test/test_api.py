@@ -1,5 +1,32 @@
 from fastapi import APIRouter
+from fastapi.testclient import TestClient
+from pathlib import Path
+import os
+import time
+import asyncio
+from collections.abc import Sequence
+from typing import Any, cast
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
 
+from cyton.api.support import check_status
+from cyton.api.support.background_fit import run_fit, run_joint_fit, run_bootstrap, run_profile
+from cyton.api.support.check_status import get_fit_status, get_joint_fit_status, get_bootstrap_status, get_profile_status
+from cyton.api.support.jobs import JobEngine
+from cyton.api.support.result_cache import ResultCache
+from cyton.api.support.extrapolate_cache import ExtrapolationCache
+from cyton.api.support.binary import BINARY_MEDIA_TYPE, decode_arrays
+from cyton.api.support.datasets import DatasetStore
+from cyton.api.support.default_settings import get_default_settings
+from cyton.api.support.upload import parse_file
+from cyton.core.settings import ITER_SEARCH
+from cyton.core.types import Parameters, ExtrapolationField
+from cyton.core.model import Cyton2Model
+from cyton.core.models import SingleConditionData, ExperimentData, ExtrapolationResults
+from cyton.core.extrapolate import extrapolate_without_data
+
+from cyton.api import api
 from cyton.api.api import router
 from cyton.api.app import app
 
@@ -12,3 +39,245 @@ def test_routes():
 
 def test_openapi():
     app.openapi()
+
+def wait(engine: JobEngine, task_id: str, timeout: float = 120) -> None:
+    start = time.time()
+    while engine.status(task_id).state in ("queued", "running"):
+        assert time.time() - start < timeout
+        time.sleep(0.1)
+
+def as_dict(results: ExtrapolationResults) -> dict[str, Any]:
+    "Extrapolations return the plain dictionary that ExtrapolationResults validates"
+    return cast(dict[str, Any], results)
+
+def test_fit_jobs(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    engine = JobEngine(max_jobs=2)
+    monkeypatch.setattr(check_status, "engine", engine)
+    data = parse_file(str(data_path))
+    cond_data = data.slice_condition_idx(0)
+
+    fitted: list[Parameters] = []
+    fit_id = engine.submit(run_fit, cond_data, get_default_settings(), on_done=fitted.append)
+    failing_id = engine.submit(run_joint_fit, data, get_default_settings(), ["unknown"])
+    # Only two jobs run at once
+    queued_id = engine.submit(run_fit, cond_data, get_default_settings())
+    assert engine.status(queued_id).state == "queued"
+    assert engine.cancel(queued_id)
+    assert get_fit_status(queued_id)["state"] == "cancelled"
+
+    wait(engine, fit_id)
+    status = get_fit_status(fit_id)
+    assert status["state"] == "done" and status["error"] is None
+    assert status["parameters"] is not None
+    telemetry = status["telemetry"]
+    assert telemetry is not None
+    assert 0 < telemetry.starts_completed <= telemetry.starts_total == ITER_SEARCH
+    assert len(telemetry.nfev) == telemetry.starts_completed
+    assert telemetry.evaluate_calls == sum(telemetry.nfev) > 0
+    assert 0 < telemetry.model_seconds and 0 < telemetry.optimiser_seconds
+    assert telemetry.best_chisqr is not None and telemetry.truncated is None
+    # Results stay available, and are handed to on_done in this process
+    assert get_fit_status(fit_id)["parameters"] == status["parameters"]
+    assert fitted == [status["parameters"]]
+    assert not engine.cancel(fit_id)
+
+    wait(engine, failing_id)
+    status = get_joint_fit_status(failing_id)
+    assert status["state"] == "failed" and status["parameters"] is None
+    assert status["error"] is not None and "Unknown condition" in status["error"]["message"]
+
+def test_cancel_jobs(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    engine = JobEngine(max_jobs=2)
+    monkeypatch.setattr(check_status, "engine", engine)
+    # Each job gets its share of the cores
+    assert engine.n_workers == max(1, (os.cpu_count() or 1) // 2)
+    data = parse_file(str(data_path))
+    cond_data = data.slice_condition_idx(0)
+    settings = get_default_settings()
+
+    joint_id = engine.submit(run_joint_fit, data, settings, data.conditions[:2])
+    bootstrap_id = engine.submit(run_bootstrap, cond_data, settings, settings.parameters, 1000)
+    # Cancel the bootstrap once some refits have finished
+    while get_bootstrap_status(bootstrap_id)["done"] == 0:
+        time.sleep(0.1)
+    start = time.time()
+    assert engine.cancel(joint_id) and engine.cancel(bootstrap_id)
+
+    # Running jobs stop with the results so far
+    wait(engine, joint_id, timeout=30)
+    wait(engine, bootstrap_id, timeout=30)
+    assert time.time() - start < 30
+    status = get_joint_fit_status(joint_id)
+    assert status["state"] == "done" and status["parameters"] is not None
+    assert list(status["parameters"]) == data.conditions[:2]
+    status = get_bootstrap_status(bootstrap_id)
+    assert status["state"] == "done" and status["intervals"] is not None
+    assert 0 < status["done"] < status["total"] == 1000
+
+    # The budget in the settings limits every kind of job
+    few_evaluations, few_seconds = get_default_settings(), get_default_settings()
+    few_evaluations.max_evaluations = 50
+    few_seconds.max_seconds = 10
+    joint_id = engine.submit(run_joint_fit, data, few_evaluations, data.conditions[:2])
+    bootstrap_id = engine.submit(run_bootstrap, cond_data, few_seconds, few_seconds.parameters, 1000)
+    wait(engine, joint_id, timeout=60)
+    wait(engine, bootstrap_id, timeout=60)
+    assert engine.status(joint_id).budget.exceeded() == "evaluations"
+    assert get_joint_fit_status(joint_id)["state"] == "done"
+    assert engine.status(bootstrap_id).budget.exceeded() == "time"
+    status = get_bootstrap_status(bootstrap_id)
+    assert status["state"] == "done" and 0 < status["done"] < status["total"]
+
+def test_profile_jobs(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    engine = JobEngine(max_jobs=2)
+    monkeypatch.setattr(check_status, "engine", engine)
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    fitted = settings.parameters
+    mDD = fitted["mDD"]
+
+    profile_id = engine.submit(run_profile, cond_data, settings, fitted, [{"name": "mDD", "lower": mDD - 5, "upper": mDD + 5, "n": 3}])
+    long_id = engine.submit(run_profile, cond_data, settings, fitted, [{"name": "mDD", "lower": mDD - 5, "upper": mDD + 5, "n": 1000}])
+    while get_profile_status(long_id)["done"] == 0:
+        time.sleep(0.1)
+    assert engine.cancel(long_id)
+
+    wait(engine, profile_id)
+    status = get_profile_status(profile_id)
+    assert status["state"] == "done" and status["done"] == status["total"] == 3
+    result = status["result"]
+    assert result is not None and result.parameters is not None
+    assert result.chisqr.shape == (3,) and np.isfinite(result.chisqr).all()
+    assert_allclose(result.parameters["mDD"], result.grids[0])
+
+    # A cancelled profile leaves nan at the points that didn't finish
+    wait(engine, long_id, timeout=30)
+    status = get_profile_status(long_id)
+    assert status["state"] == "done" and 0 < status["done"] < status["total"] == 1000
+    result = status["result"]
+    assert result is not None
+    assert 0 < np.isfinite(result.chisqr).sum() < 1000 and np.isnan(result.chisqr[-1])
+
+def test_fit_deduplication(data_path: Path, tmp_path: Path):
+    engine = JobEngine(cache=ResultCache(tmp_path))
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+
+    # An identical request attaches to the running fit
+    task_id = engine.submit(run_fit, cond_data, get_default_settings(), deduplicate=True)
+    assert engine.submit(run_fit, cond_data, get_default_settings(), deduplicate=True) == task_id
+    wait(engine, task_id)
+    fitted = engine.status(task_id).result
+
+    # Once done, it is served from the cache
+    cached_id = engine.submit(run_fit, cond_data, get_default_settings(), deduplicate=True)
+    assert cached_id != task_id
+    cached = engine.status(cached_id)
+    assert cached.state == "done" and cached.result == fitted
+    assert cached.progress == engine.status(task_id).progress
+
+    # Different settings run a new fit
+    settings = get_default_settings()
+    settings.parameters = {**settings.parameters, "b": 12}
+    other_id = engine.submit(run_fit, cond_data, settings, deduplicate=True)
+    assert engine.status(other_id).state in ("queued", "running")
+    engine.cancel(other_id)
+    wait(engine, other_id)
+
+    # Fits that run out of budget aren't cached
+    settings = get_default_settings()
+    settings.max_evaluations = 30
+    truncated_id = engine.submit(run_fit, cond_data, settings, deduplicate=True)
+    wait(engine, truncated_id)
+    assert engine.status(truncated_id).progress["truncated"] == "evaluations"
+    rerun_id = engine.submit(run_fit, cond_data, settings, deduplicate=True)
+    assert engine.status(rerun_id).state in ("queued", "running")
+    engine.cancel(rerun_id)
+    wait(engine, rerun_id)
+
+def test_extrapolate_cache(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = ExtrapolationCache(max_models=1, max_results=2)
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    params = get_default_settings().parameters
+    calls: list[tuple[Cyton2Model, Parameters, Sequence[ExtrapolationField] | None]] = []
+    def counting_extrapolate(self: SingleConditionData, model: Cyton2Model, params: Parameters, fields: Sequence[ExtrapolationField] | None = None):
+        calls.append((model, params, fields))
+        return extrapolate_without_data(params, fields)
+    monkeypatch.setattr(SingleConditionData, "extrapolate_model", counting_extrapolate)
+
+    async def extrapolate(*requests: tuple[SingleConditionData | None, Parameters, list[ExtrapolationField] | None]):
+        return await asyncio.gather(*(cache.extrapolate(*request) for request in requests))
+
+    # Concurrent identical requests share one extrapolation
+    first, second = asyncio.run(extrapolate((cond_data, params, ["hts"]), (cond_data, params, ["hts"])))
+    assert first is second and len(calls) == 1
+    # Repeats are served from the cache, whatever the order of the fields
+    assert asyncio.run(extrapolate((cond_data, params, ["hts", "hts"])))[0] is first and len(calls) == 1
+
+    # The model is reused for other parameters and fields
+    asyncio.run(extrapolate((cond_data, {**params, "b": 12}, ["hts"]), (cond_data, params, None)))
+    assert len(calls) == 3 and calls[1][0] is calls[0][0] is calls[2][0]
+    # The oldest result has been evicted
+    assert asyncio.run(extrapolate((cond_data, params, ["hts"])))[0] is not first and len(calls) == 4
+
+    # Without data, the default model is used and replaces the condition's model
+    default = asyncio.run(extrapolate((None, params, None)))[0]
+    assert len(cache.models) == 1
+    assert np.array_equal(as_dict(default)["ext"]["total_live_cells"], as_dict(extrapolate_without_data(params))["ext"]["total_live_cells"])
+
+def test_binary_responses(data_path: Path):
+    client = TestClient(app)
+    params = get_default_settings().parameters
+    expected = as_dict(extrapolate_without_data(params))
+
+    response = client.post("/api/extrapolate", json={"parameters": params}, headers={"Accept": f"{BINARY_MEDIA_TYPE}, application/json"})
+    assert response.headers["content-type"] == BINARY_MEDIA_TYPE
+    # Large responses are compressed
+    assert response.headers["content-encoding"] == "gzip"
+    result = decode_arrays(response.content)
+    assert result["ext"]["cells_gen"]["data_type"] == "float64"
+    assert np.array_equal(result["ext"]["cells_gen"]["data"], expected["ext"]["cells_gen"])
+    assert np.array_equal(result["hts"]["cells_gen"], expected["hts"]["cells_gen"])
+    assert result["hts"]["harvest_times"] == expected["hts"]["harvest_times"]
+
+    # JSON remains the default
+    response = client.post("/api/extrapolate", json={"parameters": params})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["ext"]["total_live_cells"]["data"] == expected["ext"]["total_live_cells"].tolist()
+
+    with open(data_path, "rb") as file:
+        response = client.post("/api/upload", files={"file": file}, headers={"Accept": BINARY_MEDIA_TYPE})
+    data = decode_arrays(response.content)["data"]
+    expected_data = parse_file(str(data_path))
+    assert data["conditions"] == expected_data.conditions
+    assert np.array_equal(data["cell_gens_reps"][0][0], expected_data.cell_gens_reps[0][0])
+
+def test_datasets(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(api, "datasets", DatasetStore())
+    parsed: list[str] = []
+    def counting_parse_file(path: str) -> ExperimentData:
+        parsed.append(path)
+        return parse_file(path)
+    monkeypatch.setattr(api, "parse_file", counting_parse_file)
+    client = TestClient(app)
+
+    # Identical uploads are parsed once
+    uploads = []
+    for _ in range(2):
+        with open(data_path, "rb") as file:
+            uploads.append(client.post("/api/upload", files={"file": file}).json())
+    assert len(parsed) == 1
+    assert uploads[0] == uploads[1]
+    dataset_id, data = uploads[0]["dataset_id"], uploads[0]["data"]
+
+    # The dataset ID stands in for the data
+    params = get_default_settings().parameters
+    condition = data["conditions"][0]
+    by_id = client.post("/api/extrapolate", params={"dataset_id": dataset_id, "condition": condition}, json={"parameters": params})
+    by_data = client.post("/api/extrapolate", params={"condition": condition}, json={"parameters": params, "data": data})
+    assert by_id.status_code == 200 and by_id.json() == by_data.json()
+
+    # Unknown datasets have to be uploaded again
+    response = client.post("/api/extrapolate", params={"dataset_id": "unknown", "condition": condition}, json={"parameters": params})
+    assert response.status_code == 404
+    response = client.post("/api/start_fit", params={"condition": condition}, json={"settings": get_default_settings().model_dump(mode="json")})
+    assert response.status_code == 400
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+from scipy.stats import lognorm, norm
+from cyton.core import distributions
+
+@pytest.mark.parametrize("logn", [True, False])
+@pytest.mark.parametrize("name", ["pdf", "cdf", "sf"])
+def test_matches_scipy(logn: bool, name: str):
+    # Far into both tails, and at the edges of the lognormal support
+    times = np.concatenate([np.linspace(-50, 3000, 5001), [0., 1e-300, np.inf, -np.inf]])
+    for mu in (1e-2, 30, 100_000):
+        for sig in (1e-10, 0.2, 2, 50):
+            expected = getattr(lognorm, name)(times, sig, scale=mu) if logn else getattr(norm, name)(times, mu, sig)
+            result = getattr(distributions, name)(times, mu, sig, logn)
+            # scipy flushes some subnormal results to 0
+            assert_allclose(result, expected, rtol=1e-12, atol=1e-300)
+
+def test_broadcasting():
+    times = np.arange(0, 100, 0.5)
+    mu = np.array([[30.], [40.]])
+    sig = np.array([[0.2], [0.3]])
+    assert_allclose(distributions.cdf(times, mu, sig), lognorm.cdf(times, sig, scale=mu), rtol=1e-12)
+    assert_allclose(distributions.sf(times[None, :] - 10., mu, sig, logn=False), norm.sf(times[None, :] - 10., mu, sig), rtol=1e-12, atol=1e-300)
+    assert np.ndim(distributions.pdf(5., 30, 0.2)) == 0
+    assert np.isnan(distributions.pdf(times, -1., 0.2)).all()
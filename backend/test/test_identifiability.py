@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose
+from pathlib import Path
+from typing import cast
+from cyton.api.support.default_settings import get_default_settings
+from cyton.api.support.upload import parse_file
+from cyton.core.identifiability import parameter_grid
+from cyton.core.model import Cyton2Model, PARAM_NAMES
+from cyton.core.models import SingleConditionData
+from cyton.core.types import Parameters, ParameterRange
+
+type Fitted = tuple[SingleConditionData, Cyton2Model, Parameters]
+
+@pytest.fixture
+def fitted(data_path: Path) -> Fitted:
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    model = cond_data.get_model()
+    return cond_data, model, cond_data.fit_model(model, get_default_settings())
+
+def test_parameter_grid():
+    fitted = cast(Parameters, dict(zip(PARAM_NAMES, map(float, range(10)))))
+    rows = parameter_grid(fitted, ["mDD", "sDD"], [np.array([1., 2.]), np.array([3., 4., 5.])])
+    assert rows.shape == (6, 10)
+    assert rows[:, PARAM_NAMES.index("mDD")].tolist() == [1, 1, 1, 2, 2, 2]
+    assert rows[:, PARAM_NAMES.index("sDD")].tolist() == [3, 4, 5, 3, 4, 5]
+    assert (rows[:, PARAM_NAMES.index("b")] == fitted["b"]).all()
+
+def test_chisqr_surface(fitted: Fitted):
+    cond_data, model, params = fitted
+    ranges: list[ParameterRange] = [{"name": "mDD", "lower": 60, "upper": 80, "n": 21}, {"name": "sDD", "lower": 0.05, "upper": 0.2, "n": 16}]
+    result = cond_data.surface_model(model, params, ranges)
+
+    assert result.chisqr.shape == (21, 16)
+    # Matches single evaluations
+    y_cells = np.concatenate([np.ravel(rep) for reps in cond_data.cell_gens_reps for rep in reps])
+    i, j = 7, 3
+    point: Parameters = {**params, "mDD": float(result.grids[0][i]), "sDD": float(result.grids[1][j])}
+    pred = model.evaluate(**point)
+    assert_allclose(result.chisqr[i, j], np.sum((y_cells - pred)**2), rtol=1e-10)
+    # Near the fitted value of mDD and sDD
+    i, j = np.unravel_index(np.argmin(result.chisqr), result.chisqr.shape)
+    assert abs(result.grids[0][i] - params["mDD"]) <= 1
+    assert abs(result.grids[1][j] - params["sDD"]) <= 0.01
+
+def test_profile_likelihood(fitted: Fitted):
+    cond_data, model, params = fitted
+    settings = get_default_settings()
+    ranges: list[ParameterRange] = [{"name": "mDD", "lower": params["mDD"] - 5, "upper": params["mDD"] + 5, "n": 5}]
+    profile = cond_data.surface_model(model, params, ranges, settings, profile=True)
+    surface = cond_data.surface_model(model, params, ranges)
+
+    # Re-optimising can only lower the chi-square, and the profile is lowest at the fit
+    assert profile.parameters is not None
+    assert_allclose(profile.parameters["mDD"], profile.grids[0])
+    assert (profile.chisqr <= surface.chisqr * (1 + 1e-9)).all()
+    assert np.argmin(profile.chisqr) == 2
+
+    twice: list[ParameterRange] = [{"name": "mDD", "lower": 0, "upper": 1, "n": 2}] * 2
+    with pytest.raises(ValueError):
+        cond_data.surface_model(model, params, twice)
+    # The grid is capped
+    too_fine: list[ParameterRange] = [{"name": "mDD", "lower": 0, "upper": 1, "n": 1000}, {"name": "sDD", "lower": 0, "upper": 1, "n": 1000}]
+    with pytest.raises(ValueError):
+        cond_data.surface_model(model, params, too_fine)
@@ -0,0 +1,58 @@
+import numpy as np
+from numpy.testing import assert_allclose, assert_approx_equal
+from pathlib import Path
+from typing import cast
+from cyton.api.support.default_settings import get_default_settings
+from cyton.api.support.upload import parse_file
+from cyton.core.joint_fitting import JointProblem
+from cyton.core.model import PARAM_NAMES
+from cyton.core.models import ExperimentData
+from cyton.core.types import SharedParams
+from cyton.core.utils import flatten
+
+def two_conditions(data: ExperimentData) -> ExperimentData:
+    "The first condition of data, twice"
+    fields = [name for name in ExperimentData.model_fields if name != "conditions"]
+    return data.model_copy(update={name: [getattr(data, name)[0]] * 2 for name in fields} | {"conditions": ["A", "B"]})
+
+def test_sparse_jacobian(data_path: Path):
+    data = two_conditions(parse_file(str(data_path)))
+    params, paramExcl = get_default_settings().get_lmf_parameters()
+    shared = cast(SharedParams, {par: par == "b" for par in PARAM_NAMES})
+    cond_data = [data.slice_condition(condition) for condition in data.conditions]
+    models = [cond.get_model() for cond in cond_data]
+    y_cells = [np.fromiter(flatten(cond.cell_gens_reps), dtype=float) for cond in cond_data]
+    problem = JointProblem(params, paramExcl, shared, models, y_cells)
+
+    # 6 parameters per condition, plus b
+    assert problem.n_vary == 13
+    x = problem.vector({par: params[par].value for par in params})
+    x[problem.index[1, PARAM_NAMES.index("mDiv0")]] *= 1.2
+    values = problem.values(x)
+    jac = problem.jacobian(x)
+    # Each condition's rows only have its own and the shared columns
+    assert jac.nnz == sum(y.size for y in y_cells) * 7
+
+    dense = jac.toarray()
+    for c, model in enumerate(models):
+        rows = slice(problem.offsets[c], problem.offsets[c + 1])
+        block = -model.jacobian(*values[c])
+        for k in np.flatnonzero(problem.varying[c]):
+            assert_allclose(dense[rows, problem.index[c, k]], block[:, k])
+    assert_allclose(problem.residual(x)[problem.offsets[1]:], y_cells[1] - models[1].evaluate(*values[1]))
+
+def test_joint_fit(data_path: Path):
+    data = two_conditions(parse_file(str(data_path)))
+    settings = get_default_settings()
+    settings.shared = cast(SharedParams, {par: par in ("b", "mDie", "sDie") for par in settings.vary})
+
+    fitted = data.fit_conditions(data.conditions, settings)
+
+    # Both conditions have the same data, so they also get the single condition fit
+    assert list(fitted) == ["A", "B"]
+    for params in fitted.values():
+        assert_approx_equal(params["mDiv0"], 39.81, significant=2)
+        assert_approx_equal(params["mDD"], 71.82, significant=2)
+        assert_approx_equal(params["mDie"], 115.88, significant=2)
+        assert_approx_equal(params["b"], 9.20, significant=1)
+    assert fitted["A"]["b"] == fitted["B"]["b"]
@@ -0,0 +1,156 @@
+import pickle
+from pathlib import Path
+from typing import Any, cast
+import numpy as np
+from numpy.testing import assert_allclose
+from cyton.api.support.upload import parse_file
+from cyton.core.model import Cyton2Model, PARAM_NAMES
+from cyton.core.models import ExtrapolationResults
+from cyton.core.settings import DEFAULT_PARS
+
+def default_pars(**changes: float) -> dict[str, float]:
+    "DEFAULT_PARS as a plain dict, with some values changed"
+    pars: dict[str, float] = {name: DEFAULT_PARS[name] for name in PARAM_NAMES}
+    pars.update(changes)
+    return pars
+
+def values(pars: dict[str, float]) -> list[float]:
+    "Arguments of Cyton2Model.evaluate"
+    return [pars[name] for name in PARAM_NAMES]
+
+def test_evaluate_batch(data_path: Path):
+    model = parse_file(str(data_path)).slice_condition_idx(0).get_model()
+
+    rng = np.random.default_rng(0)
+    base = np.array([DEFAULT_PARS[name] for name in PARAM_NAMES], dtype=float)
+    param_matrix = base * rng.uniform(0.8, 1.2, size=(5, len(PARAM_NAMES)))
+    param_matrix[:, PARAM_NAMES.index('p')] = rng.uniform(0.5, 1, size=5)
+
+    batch = model.evaluate_batch(param_matrix, chunk_size=2)
+    assert batch.shape[0] == 5
+    for row, pars in zip(batch, param_matrix):
+        assert_allclose(row, model.evaluate(*pars), rtol=1e-10, atol=1e-8)
+
+def test_evaluate_workspace(data_path: Path):
+    model = parse_file(str(data_path)).slice_condition_idx(0).get_model()
+    pars = values(default_pars())
+    expected = model.evaluate(*pars)
+    assert expected.shape == (model.n_obs,)
+
+    # Results don't depend on what a reused workspace or output buffer held before
+    workspace = model.new_workspace()
+    out = np.full(model.n_obs, np.nan)
+    model.evaluate(*[value * 1.1 for value in pars[:-1]] + [0.5], workspace=workspace, out=out)
+    result = model.evaluate(*pars, workspace=workspace, out=out)
+    assert result is out
+    assert_allclose(result, expected)
+
+    # The model, minus its per-thread workspaces, survives pickling
+    assert_allclose(pickle.loads(pickle.dumps(model)).evaluate(*pars), expected)
+
+def test_jacobian(data_path: Path):
+    model = parse_file(str(data_path)).slice_condition_idx(0).get_model()
+    pars = np.array([DEFAULT_PARS[name] for name in PARAM_NAMES], dtype=float)
+    pars[PARAM_NAMES.index('p')] = 0.8
+    pars[PARAM_NAMES.index('mUns')] = 60
+    pars[PARAM_NAMES.index('sUns')] = 0.3
+
+    jac = model.jacobian(*pars)
+    assert jac.shape == (model.n_obs, len(PARAM_NAMES))
+    for ipar, value in enumerate(pars):
+        # Central differences
+        step = 1e-6 * max(1., abs(value))
+        upper, lower = pars.copy(), pars.copy()
+        upper[ipar] += step
+        lower[ipar] -= step
+        numerical = (model.evaluate(*upper) - model.evaluate(*lower)) / (2 * step)
+        assert_allclose(jac[:, ipar], numerical, rtol=1e-5, atol=1e-6 * np.abs(numerical).max() + 1e-12)
+
+def test_stage_cache(data_path: Path):
+    model = parse_file(str(data_path)).slice_condition_idx(0).get_model()
+    pars = default_pars()
+    expected = model.evaluate(*values(pars))
+    assert all(cache.misses == 1 for cache in model.caches.values())
+
+    # Changing one parameter only recomputes the stage that depends on it
+    pars['mDD'] *= 1.1
+    changed = model.evaluate(*values(pars))
+    assert {stage: cache.misses for stage, cache in model.caches.items()} == {'uns': 1, 'die': 1, 'dd': 2, 'div': 1}
+
+    # Reverting it is served from the cache and gives the original answer
+    pars['mDD'] = DEFAULT_PARS['mDD']
+    assert_allclose(model.evaluate(*values(pars)), expected)
+    assert model.caches['dd'].misses == 2
+    assert not np.allclose(changed, expected)
+
+def test_shifted_cdf(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    model = cond_data.get_model()
+    # A negative tolerance never takes the aligned shortcut, so this model evaluates every shift exactly
+    exact = Cyton2Model(ht=cond_data.exp_ht, n0=cond_data.calc_n0(), max_div=cond_data.max_div, dt=model.dt, nreps=cond_data.calc_nreps(), shift_tol=-1)
+    interpolated = Cyton2Model(ht=cond_data.exp_ht, n0=cond_data.calc_n0(), max_div=cond_data.max_div, dt=model.dt, nreps=cond_data.calc_nreps(), shift_tol=-1, interp_tol=1e-3)
+
+    # b = 10 is a whole number of time steps, so every generation reads a view of one cdf
+    pars = [DEFAULT_PARS[name] for name in PARAM_NAMES]
+    assert_allclose(model.evaluate(*pars), exact.evaluate(*pars), rtol=1e-12)
+
+    # Interpolated cdfs stay within the requested tolerance
+    times = model.times
+    reference = exact._shifted_cdf(times, 30., 0.2, 9.3)
+    assert np.abs(interpolated._shifted_cdf(times, 30., 0.2, 9.3) - reference).max() <= 1e-3
+
+def test_float32(data_path: Path):
+    model = parse_file(str(data_path)).slice_condition_idx(0).get_model()
+    model32 = model.astype(np.float32)
+    pars = [DEFAULT_PARS[name] for name in PARAM_NAMES]
+
+    result = model32.evaluate(*pars)
+    assert result.dtype == np.float32 and model.evaluate(*pars).dtype == np.float64
+    assert_allclose(result, model.evaluate(*pars), rtol=1e-4, atol=1e-3)
+    assert_allclose(model32.evaluate_batch([pars]), model.evaluate_batch([pars]), rtol=1e-4, atol=1e-3)
+    assert_allclose(model32.jacobian(*pars), model.jacobian(*pars), rtol=1e-3, atol=1e-4 * np.abs(model.jacobian(*pars)).max())
+
+def as_dict(results: ExtrapolationResults) -> dict[str, Any]:
+    "Cyton2Model.extrapolate returns plain dicts, which the API validates as ExtrapolationResults"
+    return cast(dict[str, Any], results)
+
+def test_extrapolate_fields(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    model = cond_data.get_model()
+    full = as_dict(cond_data.extrapolate_model(model, DEFAULT_PARS))
+    assert set(full['ext']) == {'time_points', 'total_live_cells', 'cells_gen', 'nUNS', 'nDIV', 'nDES', 'densities'}
+
+    # Only the requested outputs are returned, with the same values
+    partial = as_dict(cond_data.extrapolate_model(model, DEFAULT_PARS, ['total_live_cells', 'hts']))
+    assert set(partial['ext']) == {'time_points', 'total_live_cells'}
+    assert_allclose(partial['ext']['total_live_cells'], full['ext']['total_live_cells'])
+    assert_allclose(partial['hts']['total_live_cells'], full['hts']['total_live_cells'])
+
+    densities = as_dict(cond_data.extrapolate_model(model, DEFAULT_PARS, ['densities']))
+    assert 'hts' not in densities and set(densities['ext']) == {'time_points', 'densities'}
+
+def test_generation_truncation(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    model = cond_data.get_model()
+    every_gen = Cyton2Model(ht=cond_data.exp_ht, n0=cond_data.calc_n0(), max_div=cond_data.max_div, dt=model.dt, nreps=cond_data.calc_nreps(), gen_tol=-1)
+    ten_gens = Cyton2Model(ht=cond_data.exp_ht, n0=cond_data.calc_n0(), max_div=cond_data.max_div, dt=model.dt, nreps=cond_data.calc_nreps(), max_div_cap=10)
+
+    for b in (5., 10., 40.):
+        pars = values(default_pars(b=b))
+        # Skipped generations hold fewer than gen_tol * n0 cells
+        assert_allclose(model.evaluate(*pars), every_gen.evaluate(*pars), rtol=0, atol=model.gen_tol * model.n0)
+        assert_allclose(model.jacobian(*pars), every_gen.jacobian(*pars), rtol=1e-6, atol=1e-6)
+    batch = [values(default_pars(b=b)) for b in (5., 40.)]
+    assert_allclose(model.evaluate_batch(batch), [every_gen.evaluate(*pars) for pars in batch], rtol=0, atol=model.gen_tol * model.n0)
+
+    # Shifted cdfs are only computed for the generations that can hold cells
+    slow = default_pars(b=40.)
+    assert model._shifted_cdf(model.times, slow["mDiv0"], slow["sDiv0"], 40.).shape[0] < 6
+    assert every_gen._shifted_cdf(model.times, slow["mDiv0"], slow["sDiv0"], 40.).shape[0] == model.max_div + 1
+
+    # Fast division needs more than 10 generations, and they are folded into the last observed one
+    pars = values(default_pars(b=5.))
+    extra = model.evaluate(*pars) - ten_gens.evaluate(*pars)
+    last_gen = np.arange(model.n_obs) % (model.exp_max_div + 1) == model.exp_max_div
+    assert extra[last_gen].max() > 0
+    assert_allclose(extra[~last_gen], 0, atol=1e-6)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from cyton.api.support.default_settings import get_default_settings
+from cyton.core.model_fitting import start_design, best_starts, replicate_blocks
+from cyton.core.types import StartDesign
+
+@pytest.mark.parametrize("design", ["sobol", "lhs", "uniform"])
+def test_start_design(design: StartDesign):
+    params, paramExcl = get_default_settings().get_lmf_parameters()
+    initials = start_design(params, paramExcl, 30, design)
+    assert len(initials) == 30
+    for initial in initials:
+        assert set(initial) == {par for par in params if par not in paramExcl}
+        assert all(params[par].min <= value <= params[par].max for par, value in initial.items())
+    # Starting points are reproducible
+    assert start_design(params, paramExcl, 30, design) == initials
+    # A joint fit with JOINT_ITER_SEARCH = 1 asks for no more starts
+    assert start_design(params, paramExcl, 0, design) == []
+
+def test_best_starts():
+    consumed = []
+    def results():
+        for index, chisqr in enumerate([5., 3., 7., 3. + 1e-9, 1., 1., 4., 1., 1.]):
+            consumed.append(index)
+            yield chisqr, f"start {index}"
+
+    # Stops at the third start that reaches the best chi-square, keeping the best two in order
+    assert best_starts(results(), n_keep=2, n_reproduce=3) == [(1., "start 4"), (1., "start 5")]
+    assert consumed == list(range(8))
+
+    # Without early stopping every start runs
+    consumed.clear()
+    assert best_starts(results(), n_keep=1, n_reproduce=None) == [(1., "start 4")]
+    assert consumed == list(range(9))
+    assert best_starts([(np.nan, "nan"), (2., "two")], n_keep=2, n_reproduce=None) == [(2., "two"), (np.inf, "nan")]
+
+def test_replicate_blocks():
+    cell_gens_reps = [[[1., 2.], [3., 4.]], [[5., 6.]]]
+    blocks = replicate_blocks(cell_gens_reps)
+    assert [[block.tolist() for block in reps] for reps in blocks] == [[[0, 1], [2, 3]], [[4, 5]]]
@@ -0,0 +1,31 @@
+import os
+import time
+from pathlib import Path
+from cyton.api.support.default_settings import get_default_settings
+from cyton.api.support.result_cache import ResultCache, content_key
+
+def test_content_key():
+    settings = get_default_settings()
+    assert content_key("fit", settings) == content_key("fit", get_default_settings())
+    settings.coarse_dt = 2
+    assert content_key("fit", settings) != content_key("fit", get_default_settings())
+
+def test_result_cache(tmp_path: Path):
+    cache = ResultCache(tmp_path, max_entries=2, ttl=3600)
+    assert cache.get("a") is None
+    cache.put("a", {"b": [1.5, 2]})
+    assert cache.get("a") == {"b": [1.5, 2]}
+
+    # The least recently used entry is evicted
+    os.utime(tmp_path / "a.json", (time.time() - 10, time.time() - 10))
+    cache.put("b", 1)
+    os.utime(tmp_path / "b.json", (time.time() - 5, time.time() - 5))
+    cache.get("a")
+    cache.put("c", 2)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") == 2
+
+    # Entries expire after the ttl, even if they have been used since
+    expiring = ResultCache(tmp_path, max_entries=2, ttl=0)
+    assert expiring.get("c") is None
+    assert not (tmp_path / "c.json").exists()
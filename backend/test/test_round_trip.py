@@ -1,7 +1,13 @@
 from cyton.api.support.default_settings import get_default_settings
 from cyton.api.support.upload import parse_file
+from cyton.core import model_fitting
+from cyton.core.budget import FitBudget
+from cyton.core.settings import COARSE_DT, ITER_SEARCH
+from cyton.core.telemetry import FitTelemetry
 from numpy.testing import assert_approx_equal
 from pathlib import Path
+from typing import Any
+import pytest
 
 def test_round_trip(data_path: Path):
     experiment_data = parse_file(str(data_path))
@@ -19,3 +25,128 @@ def test_round_trip(data_path: Path):
     assert_approx_equal(params["b"], 9.20, significant=1)
 
     cond_data.extrapolate_model(model, params)
+
+def test_round_trip_multi_resolution(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    settings.coarse_dt = COARSE_DT
+
+    model = cond_data.get_model()
+    params = cond_data.fit_model(model, settings)
+
+    # Same answer as the single resolution fit, to the same tolerance
+    assert_approx_equal(params["mDiv0"], 39.81, significant=2)
+    assert_approx_equal(params["sDiv0"], 0.28, significant=2)
+    assert_approx_equal(params["mDD"], 71.82, significant=2)
+    assert_approx_equal(params["sDD"], 0.11, significant=2)
+    assert_approx_equal(params["mDie"], 115.88, significant=2)
+    assert_approx_equal(params["sDie"], 0.84, significant=2)
+    assert_approx_equal(params["b"], 9.20, significant=1)
+
+def test_round_trip_float32_screening(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    settings.screening_precision = "float32"
+
+    model = cond_data.get_model()
+    params = cond_data.fit_model(model, settings)
+
+    # The float64 refit recovers the full precision answer
+    assert_approx_equal(params["mDiv0"], 39.81, significant=2)
+    assert_approx_equal(params["sDiv0"], 0.28, significant=2)
+    assert_approx_equal(params["mDD"], 71.82, significant=2)
+    assert_approx_equal(params["sDD"], 0.11, significant=2)
+    assert_approx_equal(params["mDie"], 115.88, significant=2)
+    assert_approx_equal(params["sDie"], 0.84, significant=2)
+    assert_approx_equal(params["b"], 9.20, significant=1)
+
+def test_parallel_fit_reproducible(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(model_fitting, "ITER_SEARCH", 4)
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    params, paramExcl = get_default_settings().get_lmf_parameters()
+    model = cond_data.get_model()
+
+    # Initial guesses are drawn before the starts are shared out, so the answer doesn't depend on the number of workers
+    serial = model_fitting.fit(cond_data.exp_ht, cond_data.cell_gens_reps, params, paramExcl, model, n_workers=1)
+    parallel = model_fitting.fit(cond_data.exp_ht, cond_data.cell_gens_reps, params, paramExcl, model, n_workers=2)
+    assert serial == parallel
+
+def test_round_trip_warm_start(data_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    model = cond_data.get_model()
+    fitted = cond_data.fit_model(model, settings)
+
+    # Refitting from the previous answer, with a parameter nudged, converges locally without the global search
+    def no_search(*args: Any, **kwargs: Any):
+        raise AssertionError("The global search should not run")
+    monkeypatch.setattr(model_fitting, "search", no_search)
+    settings.warm_start = True
+    settings.parameters = {**fitted, "mDD": fitted["mDD"] * 1.1}
+    params = cond_data.fit_model(model, settings)
+
+    for name in ("mDiv0", "sDiv0", "mDD", "sDD", "mDie", "sDie", "b"):
+        assert_approx_equal(params[name], fitted[name], significant=4)
+
+def test_round_trip_trf(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    settings.backend = "trf"
+
+    model = cond_data.get_model()
+    params = cond_data.fit_model(model, settings)
+
+    # Same answer as the lmfit backend
+    assert_approx_equal(params["mDiv0"], 39.81, significant=2)
+    assert_approx_equal(params["sDiv0"], 0.28, significant=2)
+    assert_approx_equal(params["mDD"], 71.82, significant=2)
+    assert_approx_equal(params["sDD"], 0.11, significant=2)
+    assert_approx_equal(params["mDie"], 115.88, significant=2)
+    assert_approx_equal(params["sDie"], 0.84, significant=2)
+    assert_approx_equal(params["b"], 9.20, significant=1)
+
+def test_bootstrap(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    model = cond_data.get_model()
+    params = cond_data.fit_model(model, settings)
+
+    progress = []
+    intervals = cond_data.bootstrap_model(model, settings, params, n_boot=20, progress=lambda done, total: progress.append((done, total)))
+
+    assert progress == [(done, 20) for done in range(1, 21)]
+    assert set(intervals) == {par for par, vary in settings.vary.items() if vary}
+    for par, (lower, upper) in intervals.items():
+        assert lower <= upper
+        # The refits scatter around the best fit
+        assert lower - 1e-6 * abs(lower) <= params[par] <= upper + 1e-6 * abs(upper)
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_fit_budget(data_path: Path, n_workers: int):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    params, paramExcl = get_default_settings().get_lmf_parameters()
+    model = cond_data.get_model()
+
+    # The budget is shared with the workers and stops the fit within a start
+    budget = FitBudget(nfev=50)
+    telemetry = FitTelemetry()
+    fitted = model_fitting.fit(cond_data.exp_ht, cond_data.cell_gens_reps, params, paramExcl, model, n_workers=n_workers, telemetry=telemetry, budget=budget)
+    assert set(fitted) == set(params)
+    assert telemetry.truncated == "evaluations"
+    assert 50 <= budget.nfev <= 50 + n_workers
+    assert telemetry.starts_completed < ITER_SEARCH
+
+def test_cancel_fit(data_path: Path):
+    cond_data = parse_file(str(data_path)).slice_condition_idx(0)
+    settings = get_default_settings()
+    model = cond_data.get_model()
+
+    budget = FitBudget()
+    budget.cancel()
+    telemetry = FitTelemetry()
+    fitted = cond_data.fit_model(model, settings, telemetry, budget)
+
+    # The first start stops straight away, and its initial guess is the best so far
+    assert telemetry.truncated == "cancelled"
+    assert telemetry.starts_completed == 1 and telemetry.evaluate_calls == 0
+    assert set(fitted) == set(settings.parameters)
@@ -0,0 +1,129 @@
+/*
+ * Binary responses of the Cyton API
+ *
+ * Decodes the application/vnd.cyton.arrays encoding that /api/extrapolate and /api/upload send instead of JSON
+ * when it is accepted (see backend/cyton/api/support/binary.py). It lives outside ./client, which is regenerated.
+ *
+ * Use it by passing BinaryHttpRequest to the generated client:
+ *   const client = new CytonClient({ BASE: '' }, BinaryHttpRequest);
+ */
+import axios from 'axios';
+import type { AxiosResponseHeaders, RawAxiosResponseHeaders } from 'axios';
+import { BaseHttpRequest } from './client/core/BaseHttpRequest';
+import type { ApiRequestOptions } from './client/core/ApiRequestOptions';
+import type { CancelablePromise } from './client/core/CancelablePromise';
+import type { OpenAPIConfig } from './client/core/OpenAPI';
+import { request as __request } from './client/core/request';
+
+export const BINARY_MEDIA_TYPE = 'application/vnd.cyton.arrays';
+
+type Placeholder = { $array: [number, number[]] };
+
+const isPlaceholder = (value: any): value is Placeholder =>
+  typeof value === 'object' &&
+  value !== null &&
+  Object.keys(value).length === 1 &&
+  Array.isArray(value.$array);
+
+// Nested arrays of values[offset:], with the given shape
+const readArray = (values: Float64Array, offset: number, shape: number[]): any => {
+  if (shape.length === 0) {
+    return values[offset];
+  }
+  const [length, ...rest] = shape;
+  if (rest.length === 0) {
+    // Much faster than Array.from on a typed array
+    const array = new Array<number>(length);
+    for (let i = 0; i < length; i++) {
+      array[i] = values[offset + i];
+    }
+    return array;
+  }
+  const stride = rest.reduce((size, n) => size * n, 1);
+  return Array.from({ length }, (_, i) =>
+    readArray(values, offset + i * stride, rest),
+  );
+};
+
+// Float64Array reads in the platform's byte order, which is little-endian almost everywhere
+const littleEndian = new Uint8Array(new Float64Array([1]).buffer)[7] === 0x3f;
+
+/**
+ * Decodes a binary response into the same value as its JSON response
+ */
+export const decodeArrays = <T = any>(buffer: ArrayBuffer): T => {
+  const view = new DataView(buffer);
+  const length = view.getUint32(0, true);
+  const header = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 4, length)),
+  );
+  const start = 4 + length + ((8 - ((4 + length) % 8)) % 8);
+  const values = new Float64Array((buffer.byteLength - start) / 8);
+  if (littleEndian) {
+    values.set(new Float64Array(buffer, start));
+  } else {
+    values.forEach((_, i) => (values[i] = view.getFloat64(start + i * 8, true)));
+  }
+
+  const restore = (value: any): any => {
+    if (isPlaceholder(value)) {
+      const [offset, shape] = value.$array;
+      return readArray(values, offset / 8, shape);
+    }
+    if (Array.isArray(value)) {
+      return value.map(restore);
+    }
+    if (typeof value === 'object' && value !== null) {
+      return Object.fromEntries(
+        Object.entries(value).map(([key, item]) => [key, restore(item)]),
+      );
+    }
+    return value;
+  };
+  return restore(header);
+};
+
+// Parses binary responses with decodeArrays, and every other response as JSON if it can
+const transformResponse = (
+  data: ArrayBuffer,
+  headers: RawAxiosResponseHeaders | AxiosResponseHeaders,
+): any => {
+  if (String(headers['content-type'] ?? '').startsWith(BINARY_MEDIA_TYPE)) {
+    return decodeArrays(data);
+  }
+  const text = new TextDecoder().decode(data);
+  try {
+    return JSON.parse(text);
+  } catch (e) {
+    return text;
+  }
+};
+
+const binaryAxios = axios.create({
+  responseType: 'arraybuffer',
+  transformResponse,
+});
+
+/**
+ * HTTP request of the generated client that accepts binary responses,
+ * and falls back to JSON for the endpoints that don't have them
+ */
+export class BinaryHttpRequest extends BaseHttpRequest {
+  constructor(config: OpenAPIConfig) {
+    super(config);
+  }
+
+  public override request<T>(options: ApiRequestOptions): CancelablePromise<T> {
+    return __request(
+      this.config,
+      {
+        ...options,
+        headers: {
+          Accept: `${BINARY_MEDIA_TYPE}, application/json`,
+          ...options.headers,
+        },
+      },
+      binaryAxios,
+    );
+  }
+}
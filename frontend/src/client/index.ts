@@ -10,27 +10,42 @@ export { CancelablePromise, CancelError } from './core/CancelablePromise';
 export { OpenAPI } from './core/OpenAPI';
 export type { OpenAPIConfig } from './core/OpenAPI';
 
+export type { Body_chisqr_surface_api_chisqr_surface_post } from './models/Body_chisqr_surface_api_chisqr_surface_post';
 export type { Body_extrapolate_api_extrapolate_post } from './models/Body_extrapolate_api_extrapolate_post';
+export type { Body_start_bootstrap_api_start_bootstrap_post } from './models/Body_start_bootstrap_api_start_bootstrap_post';
 export type { Body_start_fit_api_start_fit_post } from './models/Body_start_fit_api_start_fit_post';
+export type { Body_start_joint_fit_api_start_joint_fit_post } from './models/Body_start_joint_fit_api_start_joint_fit_post';
+export type { Body_start_profile_api_start_profile_post } from './models/Body_start_profile_api_start_profile_post';
 export type { Body_upload_api_upload_post } from './models/Body_upload_api_upload_post';
+export type { BootstrapStatus } from './models/BootstrapStatus';
 export type { Bounds } from './models/Bounds';
 export type { CellAverage } from './models/CellAverage';
 export type { CellCount } from './models/CellCount';
 export type { CellTotal } from './models/CellTotal';
 export type { CellTotalSem } from './models/CellTotalSem';
 export type { Conditions } from './models/Conditions';
+export type { ConfidenceIntervals } from './models/ConfidenceIntervals';
+export type { DatasetId } from './models/DatasetId';
 export type { ExperimentData_Input } from './models/ExperimentData_Input';
 export type { ExperimentData_Output } from './models/ExperimentData_Output';
 export type { ExperimentSettings_Input } from './models/ExperimentSettings_Input';
 export type { ExperimentSettings_Output } from './models/ExperimentSettings_Output';
 export type { ExtrapolatedTimeResults } from './models/ExtrapolatedTimeResults';
+export type { ExtrapolationField } from './models/ExtrapolationField';
 export type { ExtrapolationResults } from './models/ExtrapolationResults';
 export type { ExtrapolationTimes } from './models/ExtrapolationTimes';
+export type { FitBackend } from './models/FitBackend';
+export type { FitStatus } from './models/FitStatus';
 export type { FittableParams } from './models/FittableParams';
+export type { FitTelemetry } from './models/FitTelemetry';
 export type { HarvestTime } from './models/HarvestTime';
 export type { HarvestTimeResults } from './models/HarvestTimeResults';
 export type { HTTPValidationError } from './models/HTTPValidationError';
+export type { JobError } from './models/JobError';
+export type { JobState } from './models/JobState';
+export type { JointFitStatus } from './models/JointFitStatus';
 export type { MaxGeneration } from './models/MaxGeneration';
+export type { ParameterRange } from './models/ParameterRange';
 export type { Parameters } from './models/Parameters';
 export type { PerCond_int_ } from './models/PerCond_int_';
 export type { PerCond_MaxGeneration_ } from './models/PerCond_MaxGeneration_';
@@ -66,9 +81,13 @@ export type { PerTime_PerGen_CellTotalSem___Input } from './models/PerTime_PerGe
 export type { PerTime_PerGen_CellTotalSem___Output } from './models/PerTime_PerGen_CellTotalSem___Output';
 export type { PerTime_PerRep_PerGen_CellCount____Input } from './models/PerTime_PerRep_PerGen_CellCount____Input';
 export type { PerTime_PerRep_PerGen_CellCount____Output } from './models/PerTime_PerRep_PerGen_CellCount____Output';
+export type { ProfileStatus } from './models/ProfileStatus';
 export type { Reps_CellTotal_ } from './models/Reps_CellTotal_';
 export type { Reps_HarvestTime_ } from './models/Reps_HarvestTime_';
-export type { TaskId } from './models/TaskId';
+export type { SharedParams } from './models/SharedParams';
+export type { SurfaceResults } from './models/SurfaceResults';
+export type { TruncationReason } from './models/TruncationReason';
+export type { UploadedDataset } from './models/UploadedDataset';
 export type { ValidationError } from './models/ValidationError';
 
 export { DefaultService } from './services/DefaultService';
@@ -0,0 +1,15 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { ExperimentData_Input } from './ExperimentData_Input';
+import type { ParameterRange } from './ParameterRange';
+import type { Parameters } from './Parameters';
+
+export type Body_chisqr_surface_api_chisqr_surface_post = {
+    parameters: Parameters;
+    ranges: Array<ParameterRange>;
+    data?: (ExperimentData_Input | null);
+};
+
@@ -0,0 +1,15 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { ExperimentData_Input } from './ExperimentData_Input';
+import type { ExperimentSettings_Input } from './ExperimentSettings_Input';
+import type { Parameters } from './Parameters';
+
+export type Body_start_bootstrap_api_start_bootstrap_post = {
+    settings: ExperimentSettings_Input;
+    parameters: Parameters;
+    data?: (ExperimentData_Input | null);
+};
+
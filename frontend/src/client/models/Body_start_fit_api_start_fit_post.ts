@@ -7,7 +7,7 @@ import type { ExperimentData_Input } from './ExperimentData_Input';
 import type { ExperimentSettings_Input } from './ExperimentSettings_Input';
 
 export type Body_start_fit_api_start_fit_post = {
-    data: ExperimentData_Input;
     settings: ExperimentSettings_Input;
+    data?: (ExperimentData_Input | null);
 };
 
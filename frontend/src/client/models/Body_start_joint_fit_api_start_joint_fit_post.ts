@@ -0,0 +1,13 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { ExperimentData_Input } from './ExperimentData_Input';
+import type { ExperimentSettings_Input } from './ExperimentSettings_Input';
+
+export type Body_start_joint_fit_api_start_joint_fit_post = {
+    settings: ExperimentSettings_Input;
+    data?: (ExperimentData_Input | null);
+};
+
@@ -0,0 +1,17 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { ExperimentData_Input } from './ExperimentData_Input';
+import type { ExperimentSettings_Input } from './ExperimentSettings_Input';
+import type { ParameterRange } from './ParameterRange';
+import type { Parameters } from './Parameters';
+
+export type Body_start_profile_api_start_profile_post = {
+    settings: ExperimentSettings_Input;
+    parameters: Parameters;
+    ranges: Array<ParameterRange>;
+    data?: (ExperimentData_Input | null);
+};
+
@@ -0,0 +1,17 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { ConfidenceIntervals } from './ConfidenceIntervals';
+import type { JobError } from './JobError';
+import type { JobState } from './JobState';
+
+export type BootstrapStatus = {
+    state: JobState;
+    done: number;
+    total: number;
+    intervals: (ConfidenceIntervals | null);
+    error: (JobError | null);
+};
+
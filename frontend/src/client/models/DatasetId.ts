@@ -3,4 +3,4 @@
 /* tslint:disable */
 /* eslint-disable */
 
-export type TaskId = string;
+export type DatasetId = string;
@@ -4,8 +4,10 @@
 /* eslint-disable */
 
 import type { Bounds } from './Bounds';
+import type { FitBackend } from './FitBackend';
 import type { FittableParams } from './FittableParams';
 import type { Parameters } from './Parameters';
+import type { SharedParams } from './SharedParams';
 
 /**
  * Settings that define how the model will be fitted
@@ -14,5 +16,12 @@ export type ExperimentSettings_Output = {
     parameters: Parameters;
     bounds: Bounds;
     vary: FittableParams;
+    coarse_dt?: (number | null);
+    screening_precision?: 'float64' | 'float32';
+    warm_start?: boolean;
+    backend?: FitBackend;
+    max_seconds?: (number | null);
+    max_evaluations?: (number | null);
+    shared?: (SharedParams | null);
 };
 
@@ -4,17 +4,50 @@
 /* eslint-disable */
 
 import type { ExtrapolationTimes } from './ExtrapolationTimes';
-import type { np_ndarray } from './np_ndarray';
-import type { tuple_int_int_np_dtype_float64 } from './tuple_int_int_np_dtype_float64';
-import type { tuple_int_np_dtype_float64 } from './tuple_int_np_dtype_float64';
 
+/**
+ * Predictions for the extrapolation times. Every key but time_points is only present if it was requested.
+ */
 export type ExtrapolatedTimeResults = {
     time_points: ExtrapolationTimes;
-    total_live_cells: np_ndarray;
-    cells_gen: np_ndarray;
-    nUNS: np_ndarray;
-    nDIV: np_ndarray;
-    nDES: np_ndarray;
-    densities: Record<string, np_ndarray>;
+    /**
+     * NumPy ndarray with shape tuple[int] and dtype float64
+     */
+    total_live_cells?: {
+        data_type: string;
+        data: Array<number>;
+    };
+    /**
+     * NumPy ndarray with shape tuple[int, int] and dtype float64
+     */
+    cells_gen?: {
+        data_type: string;
+        data: Array<Array<number>>;
+    };
+    /**
+     * NumPy ndarray with shape tuple[int] and dtype float64
+     */
+    nUNS?: {
+        data_type: string;
+        data: Array<number>;
+    };
+    /**
+     * NumPy ndarray with shape tuple[int, int] and dtype float64
+     */
+    nDIV?: {
+        data_type: string;
+        data: Array<Array<number>>;
+    };
+    /**
+     * NumPy ndarray with shape tuple[int, int] and dtype float64
+     */
+    nDES?: {
+        data_type: string;
+        data: Array<Array<number>>;
+    };
+    densities?: Record<string, {
+        data_type: string;
+        data: Array<number>;
+    }>;
 };
 
@@ -0,0 +1,6 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+export type ExtrapolationField = 'total_live_cells' | 'cells_gen' | 'nUNS' | 'nDIV' | 'nDES' | 'densities' | 'hts';
@@ -8,6 +8,6 @@ import type { HarvestTimeResults } from './HarvestTimeResults';
 
 export type ExtrapolationResults = {
     ext: ExtrapolatedTimeResults;
-    hts: HarvestTimeResults;
+    hts?: (HarvestTimeResults | null);
 };
 
@@ -3,7 +3,11 @@
 /* tslint:disable */
 /* eslint-disable */
 
-import type { np_ndarray } from './np_ndarray';
-import type { tuple_int_np_dtype_float64 } from './tuple_int_np_dtype_float64';
+/**
+ * NumPy ndarray with shape tuple[int] and dtype float64
+ */
+export type ExtrapolationTimes = {
+    data_type: string;
+    data: Array<number>;
+};
 
-export type ExtrapolationTimes = np_ndarray;
@@ -0,0 +1,17 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { FitTelemetry } from './FitTelemetry';
+import type { JobError } from './JobError';
+import type { JobState } from './JobState';
+import type { Parameters } from './Parameters';
+
+export type FitStatus = {
+    state: JobState;
+    parameters: (Parameters | null);
+    telemetry: (FitTelemetry | null);
+    error: (JobError | null);
+};
+
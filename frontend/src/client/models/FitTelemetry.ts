@@ -0,0 +1,24 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { TruncationReason } from './TruncationReason';
+
+/**
+ * Live telemetry of a fit. Times are summed over the local fits, which may run in parallel,
+ * so they can add up to more than wall_seconds.
+ */
+export type FitTelemetry = {
+    starts_total?: number;
+    starts_completed?: number;
+    evaluate_calls?: number;
+    jacobian_calls?: number;
+    nfev?: Array<number>;
+    model_seconds?: number;
+    optimiser_seconds?: number;
+    wall_seconds?: number;
+    best_chisqr?: (number | null);
+    truncated?: (TruncationReason | null);
+};
+
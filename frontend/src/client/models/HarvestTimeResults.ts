@@ -3,14 +3,18 @@
 /* tslint:disable */
 /* eslint-disable */
 
-import type { np_ndarray } from './np_ndarray';
 import type { PerGen_PerTime_float__ } from './PerGen_PerTime_float__';
 import type { PerTime_HarvestTime_ } from './PerTime_HarvestTime_';
-import type { tuple_int_np_dtype_float64 } from './tuple_int_np_dtype_float64';
 
 export type HarvestTimeResults = {
     harvest_times: PerTime_HarvestTime_;
-    total_live_cells: np_ndarray;
+    /**
+     * NumPy ndarray with shape tuple[int] and dtype float64
+     */
+    total_live_cells: {
+        data_type: string;
+        data: Array<number>;
+    };
     cells_gen: PerGen_PerTime_float__;
 };
 
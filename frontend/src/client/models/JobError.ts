@@ -0,0 +1,14 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+/**
+ * Why a job failed
+ */
+export type JobError = {
+    type: string;
+    message: string;
+    traceback: (string | null);
+};
+
@@ -0,0 +1,15 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { JobError } from './JobError';
+import type { JobState } from './JobState';
+import type { Parameters } from './Parameters';
+
+export type JointFitStatus = {
+    state: JobState;
+    parameters: (Record<string, Parameters> | null);
+    error: (JobError | null);
+};
+
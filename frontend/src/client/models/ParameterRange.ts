@@ -0,0 +1,15 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+/**
+ * Evenly spaced values of one parameter, for a chi-square surface or profile
+ */
+export type ParameterRange = {
+    name: string;
+    lower: number;
+    upper: number;
+    'n': number;
+};
+
@@ -0,0 +1,17 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { JobError } from './JobError';
+import type { JobState } from './JobState';
+import type { SurfaceResults } from './SurfaceResults';
+
+export type ProfileStatus = {
+    state: JobState;
+    done: number;
+    total: number;
+    result: (SurfaceResults | null);
+    error: (JobError | null);
+};
+
@@ -0,0 +1,22 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+/**
+ * Dictionary of parameters, each of which is True if that parameter is fittable.
+ * See Parameters class for details.
+ */
+export type SharedParams = {
+    mUns: boolean;
+    sUns: boolean;
+    mDiv0: boolean;
+    sDiv0: boolean;
+    mDD: boolean;
+    sDD: boolean;
+    mDie: boolean;
+    sDie: boolean;
+    'b': boolean;
+    'p': boolean;
+};
+
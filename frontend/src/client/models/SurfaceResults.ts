@@ -0,0 +1,24 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+export type SurfaceResults = {
+    names: Array<string>;
+    grids: Array<{
+        data_type: string;
+        data: Array<number>;
+    }>;
+    /**
+     * NumPy ndarray with shape Any and dtype float64
+     */
+    chisqr: {
+        data_type: string;
+        data: Array<number>;
+    };
+    parameters?: (Record<string, {
+        data_type: string;
+        data: Array<number>;
+    }> | null);
+};
+
@@ -0,0 +1,13 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { DatasetId } from './DatasetId';
+import type { ExperimentData_Output } from './ExperimentData_Output';
+
+export type UploadedDataset = {
+    dataset_id: DatasetId;
+    data: ExperimentData_Output;
+};
+
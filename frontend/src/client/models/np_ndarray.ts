@@ -1,4 +0,0 @@
-export type np_ndarray = {
-    data_type: string
-    data: number[] | number[][]
-};
@@ -1 +0,0 @@
-export type tuple_int_int_np_dtype_float64 = any;
@@ -2,14 +2,23 @@
 /* istanbul ignore file */
 /* tslint:disable */
 /* eslint-disable */
+import type { Body_chisqr_surface_api_chisqr_surface_post } from '../models/Body_chisqr_surface_api_chisqr_surface_post';
 import type { Body_extrapolate_api_extrapolate_post } from '../models/Body_extrapolate_api_extrapolate_post';
+import type { Body_start_bootstrap_api_start_bootstrap_post } from '../models/Body_start_bootstrap_api_start_bootstrap_post';
 import type { Body_start_fit_api_start_fit_post } from '../models/Body_start_fit_api_start_fit_post';
+import type { Body_start_joint_fit_api_start_joint_fit_post } from '../models/Body_start_joint_fit_api_start_joint_fit_post';
+import type { Body_start_profile_api_start_profile_post } from '../models/Body_start_profile_api_start_profile_post';
 import type { Body_upload_api_upload_post } from '../models/Body_upload_api_upload_post';
-import type { ExperimentData_Output } from '../models/ExperimentData_Output';
+import type { BootstrapStatus } from '../models/BootstrapStatus';
+import type { DatasetId } from '../models/DatasetId';
 import type { ExperimentSettings_Output } from '../models/ExperimentSettings_Output';
+import type { ExtrapolationField } from '../models/ExtrapolationField';
 import type { ExtrapolationResults } from '../models/ExtrapolationResults';
-import type { Parameters } from '../models/Parameters';
-import type { TaskId } from '../models/TaskId';
+import type { FitStatus } from '../models/FitStatus';
+import type { JointFitStatus } from '../models/JointFitStatus';
+import type { ProfileStatus } from '../models/ProfileStatus';
+import type { SurfaceResults } from '../models/SurfaceResults';
+import type { UploadedDataset } from '../models/UploadedDataset';
 
 import type { CancelablePromise } from '../core/CancelablePromise';
 import type { BaseHttpRequest } from '../core/BaseHttpRequest';
@@ -39,22 +48,25 @@ export class RootService {
 
     /**
      * Upload
-     * Returns a dictionary with the extracted experimental data from the file to the client
+     * Returns a dictionary with the extracted experimental data from the file to the client.
+     * The data is kept on the server under its dataset ID, so later requests can send the ID instead.
+     * Uploading the same file again returns the kept data without parsing it.
      *
      * Parameters:
      * - request: The FastAPI Request object representing the incoming HTTP request.
      * - file: The file to be uploaded. Expected in the request's form data.
      *
      * Returns:
-     * - dict: A dictionary containing the experiment data parsed from the uploaded file.
-     * @returns ExperimentData_Output Successful Response
+     * - dict: A dictionary containing the dataset ID and the experiment data parsed from the uploaded file,
+     * or the binary encoding of it if the client accepts application/vnd.cyton.arrays.
+     * @returns UploadedDataset Successful Response
      * @throws ApiError
      */
     public uploadApiUploadPost({
         formData,
     }: {
         formData: Body_upload_api_upload_post,
-    }): CancelablePromise<ExperimentData_Output> {
+    }): CancelablePromise<UploadedDataset> {
         return this.httpRequest.request({
             method: 'POST',
             url: '/api/upload',
@@ -75,24 +87,33 @@ export class RootService {
      * - request: The FastAPI Request object representing the incoming HTTP request.
      * - parameters: Dictionary of parameters.
      * - data: Optional dictionary containing experiment data.
+     * - dataset_id: Optional ID of an uploaded dataset, returned by /upload, instead of data.
+     * - fields: Optional list of outputs to compute, e.g. ?fields=total_live_cells&fields=hts. All of them by default.
      *
      * Returns:
-     * - dict: A dictionary containing the extrapolated data.
+     * - dict: A dictionary containing the extrapolated data,
+     * or the binary encoding of it if the client accepts application/vnd.cyton.arrays.
      * @returns ExtrapolationResults Successful Response
      * @throws ApiError
      */
     public extrapolateApiExtrapolatePost({
         requestBody,
+        datasetId,
         condition,
+        fields,
     }: {
         requestBody: Body_extrapolate_api_extrapolate_post,
+        datasetId?: (DatasetId | null),
         condition?: (string | null),
+        fields?: (Array<ExtrapolationField> | null),
     }): CancelablePromise<ExtrapolationResults> {
         return this.httpRequest.request({
             method: 'POST',
             url: '/api/extrapolate',
             query: {
+                'dataset_id': datasetId,
                 'condition': condition,
+                'fields': fields,
             },
             body: requestBody,
             mediaType: 'application/json',
@@ -102,15 +123,122 @@ export class RootService {
         });
     }
 
+    /**
+     * Chisqr Surface
+     * Returns the residual sum of squares over a grid of one or two parameters, to check their identifiability.
+     * The other parameters are fixed at parameters. Use /start_profile to re-optimise them instead.
+     *
+     * Parameters:
+     * - request: The FastAPI Request object representing the incoming HTTP request.
+     * - data: Dictionary containing experiment data, or None to use dataset_id.
+     * - dataset_id: ID of an uploaded dataset, returned by /upload.
+     * - parameters: The fitted parameters of the condition.
+     * - ranges: One or two parameter names with the range and number of values of each, at most MAX_SURFACE_POINTS grid points in all.
+     *
+     * Returns:
+     * - dict: The grids and the chi-square at each grid point.
+     * @returns SurfaceResults Successful Response
+     * @throws ApiError
+     */
+    public chisqrSurfaceApiChisqrSurfacePost({
+        condition,
+        requestBody,
+        datasetId,
+    }: {
+        condition: string,
+        requestBody: Body_chisqr_surface_api_chisqr_surface_post,
+        datasetId?: (DatasetId | null),
+    }): CancelablePromise<SurfaceResults> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/chisqr_surface',
+            query: {
+                'condition': condition,
+                'dataset_id': datasetId,
+            },
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Start Profile
+     * Queues a profile likelihood of one or two parameters on the job engine and returns a taskID to the client.
+     * The other varying parameters are re-optimised within the bounds of settings at every grid point,
+     * which costs a local fit per point, so it can be cancelled with /cancel_fit.
+     *
+     * Parameters:
+     * - request: The FastAPI Request object representing the incoming HTTP request.
+     * - data: Dictionary containing experiment data, or None to use dataset_id.
+     * - dataset_id: ID of an uploaded dataset, returned by /upload.
+     * - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
+     * - parameters: The fitted parameters of the condition, where every local fit starts.
+     * - ranges: One or two parameter names with the range and number of values of each, at most MAX_SURFACE_POINTS grid points in all.
+     *
+     * Returns:
+     * - task_id: A dictionary containing the taskID.
+     * @returns any Successful Response
+     * @throws ApiError
+     */
+    public startProfileApiStartProfilePost({
+        condition,
+        requestBody,
+        datasetId,
+    }: {
+        condition: string,
+        requestBody: Body_start_profile_api_start_profile_post,
+        datasetId?: (DatasetId | null),
+    }): CancelablePromise<any> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/start_profile',
+            query: {
+                'condition': condition,
+                'dataset_id': datasetId,
+            },
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Check Profile Status
+     * Returns the progress of a profile likelihood job, and the profile if completed.
+     * @returns ProfileStatus Successful Response
+     * @throws ApiError
+     */
+    public checkProfileStatusApiCheckProfileStatusPost({
+        taskId,
+    }: {
+        taskId: string,
+    }): CancelablePromise<ProfileStatus> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/check_profile_status',
+            query: {
+                'task_id': taskId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
     /**
      * Start Fit
-     * Initiates a background fitting job and returns a taskID to the client.
+     * Queues a fitting job on the job engine and returns a taskID to the client.
      *
      * Parameters:
      * - request: The FastAPI Request object representing the incoming HTTP request.
-     * - data: Dictionary containing experiment data.
+     * - data: Dictionary containing experiment data, or None to use dataset_id.
+     * - dataset_id: ID of an uploaded dataset, returned by /upload.
      * - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
-     * - background_tasks: FastAPI class for scheduling background tasks.
      *
      * Returns:
      * - task_id: A dictionary containing the taskID.
@@ -120,15 +248,93 @@ export class RootService {
     public startFitApiStartFitPost({
         condition,
         requestBody,
+        datasetId,
     }: {
         condition: string,
         requestBody: Body_start_fit_api_start_fit_post,
+        datasetId?: (DatasetId | null),
     }): CancelablePromise<any> {
         return this.httpRequest.request({
             method: 'POST',
             url: '/api/start_fit',
             query: {
                 'condition': condition,
+                'dataset_id': datasetId,
+            },
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Cancel Fit
+     * Stops a queued or running job. A running fit or joint fit then returns the best parameters found so far,
+     * and a fit's telemetry is marked as truncated. A running bootstrap returns the confidence intervals
+     * of the refits that finished, or fails if none did, and a running profile leaves nan at the points
+     * that didn't finish. A queued job never runs.
+     * Identical requests share a job, so this also cancels it for them.
+     *
+     * Parameters:
+     * - request: The FastAPI Request object representing the incoming HTTP request.
+     * - task_id: The task ID returned by /start_fit, /start_joint_fit, /start_bootstrap or /start_profile.
+     *
+     * Returns:
+     * - cancelled: False if the job had already finished or doesn't exist.
+     * @returns any Successful Response
+     * @throws ApiError
+     */
+    public cancelFitApiCancelFitPost({
+        taskId,
+    }: {
+        taskId: string,
+    }): CancelablePromise<any> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/cancel_fit',
+            query: {
+                'task_id': taskId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Start Joint Fit
+     * Queues a joint fit of several conditions on the job engine and returns a taskID to the client.
+     * Parameters in settings.shared are shared between the conditions, and the rest are fitted per condition.
+     *
+     * Parameters:
+     * - request: The FastAPI Request object representing the incoming HTTP request.
+     * - data: Dictionary containing experiment data, or None to use dataset_id.
+     * - dataset_id: ID of an uploaded dataset, returned by /upload.
+     * - settings: Dictionary containing the fitting settings (parameters, bounds, vary, shared).
+     * - conditions: Conditions to fit, e.g. ?conditions=CpG&conditions=aCD40
+     *
+     * Returns:
+     * - task_id: A dictionary containing the taskID.
+     * @returns any Successful Response
+     * @throws ApiError
+     */
+    public startJointFitApiStartJointFitPost({
+        conditions,
+        requestBody,
+        datasetId,
+    }: {
+        conditions: Array<string>,
+        requestBody: Body_start_joint_fit_api_start_joint_fit_post,
+        datasetId?: (DatasetId | null),
+    }): CancelablePromise<any> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/start_joint_fit',
+            query: {
+                'conditions': conditions,
+                'dataset_id': datasetId,
             },
             body: requestBody,
             mediaType: 'application/json',
@@ -140,23 +346,24 @@ export class RootService {
 
     /**
      * Check Status
-     * Checks the status of a fitting job and returns the fitted parameters if completed.
-     * Else, returns None.
+     * Checks the status of a fitting job. Returns its state (queued, running, done, failed or cancelled),
+     * its live telemetry (starts completed, model calls, time in the model and the optimiser, best chi-square so far),
+     * the fitted parameters once done and the error if it failed.
      *
      * Parameters:
      * - request: The FastAPI Request object representing the incoming HTTP request.
      * - data: Dictionary containing task_id for checking the status.
      *
      * Returns:
-     * - dict: A dictionary containing the fitted parameters.
-     * @returns Parameters Successful Response
+     * - dict: A dictionary containing the telemetry and the fitted parameters.
+     * @returns FitStatus Successful Response
      * @throws ApiError
      */
     public checkStatusApiCheckStatusPost({
         taskId,
     }: {
-        taskId: TaskId,
-    }): CancelablePromise<Parameters> {
+        taskId: string,
+    }): CancelablePromise<FitStatus> {
         return this.httpRequest.request({
             method: 'POST',
             url: '/api/check_status',
@@ -169,4 +376,94 @@ export class RootService {
         });
     }
 
+    /**
+     * Check Joint Status
+     * Checks the status of a joint fitting job, with the fitted parameters of each condition once done.
+     * @returns JointFitStatus Successful Response
+     * @throws ApiError
+     */
+    public checkJointStatusApiCheckJointStatusPost({
+        taskId,
+    }: {
+        taskId: string,
+    }): CancelablePromise<JointFitStatus> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/check_joint_status',
+            query: {
+                'task_id': taskId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Start Bootstrap
+     * Queues a bootstrap of a fit on the job engine and returns a taskID to the client.
+     * The replicates are resampled n_boot times and each resample is refitted starting from parameters.
+     *
+     * Parameters:
+     * - request: The FastAPI Request object representing the incoming HTTP request.
+     * - data: Dictionary containing experiment data, or None to use dataset_id.
+     * - dataset_id: ID of an uploaded dataset, returned by /upload.
+     * - settings: Dictionary containing the fitting settings (parameters, bounds, vary).
+     * - parameters: The fitted parameters of the condition.
+     *
+     * Returns:
+     * - task_id: A dictionary containing the taskID.
+     * @returns any Successful Response
+     * @throws ApiError
+     */
+    public startBootstrapApiStartBootstrapPost({
+        condition,
+        requestBody,
+        nBoot = 200,
+        datasetId,
+    }: {
+        condition: string,
+        requestBody: Body_start_bootstrap_api_start_bootstrap_post,
+        nBoot?: number,
+        datasetId?: (DatasetId | null),
+    }): CancelablePromise<any> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/start_bootstrap',
+            query: {
+                'condition': condition,
+                'n_boot': nBoot,
+                'dataset_id': datasetId,
+            },
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Check Bootstrap Status
+     * Returns the progress of a bootstrap job, and the confidence intervals of the parameters if completed.
+     * @returns BootstrapStatus Successful Response
+     * @throws ApiError
+     */
+    public checkBootstrapStatusApiCheckBootstrapStatusPost({
+        taskId,
+    }: {
+        taskId: string,
+    }): CancelablePromise<BootstrapStatus> {
+        return this.httpRequest.request({
+            method: 'POST',
+            url: '/api/check_bootstrap_status',
+            query: {
+                'task_id': taskId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
 }
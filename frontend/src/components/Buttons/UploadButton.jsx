@@ -29,7 +29,9 @@ const UploadButton = () => {
         if (response.ok) {
           const responseData = await response.json();
           // console.log('Response data:', responseData);
-          localStorage.setItem('uploadedData', JSON.stringify(responseData));
+          localStorage.setItem('uploadedData', JSON.stringify(responseData.data));
+          // Later requests can send the dataset ID instead of the data
+          localStorage.setItem('datasetId', responseData.dataset_id);
           alert('File uploaded successfully!')
         }
       } catch (error) {
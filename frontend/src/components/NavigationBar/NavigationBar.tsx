@@ -20,6 +20,8 @@ import {EvolutionLive} from '../Plots/EvolutionLive';
 import {ProbabilityDist} from '../Plots/ProbabilityDist';
 import {CellsVsGens} from '../Plots/CellsVsGens';
 import {CytonClient, Parameters} from "../../client"
+import {BinaryHttpRequest} from "../../binaryClient"
+import {withDataset} from "../../datasets"
 import { useAsync } from 'react-async-hook';
 import ParameterForm from "../Form/Parameters"
 import { FormProvider, useForm } from 'react-hook-form';
@@ -29,7 +31,7 @@ const drawerWidth = 240;
 function NavigationBar() {
   const client = new CytonClient({
     BASE: "http://localhost:9999"
-  });
+  }, BinaryHttpRequest);
   const theme = useTheme();
   const methods = useForm<Parameters>({
     defaultValues: null,
@@ -47,11 +49,14 @@ function NavigationBar() {
     if (!formData.b){
       return;
     }
-    return client.root.extrapolateApiExtrapolatePost({
+    return withDataset(({datasetId, data, condition}) => client.root.extrapolateApiExtrapolatePost({
+      datasetId,
+      condition,
       requestBody: {
-        parameters: formData
+        parameters: formData,
+        data
       }
-    })
+    }))
     // Stringify here prevents excessive re-renders due to a bad comparison
   }, [JSON.stringify(formData)]);
   const [open, setOpen] = useState(false);
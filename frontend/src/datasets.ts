@@ -0,0 +1,46 @@
+/*
+ * Uploaded dataset of the Cyton API
+ *
+ * UploadButton keeps the dataset ID returned by /api/upload along with the data. Requests send the ID,
+ * so the data is only sent again if the server has forgotten the dataset (see backend/cyton/api/support/datasets.py).
+ */
+import { ApiError } from './client';
+import type { ExperimentData_Input } from './client';
+
+/**
+ * Experiment data of a request: the ID of the uploaded dataset, or the data itself
+ */
+export type DatasetRequest = {
+  datasetId?: string;
+  data?: ExperimentData_Input;
+  condition?: string;
+};
+
+const storedData = (): ExperimentData_Input | null => {
+  const stored = localStorage.getItem('uploadedData');
+  return stored === null ? null : JSON.parse(stored);
+};
+
+/**
+ * Sends a request with the uploaded dataset, or with no data if nothing was uploaded.
+ * The request is only repeated with the data itself when the server doesn't know the dataset ID (404).
+ */
+export const withDataset = async <T>(
+  send: (dataset: DatasetRequest) => Promise<T>,
+): Promise<T> => {
+  const datasetId = localStorage.getItem('datasetId');
+  const data = storedData();
+  if (datasetId === null || data === null) {
+    return send({});
+  }
+  // The first condition until the UI can choose one
+  const condition = data.conditions[0];
+  try {
+    return await send({ datasetId, condition });
+  } catch (error) {
+    if (error instanceof ApiError && error.status === 404) {
+      return send({ data, condition });
+    }
+    throw error;
+  }
+};